@@ -0,0 +1,13 @@
+"""Celery app for background jobs (used when JOB_BACKEND=celery).
+
+Run a worker with:  celery -A douane_project worker --concurrency=1
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'douane_project.settings')
+
+app = Celery('douane_project')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
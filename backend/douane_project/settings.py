@@ -209,6 +209,24 @@ CORS_EXPOSE_HEADERS = [
     'x-total-count',
 ]
 
+# Cache (facet counts). Per-process memory by default; a Redis URL shares it
+# between the web workers
+CACHE_URL = os.environ.get('CACHE_URL', '')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+    } if CACHE_URL.startswith(('redis://', 'rediss://')) else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Celery (background jobs with JOB_BACKEND=celery; see ocr_parser/jobs.py)
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', '')
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1  # OCR jobs are long, don't hoard them
+CELERY_TASK_IGNORE_RESULT = True  # Job state lives on ProcessingJob
+
 # Security settings for production
 if not DEBUG:
     # HTTPS settings
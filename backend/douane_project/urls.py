@@ -64,6 +64,7 @@ def api_root(request):
             'listings': '/api/listings/',
             'pdf_uploads': '/api/pdf-uploads/',
             'auction_groups': '/api/auction-groups/',
+            'jobs': '/api/jobs/',
             'admin': '/admin/',
             'cors_test': '/api/cors-test/',
         },
@@ -4,7 +4,8 @@ set -e
 echo "[startup] Running migrations..."
 python manage.py migrate --noinput
 
-# Import data if data/ exists (from backend directory)
+# Import data if data/ exists (from backend directory); files already imported
+# with the same content are skipped, changed ones are upserted
 if [ -d "./data" ]; then
   echo "[startup] Importing JSON listings from ./data..."
   python manage.py import_data --data-dir "./data" || true
@@ -15,6 +16,10 @@ else
   echo "[startup] No data directory found. Skipping import."
 fi
 
+# Jobs left running or queued by the previous web server (or a crashed worker)
+echo "[startup] Reaping stale processing jobs..."
+python manage.py process_jobs --reap-only || true
+
 echo "[startup] Starting gunicorn..."
 exec gunicorn douane_project.wsgi --log-file -
 
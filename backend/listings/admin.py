@@ -8,7 +8,8 @@ from django.db import transaction
 import os
 import json
 from decimal import Decimal
-from .models import Listing, PDFUpload, AuctionGroup
+from .models import Listing, PDFUpload, AuctionGroup, ImportManifest, ImageCache, ImageEnrichmentRun, ThumbnailSource
+from .importer import import_listings
 # OCRProcessingService import removed - using PDFParser directly
 from ocr_parser.parser import PDFParser
 
@@ -21,14 +22,46 @@ class AuctionGroupAdmin(admin.ModelAdmin):
     ordering = ['order']
 
 
+@admin.register(ImportManifest)
+class ImportManifestAdmin(admin.ModelAdmin):
+    list_display = ['source', 'content_hash', 'listings_count', 'pdf_upload', 'imported_at', 'updated_at']
+    search_fields = ['source', 'content_hash']
+    readonly_fields = ['content_hash', 'size', 'mtime_ns', 'imported_at', 'updated_at']
+
+
+@admin.register(ImageCache)
+class ImageCacheAdmin(admin.ModelAdmin):
+    list_display = ['query', 'image_url', 'provider', 'fetched_at']
+    list_filter = ['provider']
+    search_fields = ['query']
+
+
+@admin.register(ImageEnrichmentRun)
+class ImageEnrichmentRunAdmin(admin.ModelAdmin):
+    list_display = ['id', 'status', 'provider', 'started_at', 'finished_at', 'queue_depth',
+                    'scanned', 'updated', 'searched', 'cache_hits', 'errors']
+    list_filter = ['status', 'provider']
+    readonly_fields = [field.name for field in ImageEnrichmentRun._meta.fields]
+
+
+@admin.register(ThumbnailSource)
+class ThumbnailSourceAdmin(admin.ModelAdmin):
+    list_display = ['url', 'content_hash', 'width', 'height', 'fetched_at', 'error']
+    search_fields = ['url', 'content_hash']
+    readonly_fields = ['url_hash', 'content_hash', 'width', 'height', 'fetched_at']
+
+
 class PDFUploadAdmin(admin.ModelAdmin):
     list_display = [
         'filename', 'city', 'auction_date', 'uploaded_at', 
-        'processed', 'total_listings', 'txt_file_status', 'action_buttons'
+        'processed', 'processing_stage', 'total_listings', 'txt_file_status', 'action_buttons'
     ]
-    list_filter = ['city', 'auction_date', 'processed']
+    list_filter = ['city', 'auction_date', 'processed', 'processing_stage']
     search_fields = ['filename', 'city']
-    readonly_fields = ['uploaded_at', 'total_listings', 'txt_file_path']
+    readonly_fields = [
+        'uploaded_at', 'total_listings', 'txt_file_path',
+        'processing_stage', 'pages_total', 'pages_processed'
+    ]
     ordering = ['-uploaded_at']
     
     actions = ['mark_as_processed', 'mark_as_unprocessed', 'extract_text_to_txt']
@@ -176,7 +209,7 @@ class PDFUploadAdmin(admin.ModelAdmin):
         
         return HttpResponseRedirect(reverse('admin:listings_pdfupload_changelist'))
     
-    def extract_text_to_txt_file(self, pdf_upload):
+    def extract_text_to_txt_file(self, pdf_upload, use_cache=True):
         """Extract text from PDF and save as TXT file"""
         try:
             print(f"Starting text extraction for: {pdf_upload.filename}")
@@ -186,7 +219,7 @@ class PDFUploadAdmin(admin.ModelAdmin):
             print(f"PDF path: {pdf_path}")
             
             # Use the PDF parser to extract text
-            parser = PDFParser()
+            parser = PDFParser(use_cache=use_cache)
             print("PDFParser initialized, extracting text...")
             extracted_text = parser.extract_text(pdf_path)
             
@@ -217,94 +250,12 @@ class PDFUploadAdmin(admin.ModelAdmin):
             traceback.print_exc()
             return False
 
-    def _parse_decimal(self, value, default=Decimal('0')):
-        try:
-            if value is None:
-                return default
-            if isinstance(value, (int, float, Decimal)):
-                return Decimal(str(value))
-            # strip non-numeric except dot and comma
-            cleaned = ''.join(ch for ch in str(value) if ch.isdigit() or ch in ['.', ','])
-            if cleaned.count(',') == 1 and cleaned.count('.') == 0:
-                cleaned = cleaned.replace(',', '.')
-            return Decimal(cleaned) if cleaned else default
-        except Exception:
-            return default
-
-    @transaction.atomic
     def import_listings_from_json(self, pdf_upload, data: dict) -> int:
         """Create Listing records from JSON structure returned by n8n/Gemini.
         Expects a dict with key 'listings': [ { ... } ]
         """
-        from .models import Listing
-
-        listings = data.get('listings') or []
-        created = 0
-
-        # Determine starting lot number
-        existing_lots = set(pdf_upload.listings.values_list('lot_number', flat=True))
-        next_lot_seq = 1
-
-        for item in listings:
-            try:
-                title = item.get('title') or 'N/A'
-                short_description = item.get('short_description') or ''
-                full_description = item.get('full_description') or ''
-                listing_type = (item.get('listing_type') or 'other').lower()
-                brand = item.get('brand') or ''
-                model = item.get('model') or ''
-                year_val = item.get('year')
-                try:
-                    year = int(year_val) if year_val not in (None, '', 'N/A') else None
-                except Exception:
-                    year = None
-                fuel_type = (item.get('fuel_type') or '').lower()
-
-                # price/guarantee
-                estimated_value = item.get('estimated_value')
-                starting_price = self._parse_decimal(item.get('starting_price') if item.get('starting_price') not in (None, '') else estimated_value, Decimal('0'))
-                guarantee_amount = self._parse_decimal(item.get('guarantee_amount'), starting_price * Decimal('0.10'))
-
-                # lot number
-                lot_number = str(item.get('lot_number') or '').strip()
-                if not lot_number:
-                    while True:
-                        candidate = str(next_lot_seq).zfill(3)
-                        next_lot_seq += 1
-                        if candidate not in existing_lots:
-                            lot_number = candidate
-                            existing_lots.add(candidate)
-                            break
-
-                Listing.objects.create(
-                    lot_number=lot_number,
-                    title=title,
-                    listing_type=listing_type if listing_type in dict(Listing.LISTING_TYPES) else 'other',
-                    short_description=short_description,
-                    full_description=full_description,
-                    brand=brand,
-                    model=model,
-                    year=year,
-                    fuel_type=fuel_type if fuel_type in dict(Listing.FUEL_TYPES) else 'other',
-                    quantity=str(item.get('quantity') or ''),
-                    unit=str(item.get('unit') or ''),
-                    starting_price=starting_price,
-                    guarantee_amount=guarantee_amount,
-                    pdf_upload=pdf_upload,
-                    image_url=str(item.get('image_url') or ''),
-                    original_pdf_url=str(item.get('original_pdf_url') or ''),
-                )
-                created += 1
-            except Exception as e:
-                print(f"Error creating listing from item: {e}")
-                continue
-
-        # Update PDFUpload metadata
-        pdf_upload.processed = True if created > 0 else pdf_upload.processed
-        pdf_upload.total_listings = (pdf_upload.total_listings or 0) + created
-        pdf_upload.save(update_fields=['processed', 'total_listings'])
-
-        return created
+        stats = import_listings(pdf_upload, data)
+        return stats['created']
 
     def upload_json_view(self, request, pk):
         """Admin view to upload a JSON file and import listings for a PDFUpload."""
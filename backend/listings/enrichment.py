@@ -0,0 +1,231 @@
+"""Background image enrichment for listings without an image.
+
+A run walks the queue of listings with an empty ``image_url`` (in id order,
+``IMAGE_ENRICH_BATCH_SIZE`` at a time), resolves each batch through
+``ImageResolver`` (distinct queries only, cache first, rate-limited provider
+searches) and writes the results with one ``bulk_update`` per batch.
+Listings whose search found nothing get ``image_checked_at`` and leave the
+queue until the negative cache expires; failed searches stay queued.
+
+Progress lives in the database, so a run that dies is simply continued by
+the next one. Each run is recorded as an ``ImageEnrichmentRun`` (counters,
+hit rate, heartbeat), and ``enrichment_status`` reports the queue depth. A
+partial unique constraint allows a single running run; the heartbeat is
+bumped after every provider search, so a slow, rate-limited batch isn't
+mistaken for a dead run.
+
+Runs are started after imports by ``schedule_enrichment`` according to
+``IMAGE_ENRICH_BACKEND``:
+  - ``celery``:  a Celery task (default when ``CELERY_BROKER_URL`` is set)
+  - ``thread``:  a background thread of the web process, one at a time
+  - ``command``: nothing; run ``manage.py enrich_images`` (e.g. from cron)
+"""
+import os
+import threading
+import time
+from datetime import timedelta
+from typing import Callable, Dict, Optional
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .images import IMAGE_NEGATIVE_TTL_HOURS, ImageResolver, image_query
+from .models import ImageCache, ImageEnrichmentRun, Listing
+
+logger = logging.getLogger(__name__)
+
+IMAGE_ENRICH_BACKEND = os.environ.get(
+    'IMAGE_ENRICH_BACKEND', 'celery' if getattr(settings, 'CELERY_BROKER_URL', '') else 'thread'
+).lower()
+# Listings loaded, resolved and written per batch
+IMAGE_ENRICH_BATCH_SIZE = int(os.environ.get('IMAGE_ENRICH_BATCH_SIZE', '200') or 200)
+# A running run without a heartbeat for this long is considered dead
+IMAGE_ENRICH_STALE_MINUTES = int(os.environ.get('IMAGE_ENRICH_STALE_MINUTES', '10') or 10)
+# Least seconds between two heartbeat writes during a batch
+HEARTBEAT_SECONDS = 30
+
+_thread_lock = threading.Lock()
+
+
+def pending_listings():
+    """Listings waiting for an image search"""
+    retry_before = timezone.now() - timedelta(hours=IMAGE_NEGATIVE_TTL_HOURS)
+    return Listing.objects.filter(image_url='').filter(
+        Q(image_checked_at__isnull=True) | Q(image_checked_at__lt=retry_before)
+    )
+
+
+def active_run() -> Optional[ImageEnrichmentRun]:
+    """The run in progress, if its heartbeat is recent"""
+    alive_after = timezone.now() - timedelta(minutes=IMAGE_ENRICH_STALE_MINUTES)
+    return ImageEnrichmentRun.objects.filter(
+        status=ImageEnrichmentRun.STATUS_RUNNING, updated_at__gte=alive_after
+    ).first()
+
+
+def run_enrichment(provider=None, batch_size: Optional[int] = None, limit: Optional[int] = None,
+                   on_batch: Optional[Callable[[ImageEnrichmentRun], None]] = None) -> Optional[ImageEnrichmentRun]:
+    """Enrich the queued listings (at most ``limit``); returns the run, or None
+    if no provider is configured or another run is in progress"""
+    heartbeat = _Heartbeat()
+    resolver = ImageResolver(provider, on_search=heartbeat)
+    if resolver.provider is None:
+        logger.info("No image provider configured, skipping image enrichment")
+        return None
+    run = _start_run(resolver.provider.name)
+    if run is None:
+        logger.info("An image enrichment run is already in progress")
+        return None
+    heartbeat.run_id = run.pk
+
+    batch_size = max(1, batch_size or IMAGE_ENRICH_BATCH_SIZE)
+    logger.info(f"Image enrichment {run.pk}: {run.queue_depth} listing(s) queued")
+    try:
+        while limit is None or run.scanned < limit:
+            size = batch_size if limit is None else min(batch_size, limit - run.scanned)
+            batch = list(
+                pending_listings().filter(pk__gt=run.last_listing_id).order_by('pk')
+                .only('id', 'title', 'brand', 'model', 'year', 'image_url')[:size]
+            )
+            if not batch:
+                break
+            _enrich_batch(run, resolver, batch)
+            if on_batch is not None:
+                on_batch(run)
+        run.status = ImageEnrichmentRun.STATUS_COMPLETED
+    except Exception as e:
+        logger.exception(f"Image enrichment {run.pk} failed")
+        run.status = ImageEnrichmentRun.STATUS_FAILED
+        run.error = str(e)
+    run.finished_at = timezone.now()
+    run.save()
+    return run
+
+
+def _start_run(provider: str) -> Optional[ImageEnrichmentRun]:
+    """Create the running run, None if another one is alive"""
+    if active_run() is not None:
+        return None
+    # Runs that stopped beating without finishing (killed worker, restart)
+    alive_after = timezone.now() - timedelta(minutes=IMAGE_ENRICH_STALE_MINUTES)
+    ImageEnrichmentRun.objects.filter(status=ImageEnrichmentRun.STATUS_RUNNING, updated_at__lt=alive_after).update(
+        status=ImageEnrichmentRun.STATUS_INTERRUPTED, finished_at=timezone.now()
+    )
+    try:
+        with transaction.atomic():
+            return ImageEnrichmentRun.objects.create(provider=provider, queue_depth=pending_listings().count())
+    except IntegrityError:
+        return None  # another process started one meanwhile
+
+
+class _Heartbeat:
+    """Bumps the run's ``updated_at`` after provider searches, at most every ``HEARTBEAT_SECONDS``"""
+
+    def __init__(self):
+        self.run_id = None
+        self._last = time.monotonic()
+
+    def __call__(self):
+        if self.run_id is None or time.monotonic() - self._last < HEARTBEAT_SECONDS:
+            return
+        self._last = time.monotonic()
+        ImageEnrichmentRun.objects.filter(pk=self.run_id).update(updated_at=timezone.now())
+
+
+def _enrich_batch(run: ImageEnrichmentRun, resolver: ImageResolver, batch):
+    fields = [
+        {'title': listing.title, 'brand': listing.brand, 'model': listing.model,
+         'year': listing.year, 'image_url': ''}
+        for listing in batch
+    ]
+    unanswered = resolver.resolve(fields)
+    now = timezone.now()
+    changed = []
+    for listing, resolved in zip(batch, fields):
+        if resolved['image_url']:
+            listing.image_url = resolved['image_url']
+            run.updated += 1
+        elif image_query(resolved) in unanswered:
+            continue  # search failed, stays queued
+        listing.image_checked_at = now
+        changed.append(listing)
+    if changed:
+        Listing.objects.bulk_update(changed, ['image_url', 'image_checked_at'])
+
+    run.scanned += len(batch)
+    run.last_listing_id = batch[-1].pk
+    for name, stat in (('cache_hits', 'cached'), ('searched', 'searched'), ('found', 'found'), ('errors', 'errors')):
+        setattr(run, name, resolver.stats[stat])
+    run.save()
+
+
+def schedule_enrichment(backend: Optional[str] = None) -> bool:
+    """Start a background run after an import; False if none was started"""
+    backend = backend or IMAGE_ENRICH_BACKEND
+    try:
+        if backend == 'celery':
+            from .tasks import enrich_images_task
+            enrich_images_task.delay()
+            return True
+        if backend == 'thread':
+            if not _thread_lock.acquire(blocking=False):
+                return False  # a run in this process will reach the new listings
+            threading.Thread(target=_run_in_thread, name='image-enrichment', daemon=True).start()
+            return True
+        if backend != 'command':
+            raise ValueError(f"Unknown image enrichment backend: {backend}")
+    except Exception as e:
+        logger.error(f"Could not schedule image enrichment: {e}")
+    return False
+
+
+def _run_in_thread():
+    try:
+        close_old_connections()
+        run_enrichment()
+    except Exception:
+        logger.exception("Image enrichment thread failed")
+    finally:
+        connection.close()
+        _thread_lock.release()
+
+
+def enrichment_status() -> Dict:
+    """Queue depth, image coverage, cache contents and the latest run"""
+    cache_entries = ImageCache.objects.count()
+    cache_negative = ImageCache.objects.filter(image_url='').count()
+    last_run = ImageEnrichmentRun.objects.first()
+    status = {
+        'queue_depth': pending_listings().count(),
+        'listings_with_image': Listing.objects.exclude(image_url='').count(),
+        'listings_without_image': Listing.objects.filter(image_url='').count(),
+        'cache': {
+            'entries': cache_entries,
+            'positive': cache_entries - cache_negative,
+            'negative': cache_negative,
+        },
+        'backend': IMAGE_ENRICH_BACKEND,
+        'running': active_run() is not None,
+        'last_run': None,
+    }
+    if last_run is not None:
+        status['last_run'] = {
+            'id': last_run.pk,
+            'status': last_run.status,
+            'provider': last_run.provider,
+            'started_at': last_run.started_at,
+            'finished_at': last_run.finished_at,
+            'queue_depth': last_run.queue_depth,
+            'scanned': last_run.scanned,
+            'updated': last_run.updated,
+            'cache_hits': last_run.cache_hits,
+            'searched': last_run.searched,
+            'found': last_run.found,
+            'errors': last_run.errors,
+            'hit_rate': last_run.hit_rate,
+            'error': last_run.error,
+        }
+    return status
@@ -0,0 +1,146 @@
+"""Facet counts for the listing search filters.
+
+For the filters of a listings request, ``listing_facets`` returns the number
+of matching listings per brand, city, fuel type, listing type, year bucket
+and price bucket: one grouped query per facet. Each facet is counted with
+every filter except its own (selecting a brand still lists the other brands
+with their counts).
+
+Results are cached per normalized filter key (known filters only, values
+trimmed, sorted) for ``FACET_CACHE_SECONDS``. The key includes the listing
+stats version (``listings.stats``), so a change to the listings makes every
+cached entry obsolete at once.
+"""
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+from django.core.cache import cache
+from django.db.models import Case, Count, ExpressionWrapper, F, IntegerField, Value, When
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+
+from .models import Listing
+from .search import search_queryset
+from .stats import stats_version
+
+FACET_CACHE_SECONDS = int(os.environ.get('FACET_CACHE_SECONDS', '300') or 300)
+# Most frequent values returned for brand and city
+FACET_LIMIT = int(os.environ.get('FACET_LIMIT', '100') or 100)
+FACET_YEAR_BUCKET = int(os.environ.get('FACET_YEAR_BUCKET', '5') or 5)
+# Lower bounds of the price buckets (TND)
+FACET_PRICE_BUCKETS = [
+    int(edge) for edge in os.environ.get('FACET_PRICE_BUCKETS', '0,1000,5000,10000,25000,50000,100000').split(',')
+    if edge.strip().isdigit()
+]
+
+# Facet name → filtered field
+FACET_FIELDS = {
+    'brand': 'brand',
+    'city': 'pdf_upload__city',
+    'fuel_type': 'fuel_type',
+    'listing_type': 'listing_type',
+    'year': 'year',
+    'price': 'starting_price',
+}
+SEARCH_PARAM = filters.SearchFilter.search_param
+
+
+def normalized_params(view, request) -> Dict[str, str]:
+    """The request's filter parameters that affect the listings, trimmed"""
+    filterset_class = DjangoFilterBackend().get_filterset_class(view, Listing.objects.all())
+    known = set(filterset_class.base_filters) | {SEARCH_PARAM}
+    params = {}
+    for key in sorted(request.query_params):
+        value = request.query_params.get(key, '').strip()
+        if key in known and value:
+            params[key] = ' '.join(value.split()).lower() if key == SEARCH_PARAM else value
+    return params
+
+
+def listing_facets(view, request) -> Dict:
+    """Facet counts for the request's filters, from the cache when possible"""
+    params = normalized_params(view, request)
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+    key = f"listing-facets:{stats_version()}:{digest}"
+    result = cache.get(key)
+    if result is not None:
+        return dict(result, cached=True)
+    result = compute_facets(view, request, params)
+    cache.set(key, result, FACET_CACHE_SECONDS)
+    return dict(result, cached=False)
+
+
+def compute_facets(view, request, params: Dict[str, str]) -> Dict:
+    result = {'count': _filtered(view, request, params).count(), 'filters': params, 'facets': {}}
+    for name, field in FACET_FIELDS.items():
+        # Disjunctive: the facet's own filters don't narrow its counts
+        others = {key: value for key, value in params.items() if key != field and not key.startswith(f'{field}__')}
+        queryset = _filtered(view, request, others)
+        if name == 'year':
+            result['facets'][name] = _year_buckets(queryset)
+        elif name == 'price':
+            result['facets'][name] = _price_buckets(queryset)
+        else:
+            result['facets'][name] = _value_counts(queryset, field)
+    return result
+
+
+def _filtered(view, request, params: Dict[str, str]):
+    """Listings matching ``params``, with the list endpoint's filters"""
+    queryset = Listing.objects.order_by()
+    filterset_class = DjangoFilterBackend().get_filterset_class(view, queryset)
+    filterset = filterset_class(data={k: v for k, v in params.items() if k != SEARCH_PARAM},
+                                queryset=queryset, request=request)
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+    queryset = filterset.qs
+    if SEARCH_PARAM in params:
+        queryset = search_queryset(request, queryset, view, rank=False)
+    return queryset
+
+
+def _value_counts(queryset, field: str) -> List[Dict]:
+    rows = (
+        queryset.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+        .values(field).annotate(count=Count('id')).order_by('-count', field)[:FACET_LIMIT]
+    )
+    return [{'value': row[field], 'count': row['count']} for row in rows]
+
+
+def _year_buckets(queryset) -> List[Dict]:
+    size = max(1, FACET_YEAR_BUCKET)
+    rows = (
+        queryset.filter(year__isnull=False)
+        .annotate(bucket=ExpressionWrapper(F('year') / size * size, output_field=IntegerField()))
+        .values('bucket').annotate(count=Count('id')).order_by('-bucket')
+    )
+    return [
+        {'min': row['bucket'], 'max': row['bucket'] + size - 1, 'count': row['count']}
+        for row in rows
+    ]
+
+
+def _price_bounds() -> List[Tuple[int, Optional[int]]]:
+    edges = sorted(set(FACET_PRICE_BUCKETS)) or [0]
+    return list(zip(edges, edges[1:] + [None]))
+
+
+def _price_buckets(queryset) -> List[Dict]:
+    bounds = _price_bounds()
+    bucket = Case(
+        *[When(starting_price__lt=upper, then=Value(index)) for index, (_, upper) in enumerate(bounds) if upper is not None],
+        default=Value(len(bounds) - 1),
+        output_field=IntegerField(),
+    )
+    counts = dict(
+        queryset.annotate(bucket=bucket).values('bucket').annotate(count=Count('id'))
+        .order_by().values_list('bucket', 'count')
+    )
+    # Every bucket, empty ones included, so the price filter UI stays stable; max is exclusive
+    return [
+        {'min': lower, 'max': upper, 'count': counts.get(index, 0)}
+        for index, (lower, upper) in enumerate(bounds)
+    ]
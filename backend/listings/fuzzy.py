@@ -0,0 +1,327 @@
+"""Fuzzy (trigram) lookups of brands/models and chassis numbers.
+
+OCR turns "MERCEDES" into "MERCEDE5" and drops characters from chassis
+numbers (VINs), so exact and ``icontains`` lookups miss them. Both lookups
+here compare trigram (three-character) sets instead, scored by the share of
+the query's trigrams found in a value: a partial VIN scores 1, a value with
+a misread character still scores high.
+
+  - ``find_brands``: (brand, model) pairs with their listing counts, ranked
+    by similarity to the query. Digits OCR confuses with letters (0/O, 1/I,
+    5/S, 8/B) inside words are also tried as letters.
+  - ``find_vins``: listings ranked by how well their ``serial_number``
+    matches a complete or partial VIN. VINs are compared uppercase,
+    alphanumeric only, with O, I and Q read as 0, 1 and 0 (they never occur
+    in a VIN, OCR reads digits as them).
+
+Backends:
+  - PostgreSQL with pg_trgm: GIN trigram indexes (installed by a migration)
+    and ``word_similarity``
+  - otherwise: an in-process trigram index per worker process, built on
+    first use and rebuilt in the background when listings change (tracked
+    by the listing stats version, see ``listings.stats``); lookups meanwhile
+    use the previous index
+"""
+import math
+import os
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from heapq import nlargest
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+import logging
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count
+
+from .models import Listing
+from .stats import stats_version
+
+logger = logging.getLogger(__name__)
+
+# Minimum share of the query's trigrams a match must contain
+FUZZY_BRAND_THRESHOLD = float(os.environ.get('FUZZY_BRAND_THRESHOLD', '0.5') or 0.5)
+FUZZY_VIN_THRESHOLD = float(os.environ.get('FUZZY_VIN_THRESHOLD', '0.5') or 0.5)
+FUZZY_VIN_MIN_LENGTH = int(os.environ.get('FUZZY_VIN_MIN_LENGTH', '4') or 4)
+FUZZY_LIMIT = int(os.environ.get('FUZZY_LIMIT', '20') or 20)
+FUZZY_MAX_LIMIT = 100
+
+LISTING_TABLE = 'listings_listing'
+BRAND_SQL = "(brand || ' ' || model)"
+# Same normalization as normalize_vin(); changing either needs a migration
+# that calls install_trigram_index() again
+VIN_SQL = "translate(regexp_replace(upper(serial_number), '[^A-Z0-9]', '', 'g'), 'OIQ', '010')"
+
+_VIN_FOLDING = str.maketrans('OIQ', '010')
+_OCR_LETTERS = str.maketrans('0158', 'OISB')
+
+
+def trigrams(text: str, padded: bool = True) -> Set[str]:
+    """Trigrams of the words of ``text``, lowercase; ``padded`` words start
+    with two spaces and end with one, as in pg_trgm"""
+    grams = set()
+    for word in re.findall(r'[^\W_]+', (text or '').lower()):
+        if padded:
+            word = f'  {word} '
+        grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return grams
+
+
+def normalize_vin(text: str) -> str:
+    """Chassis number as compared: uppercase alphanumerics, O/I/Q as 0/1/0"""
+    return re.sub(r'[^A-Z0-9]', '', (text or '').upper()).translate(_VIN_FOLDING)
+
+
+def ocr_letters(text: str) -> str:
+    """``text`` with the digits of words that also contain letters read as letters"""
+    return re.sub(
+        r'[^\W_]+',
+        lambda match: match.group().translate(_OCR_LETTERS) if re.search(r'[^\W\d_]', match.group()) else match.group(),
+        text or '',
+    )
+
+
+class TrigramIndex:
+    """In-memory inverted index from trigrams to entries.
+
+    ``search`` returns the entries containing at least ``threshold`` of the
+    query's trigrams. Only the shortest posting lists are scanned for
+    candidates (a match must appear in one of them), the others are checked
+    for the candidates alone, so common trigrams (a manufacturer's VIN
+    prefix) cost little.
+    """
+
+    def __init__(self, padded: bool = True):
+        self.padded = padded
+        self.keys: List[Hashable] = []
+        self.sizes = array('H')
+        self.postings: Dict[str, array] = defaultdict(lambda: array('I'))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key: Hashable, text: str):
+        grams = trigrams(text, self.padded)
+        if not grams:
+            return
+        entry = len(self.keys)
+        self.keys.append(key)
+        self.sizes.append(min(len(grams), 65535))
+        for gram in grams:
+            # Entries are added in order, so posting lists stay sorted
+            self.postings[gram].append(entry)
+
+    def search(self, query: str, threshold: float, limit: int) -> List[Tuple[Hashable, float]]:
+        """``[(key, score), ...]`` best first; score is the share of the
+        query's trigrams in the entry, ties go to the closer entry size"""
+        grams = trigrams(query, self.padded)
+        if not grams:
+            return []
+        needed = max(1, math.ceil(threshold * len(grams) - 1e-9))
+        lists = sorted((self.postings.get(gram, array('I')) for gram in grams), key=len)
+        scanned = len(grams) - needed + 1
+        counts = Counter()
+        for postings in lists[:scanned]:
+            counts.update(postings)
+        for postings in lists[scanned:]:
+            if not counts:
+                break
+            if len(postings) <= 16 * len(counts):
+                for entry in postings:
+                    if entry in counts:
+                        counts[entry] += 1
+            else:
+                for entry in counts:
+                    position = bisect_left(postings, entry)
+                    if position < len(postings) and postings[position] == entry:
+                        counts[entry] += 1
+
+        size = len(grams)
+        matches = (
+            (shared / size, shared / (size + self.sizes[entry] - shared), entry)
+            for entry, shared in counts.items() if shared >= needed
+        )
+        return [(self.keys[entry], round(score, 4)) for score, _, entry in nlargest(limit, matches)]
+
+
+# In-process indexes (backends without pg_trgm)
+
+def _build_brand_index() -> TrigramIndex:
+    index = TrigramIndex()
+    rows = (
+        Listing.objects.exclude(brand='').order_by()
+        .values_list('brand', 'model').annotate(count=Count('id'))
+    )
+    for brand, model, count in rows:
+        index.add((brand, model, count), f'{brand} {model}')
+    return index
+
+
+def _build_vin_index() -> TrigramIndex:
+    index = TrigramIndex(padded=False)
+    rows = Listing.objects.exclude(serial_number='').order_by('pk').values_list('pk', 'serial_number')
+    for pk, serial_number in rows.iterator(chunk_size=5000):
+        index.add(pk, normalize_vin(serial_number))
+    return index
+
+
+_BUILDERS = {'brand': _build_brand_index, 'vin': _build_vin_index}
+# Index name → (stats version, index)
+_indexes: Dict[str, Tuple[int, TrigramIndex]] = {}
+_lock = threading.Lock()
+_rebuilding: Set[str] = set()
+
+
+def _build(name: str, version: int) -> TrigramIndex:
+    index = _BUILDERS[name]()
+    with _lock:
+        current = _indexes.get(name)
+        if current is None or current[0] < version:
+            _indexes[name] = (version, index)
+    logger.info(f"Built the {name} trigram index: {len(index)} entries (version {version})")
+    return index
+
+
+def _rebuild(name: str, version: int):
+    try:
+        _build(name, version)
+    except DatabaseError as e:
+        logger.warning(f"Rebuilding the {name} trigram index failed: {e}")
+    finally:
+        with _lock:
+            _rebuilding.discard(name)
+        connection.close()
+
+
+def get_index(name: str) -> TrigramIndex:
+    """The in-process index ``name``; built now if there is none yet, rebuilt
+    in the background (returning the previous one) if listings changed"""
+    # Read before building: the index holds at least this version's listings
+    version = stats_version()
+    current = _indexes.get(name)
+    if current is None:
+        return _build(name, version)
+    if current[0] != version:
+        with _lock:
+            start = name not in _rebuilding
+            _rebuilding.add(name)
+        if start:
+            threading.Thread(target=_rebuild, args=(name, version), daemon=True).start()
+    return current[1]
+
+
+# Installation (called from migrations)
+
+def install_trigram_index(apps, schema_editor):
+    """PostgreSQL: enable pg_trgm and create the trigram indexes. Without the
+    extension (e.g. no privilege to create it) lookups use the in-process index."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm", params=None)
+    except DatabaseError as e:
+        logger.warning(f"pg_trgm is not available, fuzzy lookups will use the in-process index: {e}")
+        return
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS listing_brand_trgm_idx ON {LISTING_TABLE} "
+        f"USING GIN ({BRAND_SQL} gin_trgm_ops) WHERE brand <> ''", params=None,
+    )
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS listing_vin_trgm_idx ON {LISTING_TABLE} "
+        f"USING GIN (({VIN_SQL}) gin_trgm_ops) WHERE serial_number <> ''", params=None,
+    )
+
+
+def remove_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS listing_brand_trgm_idx", params=None)
+    schema_editor.execute("DROP INDEX IF EXISTS listing_vin_trgm_idx", params=None)
+
+
+# Lookups
+
+_installed = {}
+
+
+def fuzzy_backend() -> str:
+    """'postgresql' when the database has the trigram indexes, else 'memory'"""
+    vendor = connection.vendor
+    if vendor not in _installed:
+        installed = False
+        if vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT count(*) FROM pg_indexes WHERE tablename = %s AND indexname IN (%s, %s)",
+                    [LISTING_TABLE, 'listing_brand_trgm_idx', 'listing_vin_trgm_idx'],
+                )
+                installed = cursor.fetchone()[0] == 2
+        _installed[vendor] = installed
+    return 'postgresql' if _installed[vendor] else 'memory'
+
+
+def _set_threshold(cursor, setting: str, threshold: float):
+    # Local to the current transaction
+    cursor.execute("SELECT set_config(%s, %s, true)", [f'pg_trgm.{setting}', str(threshold)])
+
+
+def find_brands(query: str, limit: int = FUZZY_LIMIT) -> List[Dict]:
+    """``[{brand, model, count, score}, ...]`` most similar to ``query`` first"""
+    queries = list(dict.fromkeys([query, ocr_letters(query)]))
+    if fuzzy_backend() == 'postgresql':
+        score = 'GREATEST(' + ', '.join([f'word_similarity(%s, {BRAND_SQL})'] * len(queries)) + ')'
+        condition = ' OR '.join([f'%s <%% {BRAND_SQL}'] * len(queries))
+        with transaction.atomic(), connection.cursor() as cursor:
+            _set_threshold(cursor, 'word_similarity_threshold', FUZZY_BRAND_THRESHOLD)
+            cursor.execute(
+                f"SELECT brand, model, count(*), {score} AS score FROM {LISTING_TABLE} "
+                f"WHERE brand <> '' AND ({condition}) GROUP BY brand, model "
+                f"ORDER BY score DESC, count(*) DESC LIMIT %s",
+                queries + queries + [limit],
+            )
+            rows = cursor.fetchall()
+        return [
+            {'brand': brand, 'model': model, 'count': count, 'score': round(score, 4)}
+            for brand, model, count, score in rows
+        ]
+
+    index = get_index('brand')
+    scores = {}
+    for text in queries:
+        for key, score in index.search(text, FUZZY_BRAND_THRESHOLD, limit):
+            scores[key] = max(score, scores.get(key, 0))
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0][2]))[:limit]
+    return [
+        {'brand': brand, 'model': model, 'count': count, 'score': score}
+        for (brand, model, count), score in ranked
+    ]
+
+
+def find_vins(query: str, limit: int = FUZZY_LIMIT) -> List[Tuple[int, float]]:
+    """``[(listing id, score), ...]`` for a complete or partial chassis number,
+    best match first (1.0 when it contains the query)"""
+    vin = normalize_vin(query)
+    if len(vin) < FUZZY_VIN_MIN_LENGTH:
+        return []
+    if fuzzy_backend() == 'postgresql':
+        pattern = f'%{vin}%'
+        with transaction.atomic(), connection.cursor() as cursor:
+            _set_threshold(cursor, 'word_similarity_threshold', FUZZY_VIN_THRESHOLD)
+            cursor.execute(
+                f"SELECT id, CASE WHEN {VIN_SQL} LIKE %s THEN 1.0 ELSE word_similarity(%s, {VIN_SQL}) END AS score "
+                f"FROM {LISTING_TABLE} WHERE serial_number <> '' AND ({VIN_SQL} LIKE %s OR %s <%% {VIN_SQL}) "
+                f"ORDER BY score DESC, id DESC LIMIT %s",
+                [pattern, vin, pattern, vin, limit],
+            )
+            return [(pk, round(float(score), 4)) for pk, score in cursor.fetchall()]
+    return get_index('vin').search(vin, FUZZY_VIN_THRESHOLD, limit)
+
+
+def parse_limit(value: Optional[str]) -> int:
+    try:
+        return max(1, min(int(value), FUZZY_MAX_LIMIT))
+    except (TypeError, ValueError):
+        return FUZZY_LIMIT
@@ -0,0 +1,280 @@
+"""Image URLs for imported listings.
+
+Listings that come without a usable image get one from an image search
+(Unsplash). ``ImageResolver`` works on whole batches, outside any database
+transaction: it dedupes the queries (many lots share brand, model and year),
+answers what it can from the ``ImageCache`` table (hits expire after
+``IMAGE_CACHE_TTL_DAYS``, "nothing found" after ``IMAGE_NEGATIVE_TTL_HOURS``)
+and searches the rest concurrently on a bounded thread pool.
+
+Searches are rate limited (``IMAGE_SEARCH_PER_MINUTE``), so imports only use
+direct URLs and the cache; listings still without an image are picked up
+by the background enrichment in ``listings.enrichment``.
+
+Providers (``IMAGE_PROVIDER``):
+  - ``unsplash``: the Unsplash search API (default when ``UNSPLASH_ACCESS_KEY``
+    is set; ``UNSPLASH_API_URL`` can point it at a local stub server)
+  - ``stub``:     no network; URLs from the ``IMAGE_STUB_URL`` template
+  - ``none``:     no search (default without a key)
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional, Set
+from urllib.parse import quote, urlparse
+import logging
+
+from django.utils import timezone
+
+from .models import ImageCache, Listing
+
+logger = logging.getLogger(__name__)
+
+IMAGE_PROVIDER = os.environ.get(
+    'IMAGE_PROVIDER', 'unsplash' if os.environ.get('UNSPLASH_ACCESS_KEY') else 'none'
+).lower()
+# Concurrent searches per batch
+IMAGE_RESOLVE_WORKERS = int(os.environ.get('IMAGE_RESOLVE_WORKERS', '4') or 4)
+# Provider requests per minute, shared by all threads of a process; 0 for no
+# limit (Unsplash allows 50/hour for demo apps, 5000/hour in production)
+IMAGE_SEARCH_PER_MINUTE = float(os.environ.get('IMAGE_SEARCH_PER_MINUTE', '60') or 60)
+IMAGE_SEARCH_TIMEOUT = float(os.environ.get('IMAGE_SEARCH_TIMEOUT', '8') or 8)
+IMAGE_CACHE_TTL_DAYS = int(os.environ.get('IMAGE_CACHE_TTL_DAYS', '30') or 30)
+IMAGE_NEGATIVE_TTL_HOURS = int(os.environ.get('IMAGE_NEGATIVE_TTL_HOURS', '24') or 24)
+UNSPLASH_API_URL = os.environ.get('UNSPLASH_API_URL', 'https://api.unsplash.com').rstrip('/')
+IMAGE_STUB_URL = os.environ.get('IMAGE_STUB_URL', 'https://placehold.co/1200x800?text={query}')
+
+IMAGE_URL_MAX_LENGTH = Listing._meta.get_field('image_url').max_length
+QUERY_MAX_LENGTH = ImageCache._meta.get_field('query').max_length
+
+
+def normalize_unsplash_url(url: str) -> str:
+    """Convert Unsplash page URLs to a direct, embeddable image URL.
+    - If url is images.unsplash.com, return as-is
+    - If url is unsplash.com/photos/<id>/..., convert to source.unsplash.com/<id>/1200x800
+    - If url is source.unsplash.com/..., return it as-is (no network calls)
+    """
+    try:
+        if not url:
+            return ''
+        parsed = urlparse(url)
+        host = (parsed.netloc or '').lower()
+        path = parsed.path or ''
+        if 'images.unsplash.com' in host or 'source.unsplash.com' in host:
+            return url
+        if 'unsplash.com' in host and '/photos/' in path:
+            parts = [p for p in path.split('/') if p]
+            # parts like ['photos', '<id>', ...]
+            photo_id = parts[1] if len(parts) >= 2 and parts[0] == 'photos' else ''
+            if photo_id:
+                # Use source endpoint which 302s to a proper image
+                return f"https://source.unsplash.com/{photo_id}/1200x800"
+    except Exception:
+        pass
+    return url
+
+
+def clean_image_url(url: str) -> str:
+    """The listing's own image URL made embeddable, '' if it isn't usable"""
+    url = (url or '').strip()
+    if not url or 'google.com/search' in url:
+        return ''
+    if 'unsplash.com' in url and 'images.unsplash.com' not in url:
+        return normalize_unsplash_url(url)
+    return url
+
+
+def image_query(fields: Dict) -> str:
+    """Search query for a listing: brand, model and year, else its title"""
+    parts = [str(fields[name]) for name in ('brand', 'model', 'year') if fields.get(name)]
+    # Title as last resort to keep query concise
+    if not parts and fields.get('title'):
+        parts.append(str(fields['title']))
+    return ' '.join(' '.join(parts).lower().split())[:QUERY_MAX_LENGTH] or 'vehicle'
+
+
+class UnsplashProvider:
+    """First result of the Unsplash photo search"""
+    name = 'unsplash'
+    rate_limited = True
+
+    def __init__(self, access_key: Optional[str] = None, api_url: str = UNSPLASH_API_URL,
+                 timeout: float = IMAGE_SEARCH_TIMEOUT):
+        self.access_key = access_key or os.environ.get('UNSPLASH_ACCESS_KEY', '')
+        self.api_url = api_url
+        self.timeout = timeout
+        self._session = None
+
+    def search(self, query: str) -> str:
+        """Image URL, '' when nothing matches; raises on network/API errors"""
+        import requests
+        if self._session is None:
+            self._session = requests.Session()
+        resp = self._session.get(
+            f'{self.api_url}/search/photos',
+            params={'query': query, 'per_page': 1, 'content_filter': 'high'},
+            headers={'Accept': 'application/json', 'Authorization': f'Client-ID {self.access_key}'},
+            timeout=self.timeout,
+        )
+        resp.raise_for_status()
+        results = (resp.json() or {}).get('results') or []
+        if not results:
+            return ''
+        urls = results[0].get('urls') or {}
+        # Prefer regular; fall back to small
+        return urls.get('regular') or urls.get('small') or ''
+
+
+class StubProvider:
+    """Offline provider: a URL built from a template, no network calls"""
+    name = 'stub'
+    rate_limited = False
+
+    def __init__(self, template: str = IMAGE_STUB_URL):
+        self.template = template
+
+    def search(self, query: str) -> str:
+        return self.template.format(query=quote(query)) if self.template else ''
+
+
+class RateLimiter:
+    """Space calls ``60 / per_minute`` seconds apart, across threads"""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+_rate_limiter = RateLimiter(IMAGE_SEARCH_PER_MINUTE)
+
+
+def get_image_provider(name: Optional[str] = None):
+    """Provider instance for ``name`` (defaults to ``IMAGE_PROVIDER``), None for 'none'"""
+    name = (name or IMAGE_PROVIDER).lower()
+    if name == 'unsplash':
+        return UnsplashProvider()
+    if name == 'stub':
+        return StubProvider()
+    if name != 'none':
+        logger.warning(f"Unknown image provider {name!r}, image search disabled")
+    return None
+
+
+class ImageResolver:
+    """Fill in ``image_url`` for batches of listing fields.
+
+    ``resolve`` touches the database only for the cache (one read, then one
+    bulk write), never holds a transaction while searching, and searches
+    each distinct query at most once. ``stats`` counts cache hits, searches
+    and failed searches (not cached, retried on the next run). With
+    ``search=False`` only the cache is used, and the misses are left to the
+    background enrichment (``listings.enrichment``). ``on_search`` is called
+    in the calling thread after each provider search completes.
+    """
+
+    def __init__(self, provider=None, workers: Optional[int] = None, search: bool = True,
+                 rate_limiter: Optional[RateLimiter] = None, on_search: Optional[Callable[[], None]] = None):
+        self.provider = provider if provider is not None else get_image_provider()
+        self.workers = max(1, workers or IMAGE_RESOLVE_WORKERS)
+        self.search = search
+        self.rate_limiter = rate_limiter or _rate_limiter
+        self.on_search = on_search
+        self.stats = {'direct': 0, 'cached': 0, 'searched': 0, 'found': 0, 'errors': 0}
+        self._memo: Dict[str, str] = {}
+        # Queries whose search failed are not retried by later batches of the run
+        self._failed = set()
+
+    def __call__(self, batch: List[Dict]):
+        self.resolve(batch)
+
+    def resolve(self, batch: List[Dict]) -> Set[str]:
+        """Set ``image_url`` on each fields dict of the batch, in place; returns
+        the queries that could not be answered (search failed or skipped)"""
+        missing: Dict[str, List[Dict]] = {}
+        for fields in batch:
+            fields['image_url'] = clean_image_url(fields.get('image_url'))
+            if fields['image_url']:
+                self.stats['direct'] += 1
+            elif self.provider is not None:
+                missing.setdefault(image_query(fields), []).append(fields)
+        if not missing:
+            return set()
+
+        # Answers from earlier batches of this run, then the cache, then the provider
+        found = {query: self._memo[query] for query in missing if query in self._memo}
+        lookup = [query for query in missing if query not in found and query not in self._failed]
+        if lookup:
+            found.update(self._cached(lookup))
+        to_search = [query for query in lookup if query not in found]
+        if to_search and self.search:
+            found.update(self._search(to_search))
+        self._memo.update(found)
+        for query, listings in missing.items():
+            url = found.get(query) or ''
+            for fields in listings:
+                fields['image_url'] = url
+        return set(missing) - set(found)
+
+    def _cached(self, queries: List[str]) -> Dict[str, str]:
+        """Fresh cache entries for the queries, negative ones included"""
+        now = timezone.now()
+        found = {}
+        for entry in ImageCache.objects.filter(query__in=queries):
+            ttl = timedelta(days=IMAGE_CACHE_TTL_DAYS) if entry.image_url else timedelta(hours=IMAGE_NEGATIVE_TTL_HOURS)
+            if entry.fetched_at + ttl > now:
+                found[entry.query] = entry.image_url
+        self.stats['cached'] += len(found)
+        return found
+
+    def _search_one(self, query: str) -> Optional[str]:
+        if getattr(self.provider, 'rate_limited', True):
+            self.rate_limiter.wait()
+        try:
+            return self.provider.search(query) or ''
+        except Exception as e:
+            logger.warning(f"Image search failed for {query!r}: {e}")
+            return None
+
+    def _search(self, queries: List[str]) -> Dict[str, str]:
+        """Search the queries concurrently and store the answers in the cache"""
+        results = {}
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(queries))) as pool:
+            for query, url in zip(queries, pool.map(self._search_one, queries)):
+                results[query] = url
+                if self.on_search is not None:
+                    self.on_search()
+        for query, url in results.items():
+            if url and len(url) > IMAGE_URL_MAX_LENGTH:
+                # Neither stored nor cached as "no image": a cut URL is broken, and the
+                # provider did find something, so the query is retried in a later run
+                logger.warning(f"Image URL for {query!r} is longer than {IMAGE_URL_MAX_LENGTH} characters, ignored")
+                results[query] = None
+        answered = {query: url for query, url in results.items() if url is not None}
+        self._failed.update(query for query in queries if query not in answered)
+        self.stats['searched'] += len(queries)
+        self.stats['errors'] += len(queries) - len(answered)
+        self.stats['found'] += sum(1 for url in answered.values() if url)
+        if answered:
+            now = timezone.now()
+            entries = [
+                ImageCache(query=query, image_url=url, provider=self.provider.name, fetched_at=now)
+                for query, url in answered.items()
+            ]
+            ImageCache.objects.bulk_create(
+                entries, update_conflicts=True, unique_fields=['query'],
+                update_fields=['image_url', 'provider', 'fetched_at'],
+            )
+        return answered
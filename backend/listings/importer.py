@@ -0,0 +1,371 @@
+"""Bulk import of listing JSON (n8n/Gemini output) into Listing rows.
+
+Shared by the PDF upload API (``import_json``/``import_json_no_pdf``), the
+admin JSON upload and the ``import_data`` command. Items are normalized in
+memory, lot numbers are assigned and checked against the upload's existing
+``(lot_number, pdf_upload)`` pairs (loaded with a single query), and rows are
+written with ``bulk_create`` in batches, so importing a file costs a handful
+of queries whatever its size.
+"""
+import os
+import pickle
+import tempfile
+import time
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import logging
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Listing, PDFUpload
+from .streaming import ListingStream, file_sha256, is_ndjson
+from .stats import invalidate_stats
+
+logger = logging.getLogger(__name__)
+
+# Rows per bulk INSERT
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '500') or 500)
+
+LISTING_TYPES = dict(Listing.LISTING_TYPES)
+FUEL_TYPES = dict(Listing.FUEL_TYPES)
+# Listing amounts are DecimalField(max_digits=12, decimal_places=2)
+MAX_AMOUNT = Decimal(10) ** 10
+# Fields a re-import may change on an existing listing
+UPDATE_FIELDS = [
+    'title', 'listing_type', 'short_description', 'full_description', 'brand', 'model', 'year',
+    'fuel_type', 'quantity', 'unit', 'starting_price', 'guarantee_amount', 'image_url',
+    'original_pdf_url', 'updated_at',
+]
+CHAR_FIELD_LENGTHS = {
+    field.name: field.max_length
+    for field in Listing._meta.concrete_fields
+    if field.get_internal_type() == 'CharField' and field.max_length
+}
+
+
+def parse_decimal(value, default=Decimal('0')) -> Decimal:
+    """Decimal from a number or a formatted string like '12 500,000 TND'"""
+    try:
+        if value is None:
+            return default
+        if isinstance(value, (int, float, Decimal)):
+            return Decimal(str(value))
+        cleaned = ''.join(ch for ch in str(value) if ch.isdigit() or ch in ['.', ','])
+        if cleaned.count(',') == 1 and cleaned.count('.') == 0:
+            cleaned = cleaned.replace(',', '.')
+        return Decimal(cleaned) if cleaned else default
+    except Exception:
+        return default
+
+
+def parse_year(value) -> Optional[int]:
+    try:
+        return int(value) if value not in (None, '', 'N/A') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_item(item: Dict) -> Dict:
+    """Listing field values for one JSON item (without lot number and upload).
+
+    Raises ValueError for items that can't be stored.
+    """
+    if not isinstance(item, dict):
+        raise ValueError(f"Expected an object, got {type(item).__name__}")
+
+    listing_type = str(item.get('listing_type') or 'other').lower()
+    fuel_type = str(item.get('fuel_type') or '').lower()
+    price = item.get('starting_price')
+    if price in (None, ''):
+        price = item.get('estimated_value')
+    starting_price = parse_decimal(price, Decimal('0'))
+    guarantee_amount = parse_decimal(item.get('guarantee_amount'), starting_price * Decimal('0.10'))
+    for amount in (starting_price, guarantee_amount):
+        if not amount.is_finite() or amount < 0 or amount >= MAX_AMOUNT:
+            raise ValueError(f"Amount out of range: {amount}")
+
+    fields = {
+        'title': str(item.get('title') or 'N/A'),
+        'listing_type': listing_type if listing_type in LISTING_TYPES else 'other',
+        'short_description': str(item.get('short_description') or ''),
+        'full_description': str(item.get('full_description') or ''),
+        'brand': str(item.get('brand') or ''),
+        'model': str(item.get('model') or ''),
+        'year': parse_year(item.get('year')),
+        'fuel_type': fuel_type if fuel_type in FUEL_TYPES else 'other',
+        'quantity': str(item.get('quantity') or ''),
+        'unit': str(item.get('unit') or ''),
+        'starting_price': starting_price.quantize(Decimal('0.01')),
+        'guarantee_amount': guarantee_amount.quantize(Decimal('0.01')),
+        'image_url': str(item.get('image_url') or '').strip(),
+        'original_pdf_url': str(item.get('original_pdf_url') or ''),
+    }
+    for name, max_length in CHAR_FIELD_LENGTHS.items():
+        value = fields.get(name)
+        if isinstance(value, str) and len(value) > max_length:
+            fields[name] = value[:max_length]
+    return fields
+
+
+def normalize_row(item: Dict) -> Optional[Tuple[str, Dict]]:
+    """``(lot_number, fields)`` for one JSON item, None if it can't be stored"""
+    try:
+        fields = normalize_item(item)
+    except ValueError as e:
+        logger.warning(f"Skipping listing item: {e}")
+        return None
+    return item.get('lot_number') or '', fields
+
+
+def read_import_file(path: str, known_hash: str = '', spool_dir: Optional[str] = None) -> Dict:
+    """Hash, parse and normalize one JSON/NDJSON file without touching the
+    database, so ``import_data --workers`` can run it in a worker process.
+
+    Rows are streamed to a spool file in ``spool_dir`` rather than returned,
+    so neither the worker nor the writer holds a whole file in memory; the
+    result has the file's hash, metadata, row count and ``rows_path`` (read
+    back with ``iter_spooled_rows``), or only the hash if it equals
+    ``known_hash`` (file unchanged).
+    """
+    started = time.perf_counter()
+    result = {'path': path, 'ok': False, 'error': '', 'content_hash': '', 'unchanged': False,
+              'meta': {}, 'rows_path': '', 'row_count': 0, 'seconds': 0.0}
+    try:
+        result['content_hash'] = file_sha256(path)
+        if result['content_hash'] == known_hash:
+            result['unchanged'] = True
+        else:
+            with open(path, 'rb') as f, tempfile.NamedTemporaryFile(
+                'wb', dir=spool_dir, suffix='.rows', delete=False
+            ) as spool:
+                result['rows_path'] = spool.name
+                stream = ListingStream(f, ndjson=is_ndjson(path))
+                for item in stream:
+                    pickle.dump(normalize_row(item), spool, pickle.HIGHEST_PROTOCOL)
+                    result['row_count'] += 1
+                result['meta'] = stream.meta
+        result['ok'] = True
+    except (OSError, ValueError) as e:
+        result['error'] = str(e)
+        if result['rows_path']:
+            os.unlink(result['rows_path'])
+            result['rows_path'] = ''
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+
+def iter_spooled_rows(rows_path: str) -> Iterator[Optional[Tuple[str, Dict]]]:
+    """The ``normalize_row`` results spooled by ``read_import_file``, one at a time"""
+    with open(rows_path, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def create_placeholder_upload(filename: str, city: str, auction_date) -> PDFUpload:
+    """PDFUpload for listings imported without a PDF (FileField needs a file)"""
+    pdf_upload = PDFUpload(
+        filename=str(filename),
+        city=str(city),
+        auction_date=auction_date,
+        processed=False,
+        total_listings=0,
+    )
+    placeholder_name = f"{os.path.splitext(str(filename))[0] or 'import'}.pdf"
+    pdf_upload.file.save(placeholder_name, ContentFile(b'JSON import placeholder file'), save=True)
+    return pdf_upload
+
+
+class ListingImporter:
+    """Import listing items into one PDFUpload.
+
+    ``import_items`` may be called several times, or ``import_iter`` given a
+    ``ListingStream`` for large files; ``finish`` then updates the upload's
+    counters once. ``stats``
+    counts items received, rows created, duplicates of an existing lot and
+    invalid items. ``image_resolver(batch)`` can fill in ``image_url`` on the
+    field dicts of each batch of new listings (see ``images.ImageResolver``).
+
+    With ``upsert`` the items are the full, current content of the upload
+    (a re-imported file): lots that already exist are updated in place when
+    their fields changed, and ``prune`` deletes lots no longer listed.
+    """
+
+    def __init__(self, pdf_upload: PDFUpload, batch_size: Optional[int] = None,
+                 image_resolver: Optional[Callable[[List[Dict]], None]] = None, upsert: bool = False):
+        self.pdf_upload = pdf_upload
+        self.batch_size = max(1, batch_size or IMPORT_BATCH_SIZE)
+        self.image_resolver = image_resolver
+        self.upsert = upsert
+        self.stats = {
+            'received': 0, 'created': 0, 'updated': 0, 'unchanged': 0,
+            'removed': 0, 'duplicates': 0, 'invalid': 0,
+        }
+        self._lots = None
+        self._existing: Dict[str, Listing] = {}
+        self._seen = set()
+        self._updates: List[Listing] = []
+        self._next_lot = 1
+        self._row_count = 0
+
+    @property
+    def row_count(self) -> int:
+        """Listings of the upload after the batches written so far"""
+        return self._row_count
+
+    def _load_lots(self):
+        if self._lots is not None:
+            return
+        listings = Listing.objects.filter(pdf_upload=self.pdf_upload)
+        if self.upsert:
+            self._existing = {listing.lot_number: listing for listing in listings}
+            self._lots = set(self._existing)
+        else:
+            self._lots = set(listings.values_list('lot_number', flat=True))
+        self._row_count = len(self._lots)
+
+    def _assign_lot(self, lot_number) -> Optional[str]:
+        """The item's lot number, or the next free one; None if already taken"""
+        # A re-imported file owns the upload's lots, only repeats within it clash
+        taken = self._seen if self.upsert else self._lots
+        lot_number = str(lot_number or '').strip()[:CHAR_FIELD_LENGTHS['lot_number']]
+        if lot_number:
+            return None if lot_number in taken else lot_number
+        while str(self._next_lot).zfill(3) in taken:
+            self._next_lot += 1
+        return str(self._next_lot).zfill(3)
+
+    def _update_existing(self, listing: Listing, fields: Dict):
+        # An empty image in the file doesn't clear one found later
+        if not fields['image_url']:
+            fields['image_url'] = listing.image_url
+        changed = False
+        for name, value in fields.items():
+            if getattr(listing, name) != value:
+                setattr(listing, name, value)
+                changed = True
+        if changed:
+            self._updates.append(listing)
+        else:
+            self.stats['unchanged'] += 1
+
+    def build(self, items: Iterable[Dict]) -> List[Listing]:
+        """Unsaved listings for the items that are valid and not duplicates"""
+        return self.build_normalized(normalize_row(item) for item in items)
+
+    def build_normalized(self, rows: Iterable[Optional[Tuple[str, Dict]]]) -> List[Listing]:
+        """Like ``build`` for ``normalize_row`` output (e.g. from a worker process)"""
+        self._load_lots()
+        new_rows = []
+        for row in rows:
+            self.stats['received'] += 1
+            if row is None:
+                self.stats['invalid'] += 1
+                continue
+            lot_number, fields = row
+            lot_number = self._assign_lot(lot_number)
+            if lot_number is None:
+                self.stats['duplicates'] += 1
+                continue
+            self._seen.add(lot_number)
+            self._lots.add(lot_number)
+            existing = self._existing.get(lot_number)
+            if existing is not None:
+                self._update_existing(existing, fields)
+                continue
+            new_rows.append((lot_number, fields))
+        if self.image_resolver is not None and new_rows:
+            # Once per batch and before write() opens its transaction
+            self.image_resolver([fields for _, fields in new_rows])
+        return [
+            Listing(lot_number=lot_number, pdf_upload=self.pdf_upload, **fields)
+            for lot_number, fields in new_rows
+        ]
+
+    def write(self, listings: List[Listing]) -> int:
+        """Insert prepared listings (and apply pending updates) in one transaction; returns rows created"""
+        updates, self._updates = self._updates, []
+        if not listings and not updates:
+            return 0
+        with transaction.atomic():
+            if updates:
+                now = timezone.now()
+                for listing in updates:
+                    listing.updated_at = now
+                Listing.objects.bulk_update(updates, UPDATE_FIELDS, batch_size=self.batch_size)
+                self.stats['updated'] += len(updates)
+            # Bulk writes send no signals
+            invalidate_stats()
+            if not listings:
+                return 0
+            for start in range(0, len(listings), self.batch_size):
+                Listing.objects.bulk_create(listings[start:start + self.batch_size], ignore_conflicts=True)
+            # Rows that lost a race on (lot_number, pdf_upload) are dropped by the constraint
+            total = Listing.objects.filter(pdf_upload=self.pdf_upload).count()
+        created = total - self._row_count
+        self._row_count = total
+        self.stats['created'] += created
+        self.stats['duplicates'] += len(listings) - created
+        return created
+
+    def import_items(self, items: Iterable[Dict], normalized: bool = False) -> Dict[str, int]:
+        self.write(self.build_normalized(items) if normalized else self.build(items))
+        return self.stats
+
+    def import_iter(self, items: Iterable[Dict],
+                    on_progress: Optional[Callable[[Dict[str, int]], None]] = None,
+                    normalized: bool = False) -> Dict[str, int]:
+        """Import a (possibly streamed) iterable in ``batch_size`` chunks, so at
+        most one batch is held in memory; ``on_progress(stats)`` runs after each.
+        With ``normalized`` the items are ``normalize_row`` output."""
+        iterator = iter(items)
+        batch = []
+        while True:
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            except ValueError:
+                # Keep what was read before a malformed part of a stream
+                self._import_batch(batch, on_progress, normalized)
+                raise
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._import_batch(batch, on_progress, normalized)
+                batch = []
+        self._import_batch(batch, on_progress, normalized)
+        return self.stats
+
+    def _import_batch(self, batch: List[Dict], on_progress, normalized: bool):
+        if batch:
+            self.import_items(batch, normalized)
+            if on_progress is not None:
+                on_progress(self.stats)
+
+    def prune(self) -> int:
+        """Delete the upload's listings that the imported items no longer contain"""
+        stale = [listing.pk for lot, listing in self._existing.items() if lot not in self._seen]
+        if stale:
+            Listing.objects.filter(pk__in=stale).delete()
+            self._row_count -= len(stale)
+            self.stats['removed'] += len(stale)
+        return len(stale)
+
+    def finish(self) -> Dict[str, int]:
+        """Update the upload's processed flag and listing count"""
+        if self.stats['created'] or self.stats['updated']:
+            self.pdf_upload.processed = True
+        self.pdf_upload.total_listings = self._row_count
+        self.pdf_upload.save(update_fields=['processed', 'total_listings'])
+        return self.stats
+
+
+def import_listings(pdf_upload: PDFUpload, data: Dict, **options) -> Dict[str, int]:
+    """Import ``data['listings']`` into ``pdf_upload``; returns the import stats"""
+    importer = ListingImporter(pdf_upload, **options)
+    importer.import_iter(data.get('listings') or [])
+    return importer.finish()
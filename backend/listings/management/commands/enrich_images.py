@@ -0,0 +1,58 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from listings.enrichment import IMAGE_ENRICH_BATCH_SIZE, enrichment_status, run_enrichment
+from listings.images import get_image_provider
+
+
+class Command(BaseCommand):
+    help = 'Search images for listings without one (background image enrichment)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--provider', help='unsplash, stub or none (defaults to IMAGE_PROVIDER)')
+        parser.add_argument('--batch-size', type=int, default=IMAGE_ENRICH_BATCH_SIZE, help='Listings per batch')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many listings')
+        parser.add_argument('--loop', action='store_true', help='Keep running, waiting for new listings')
+        parser.add_argument('--poll', type=float, default=60.0, help='Seconds between runs with --loop')
+        parser.add_argument('--status', action='store_true', help='Print queue depth and the last run, then exit')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        if options['status']:
+            self.stdout.write(json.dumps(enrichment_status(), indent=2, default=str))
+            return
+        provider = get_image_provider(options['provider'])
+        if provider is None:
+            self.stderr.write(self.style.ERROR('No image provider configured (set IMAGE_PROVIDER or UNSPLASH_ACCESS_KEY)'))
+            return
+
+        while True:
+            run = run_enrichment(provider, options['batch_size'], options['limit'], on_batch=self._report_batch)
+            if run is None:
+                self.stdout.write(self.style.WARNING('Another enrichment run is in progress'))
+            else:
+                self._report_run(run)
+            if not options['loop']:
+                break
+            try:
+                time.sleep(options['poll'])
+            except KeyboardInterrupt:
+                break
+
+    def _report_batch(self, run):
+        if self.verbosity > 1:
+            self.stdout.write(
+                f'  {run.scanned}/{run.queue_depth} scanned, {run.updated} updated, '
+                f'hit rate {run.hit_rate:.0%}'
+            )
+
+    def _report_run(self, run):
+        style = self.style.SUCCESS if run.status == run.STATUS_COMPLETED else self.style.ERROR
+        self.stdout.write(style(
+            f'Run {run.pk} {run.status}: {run.scanned} listing(s) scanned, {run.updated} given an image; '
+            f'{run.cache_hits} cached and {run.searched} searched quer(ies), hit rate {run.hit_rate:.0%}'
+            + (f', {run.errors} failed search(es)' if run.errors else '')
+            + (f' ({run.error})' if run.error else '')
+        ))
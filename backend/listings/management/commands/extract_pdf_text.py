@@ -23,6 +23,11 @@ class Command(BaseCommand):
             action='store_true',
             help='Force re-extraction even if TXT file already exists'
         )
+        parser.add_argument(
+            '--no-cache',
+            action='store_true',
+            help='Bypass the extraction cache and re-run pdfplumber/OCR'
+        )
 
     def handle(self, *args, **options):
         admin_instance = PDFUploadAdmin(PDFUpload, None)
@@ -31,7 +36,7 @@ class Command(BaseCommand):
             # Extract from specific PDF
             try:
                 pdf_upload = PDFUpload.objects.get(id=options['pdf_id'])
-                self.extract_single_pdf(admin_instance, pdf_upload, options['force'])
+                self.extract_single_pdf(admin_instance, pdf_upload, options['force'], not options['no_cache'])
             except PDFUpload.DoesNotExist:
                 raise CommandError(f'PDF upload with ID {options["pdf_id"]} does not exist')
         
@@ -46,7 +51,7 @@ class Command(BaseCommand):
             
             success_count = 0
             for pdf_upload in pdf_uploads:
-                if self.extract_single_pdf(admin_instance, pdf_upload, options['force']):
+                if self.extract_single_pdf(admin_instance, pdf_upload, options['force'], not options['no_cache']):
                     success_count += 1
             
             self.stdout.write(
@@ -64,7 +69,7 @@ class Command(BaseCommand):
             )
             self.print_usage('manage.py', 'extract_pdf_text')
 
-    def extract_single_pdf(self, admin_instance, pdf_upload, force=False):
+    def extract_single_pdf(self, admin_instance, pdf_upload, force=False, use_cache=True):
         """Extract text from a single PDF upload"""
         txt_path = admin_instance.get_txt_file_path(pdf_upload)
         
@@ -79,7 +84,7 @@ class Command(BaseCommand):
         self.stdout.write(f'Extracting text from {pdf_upload.filename}...')
         
         try:
-            success = admin_instance.extract_text_to_txt_file(pdf_upload)
+            success = admin_instance.extract_text_to_txt_file(pdf_upload, use_cache=use_cache)
             
             if success:
                 file_size = os.path.getsize(txt_path)
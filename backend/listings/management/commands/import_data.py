@@ -1,13 +1,21 @@
 import os
-import json
-from decimal import Decimal
+import multiprocessing
+import shutil
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from glob import glob
+from itertools import chain
 
-from django.core.files.base import ContentFile
 from django.core.management.base import BaseCommand
 from django.conf import settings
+from django.db import transaction
 
-from listings.models import PDFUpload, Listing
+from listings.importer import ListingImporter, create_placeholder_upload, iter_spooled_rows, read_import_file
+from listings.models import ImportManifest, PDFUpload
+from listings.streaming import ListingStream, file_sha256, is_ndjson
+from ocr_parser.worker import init_worker
 
 
 class Command(BaseCommand):
@@ -22,8 +30,22 @@ class Command(BaseCommand):
             '--dry-run', action='store_true', dest='dry_run', default=False,
             help='Parse and report but do not write to the database'
         )
+        parser.add_argument(
+            '--force', action='store_true', default=False,
+            help='Re-apply every file, even if its content hash is unchanged'
+        )
+        parser.add_argument(
+            '--prune', action='store_true', default=False,
+            help='Delete listings whose lot no longer appears in a changed file'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Processes that hash, parse and normalize files while this one writes them'
+        )
 
     def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        self.options = options
         base_dir = getattr(settings, 'BASE_DIR', os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
         data_dir = options.get('data_dir') or os.path.join(base_dir, 'data')
 
@@ -31,142 +53,250 @@ class Command(BaseCommand):
             self.stderr.write(self.style.ERROR(f"Data directory not found: {data_dir}"))
             return
 
-        json_paths = sorted(glob(os.path.join(data_dir, '*.json')))
+        json_paths = sorted(
+            path for pattern in ('*.json', '*.ndjson', '*.jsonl')
+            for path in glob(os.path.join(data_dir, pattern))
+        )
         if not json_paths:
             self.stdout.write(self.style.WARNING(f"No JSON files found in {data_dir}"))
             return
 
-        total_files = 0
-        total_imported = 0
+        # One query for the whole directory; unchanged files are then skipped on stat()
+        manifests = {manifest.source: manifest for manifest in ImportManifest.objects.select_related('pdf_upload')}
+
+        self.unchanged = 0
+        self.failed = []
+        self.totals = {'created': 0, 'updated': 0, 'removed': 0, 'received': 0}
+        pending = []
         for path in json_paths:
-            total_files += 1
-            try:
-                with open(path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-            except Exception as e:
-                self.stderr.write(self.style.ERROR(f"Failed to read {path}: {e}"))
+            source = os.path.basename(path)
+            manifest = manifests.get(source)
+            stat = os.stat(path)
+            if self._current(manifest) and manifest.matches_stat(stat.st_size, stat.st_mtime_ns):
+                self.unchanged += 1
                 continue
+            pending.append({'path': path, 'source': source, 'manifest': manifest, 'stat': stat})
 
-            city = (data.get('city') or 'Unknown')
-            auction_date = data.get('auction_date')
-            if not auction_date:
-                # Try parse from filename like YYYY-MM-DD in name
-                auction_date = self._try_date_from_filename(os.path.basename(path))
-            if not auction_date:
-                self.stderr.write(self.style.WARNING(f"Skipping {os.path.basename(path)}: auction_date missing"))
-                continue
+        started = time.perf_counter()
+        workers = max(1, min(options['workers'], len(pending)))
+        if workers > 1:
+            self._import_parallel(pending, workers)
+        else:
+            for task in pending:
+                self._import_sequential(task)
+        elapsed = time.perf_counter() - started
 
-            if options['dry_run']:
-                count = len(data.get('listings') or [])
-                self.stdout.write(self.style.NOTICE(f"[DRY RUN] {os.path.basename(path)} → {count} listings (city={city}, date={auction_date})"))
-                continue
+        totals = self.totals
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. Files processed: {len(json_paths)} ({self.unchanged} unchanged, skipped), "
+            f"Listings created: {totals['created']}, updated: {totals['updated']}"
+            + (f", removed: {totals['removed']}" if totals['removed'] else '')
+        ))
+        if self.failed:
+            self.stderr.write(self.style.ERROR(f"{len(self.failed)} file(s) failed: {', '.join(self.failed)}"))
+        if totals['received'] and elapsed > 0:
+            self.stdout.write(
+                f"{totals['received']} rows in {elapsed:.2f}s ({totals['received'] / elapsed:.0f} rows/s"
+                + (f", {workers} workers)" if workers > 1 else ')')
+            )
+
+    def _current(self, manifest) -> bool:
+        return manifest is not None and bool(manifest.pdf_upload_id) and not self.options['force']
+
+    def _skip_same_hash(self, task, content_hash: str) -> bool:
+        """Whether the file was touched but not modified (e.g. copied into a new image)"""
+        manifest, stat = task['manifest'], task['stat']
+        if not self._current(manifest) or manifest.content_hash != content_hash:
+            return False
+        if not self.options['dry_run']:
+            manifest.size, manifest.mtime_ns = stat.st_size, stat.st_mtime_ns
+            manifest.save(update_fields=['size', 'mtime_ns', 'updated_at'])
+        self.unchanged += 1
+        return True
+
+    def _metadata(self, source: str, meta: dict):
+        city = (meta.get('city') or 'Unknown')
+        auction_date = meta.get('auction_date')
+        if not auction_date:
+            # Try parse from filename like YYYY-MM-DD in name
+            auction_date = self._try_date_from_filename(source)
+        if not auction_date:
+            self.stderr.write(self.style.WARNING(f"Skipping {source}: auction_date missing"))
+        return city, auction_date
+
+    def _import_sequential(self, task):
+        """Hash, stream and write one file in this process"""
+        source, path = task['source'], task['path']
+        read_started = time.perf_counter()
+        try:
+            content_hash = file_sha256(path)
+        except OSError as e:
+            self._failed(task, e)
+            return
+        if self._skip_same_hash(task, content_hash):
+            return
 
-            imported = self._import_file(path, data, city, auction_date)
-            total_imported += imported
-            self.stdout.write(self.style.SUCCESS(f"Imported {imported} listings from {os.path.basename(path)}"))
+        try:
+            with open(path, 'rb') as f:
+                stream = ListingStream(f, ndjson=is_ndjson(source))
+                # Metadata placed before the listings is known once the first item is read
+                items = iter(stream)
+                first = next(items, None)
+                city, auction_date = self._metadata(source, stream.meta)
+                if not auction_date:
+                    return
+                items = chain([first] if first is not None else [], items)
+                if self.options['dry_run']:
+                    self._report_dry_run(task, sum(1 for _ in items), city, auction_date)
+                    return
+                write_started = time.perf_counter()
+                stats = self._import_file(source, items, city, auction_date, task['manifest'])
+        except (OSError, ValueError) as e:
+            self._failed(task, e)
+            return
+        # Streaming interleaves parsing with writing, so here the write time includes parsing
+        self._finish_file(task, content_hash, stats, {
+            'read': write_started - read_started, 'write': time.perf_counter() - write_started,
+        })
 
-        self.stdout.write(self.style.SUCCESS(f"Done. Files processed: {total_files}, Listings imported: {total_imported}"))
+    def _import_parallel(self, pending, workers: int):
+        """Hash, parse and normalize files in worker processes; this process is the only writer"""
+        # Largest files first, so a big export doesn't finish the run alone
+        queue = sorted(pending, key=lambda task: task['stat'].st_size)
+        running = {}
+        # Workers spool normalized rows to disk; the writer streams them back
+        spool_dir = tempfile.mkdtemp(prefix='import_data-')
+        pool = self._new_pool(workers)
+        generation = 0
+        try:
+            while queue or running:
+                # Bounded read-ahead: parsed files wait on disk for the writer
+                while queue and len(running) < workers * 2:
+                    task = queue.pop()
+                    known_hash = task['manifest'].content_hash if self._current(task['manifest']) else ''
+                    task['generation'] = generation
+                    running[pool.submit(read_import_file, task['path'], known_hash, spool_dir)] = task
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    task = running.pop(future)
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool as e:
+                        # A worker died (e.g. out of memory) and every file in flight failed
+                        # with it: each gets one more try, in a new pool
+                        task['attempts'] = task.get('attempts', 0) + 1
+                        if task['attempts'] < 2:
+                            queue.append(task)
+                        else:
+                            self._failed(task, f"worker crashed: {e}")
+                        if task['generation'] == generation:
+                            pool.shutdown(wait=False, cancel_futures=True)
+                            pool = self._new_pool(workers)
+                            generation += 1
+                        continue
+                    except Exception as e:
+                        self._failed(task, e)
+                        continue
+                    try:
+                        self._write_parsed(task, result)
+                    except Exception as e:
+                        self._failed(task, e)
+                    finally:
+                        if result['rows_path']:
+                            os.unlink(result['rows_path'])
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            shutil.rmtree(spool_dir, ignore_errors=True)
+
+    def _new_pool(self, workers: int) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker,
+        )
+
+    def _failed(self, task, error):
+        self.failed.append(task['source'])
+        self.stderr.write(self.style.ERROR(f"Failed to import {task['path']}: {error}"))
+
+    def _write_parsed(self, task, result: dict):
+        source = task['source']
+        if not result['ok']:
+            self._failed(task, result['error'])
+            return
+        if self._skip_same_hash(task, result['content_hash']):
+            return
+        city, auction_date = self._metadata(source, result['meta'])
+        if not auction_date:
+            return
+        if self.options['dry_run']:
+            self._report_dry_run(task, result['row_count'], city, auction_date)
+            return
+        write_started = time.perf_counter()
+        stats = self._import_file(
+            source, iter_spooled_rows(result['rows_path']), city, auction_date, task['manifest'], normalized=True
+        )
+        self._finish_file(task, result['content_hash'], stats, {
+            'read': result['seconds'], 'write': time.perf_counter() - write_started,
+        })
+
+    def _report_dry_run(self, task, count: int, city: str, auction_date: str):
+        action = 'new' if task['manifest'] is None else 'changed'
+        self.stdout.write(self.style.NOTICE(f"[DRY RUN] {task['source']} ({action}) → {count} listings (city={city}, date={auction_date})"))
+
+    def _finish_file(self, task, content_hash: str, stats: dict, timings: dict):
+        """Record the file in the manifest and report it"""
+        stat = task['stat']
+        manifest = task['manifest'] or ImportManifest(source=task['source'])
+        manifest.content_hash = content_hash
+        manifest.size, manifest.mtime_ns = stat.st_size, stat.st_mtime_ns
+        manifest.pdf_upload = stats.pop('pdf_upload')
+        manifest.listings_count = manifest.pdf_upload.total_listings
+        manifest.save()
+        for name in self.totals:
+            self.totals[name] += stats[name]
+        rate = stats['received'] / max(timings['write'], 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {task['source']}: {stats['created']} created, {stats['updated']} updated, "
+            f"{stats['unchanged']} unchanged" + (f", {stats['removed']} removed" if stats['removed'] else '')
+            + f" (read {timings['read']:.2f}s, write {timings['write']:.2f}s, {rate:.0f} rows/s)"
+        ))
 
     def _try_date_from_filename(self, filename: str):
         import re
         m = re.search(r'(20\d{2}-\d{2}-\d{2})', filename)
         return m.group(1) if m else None
 
-    def _parse_decimal(self, value, default=Decimal('0')):
-        try:
-            if value is None:
-                return default
-            if isinstance(value, (int, float, Decimal)):
-                return Decimal(str(value))
-            cleaned = ''.join(ch for ch in str(value) if ch.isdigit() or ch in ['.', ','])
-            if cleaned.count(',') == 1 and cleaned.count('.') == 0:
-                cleaned = cleaned.replace(',', '.')
-            return Decimal(cleaned) if cleaned else default
-        except Exception:
-            return default
-
-    def _import_file(self, path: str, data: dict, city: str, auction_date: str) -> int:
-        # Create placeholder PDFUpload to relate listings to this import
-        source_txt = os.path.basename(path)
-        placeholder_bytes = b'JSON import placeholder file'
-        placeholder_name = f"{os.path.splitext(source_txt)[0]}.pdf"
-
-        pdf_upload = PDFUpload(
-            filename=source_txt,
-            city=str(city),
-            auction_date=auction_date,
-            processed=False,
-            total_listings=0,
-        )
-        pdf_upload.file.save(placeholder_name, ContentFile(placeholder_bytes), save=True)
-
-        listings = data.get('listings') or []
-        created = 0
-        existing_lots = set(pdf_upload.listings.values_list('lot_number', flat=True))
-        next_lot_seq = 1
-        for item in listings:
-            try:
-                title = item.get('title') or 'N/A'
-                short_description = item.get('short_description') or ''
-                full_description = item.get('full_description') or ''
-                listing_type = (item.get('listing_type') or 'other').lower()
-                brand = item.get('brand') or ''
-                model = item.get('model') or ''
-                year_val = item.get('year')
-                try:
-                    year = int(year_val) if year_val not in (None, '', 'N/A') else None
-                except Exception:
-                    year = None
-                fuel_type = (item.get('fuel_type') or '').lower()
-
-                starting_price = self._parse_decimal(
-                    item.get('starting_price', item.get('estimated_value')),
-                    Decimal('0')
-                )
-                guarantee_amount = self._parse_decimal(
-                    item.get('guarantee_amount'),
-                    starting_price * Decimal('0.10')
-                )
-
-                lot_number = str(item.get('lot_number') or '').strip()
-                if not lot_number:
-                    while True:
-                        candidate = str(next_lot_seq).zfill(3)
-                        next_lot_seq += 1
-                        if candidate not in existing_lots:
-                            lot_number = candidate
-                            existing_lots.add(candidate)
-                            break
-
-                # Idempotency: avoid duplicate (pdf_upload, lot_number) pairs
-                if Listing.objects.filter(pdf_upload=pdf_upload, lot_number=lot_number).exists():
-                    continue
-
-                Listing.objects.create(
-                    lot_number=lot_number,
-                    title=title,
-                    listing_type=listing_type if listing_type in dict(Listing.LISTING_TYPES) else 'other',
-                    short_description=short_description,
-                    full_description=full_description,
-                    brand=brand,
-                    model=model,
-                    year=year,
-                    fuel_type=fuel_type if fuel_type in dict(Listing.FUEL_TYPES) else 'other',
-                    quantity=str(item.get('quantity') or ''),
-                    unit=str(item.get('unit') or ''),
-                    starting_price=starting_price,
-                    guarantee_amount=guarantee_amount,
-                    pdf_upload=pdf_upload,
-                    image_url=str(item.get('image_url') or ''),
-                    original_pdf_url=str(item.get('original_pdf_url') or ''),
-                )
-                created += 1
-            except Exception:
-                continue
+    def _import_file(self, source: str, items, city: str, auction_date: str,
+                     manifest, normalized: bool = False) -> dict:
+        """Upsert the file's listings into its upload in one transaction; returns the import stats"""
+        with transaction.atomic():
+            pdf_upload = manifest.pdf_upload if manifest is not None else None
+            if pdf_upload is None:
+                # Uploads imported before the manifest existed are reused, not duplicated
+                pdf_upload = PDFUpload.objects.filter(filename=source).order_by('-uploaded_at').first()
+            if pdf_upload is None:
+                pdf_upload = create_placeholder_upload(source, city, auction_date)
+            elif (pdf_upload.city, str(pdf_upload.auction_date)) != (city, str(auction_date)):
+                pdf_upload.city, pdf_upload.auction_date = city, auction_date
+                pdf_upload.save(update_fields=['city', 'auction_date'])
+                pdf_upload.refresh_from_db(fields=['auction_date'])
 
-        pdf_upload.processed = True if created > 0 else pdf_upload.processed
-        pdf_upload.total_listings = (pdf_upload.total_listings or 0) + created
-        pdf_upload.save(update_fields=['processed', 'total_listings'])
-        return created
+            importer = ListingImporter(pdf_upload, upsert=True)
+            started = time.perf_counter()
 
+            def on_progress(stats):
+                if self.verbosity > 1:
+                    rate = stats['received'] / max(time.perf_counter() - started, 1e-6)
+                    self.stdout.write(f"  {source}: {stats['received']} listings written ({rate:.0f}/s)")
 
+            importer.import_iter(items, on_progress=on_progress, normalized=normalized)
+            if self.options['prune']:
+                importer.prune()
+            stats = dict(importer.finish())
+        if stats['duplicates'] or stats['invalid']:
+            self.stdout.write(
+                f"  {stats['duplicates']} duplicate lot(s) and {stats['invalid']} invalid item(s) skipped"
+            )
+        stats['pdf_upload'] = pdf_upload
+        return stats
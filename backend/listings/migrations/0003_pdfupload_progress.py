@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:04
+
+from django.db import migrations, models
+
+
+def mark_processed_uploads_done(apps, schema_editor):
+    PDFUpload = apps.get_model('listings', 'PDFUpload')
+    PDFUpload.objects.filter(processed=True).update(processing_stage='done')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0002_listing_deadline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfupload',
+            name='pages_processed',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pdfupload',
+            name='pages_total',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pdfupload',
+            name='processing_stage',
+            field=models.CharField(choices=[('pending', 'Pending'), ('extracting', 'Extracting text'), ('ocr', 'Running OCR'), ('parsing', 'Parsing listings'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+        migrations.RunPython(mark_processed_uploads_done, migrations.RunPython.noop),
+    ]
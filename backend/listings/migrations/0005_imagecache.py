@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:24
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0004_importmanifest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(max_length=255, unique=True)),
+                ('image_url', models.URLField(blank=True, max_length=500)),
+                ('provider', models.CharField(blank=True, max_length=50)),
+                ('fetched_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['query'],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:27
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0005_imagecache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageEnrichmentRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed'), ('interrupted', 'Interrupted')], default='running', max_length=20)),
+                ('provider', models.CharField(blank=True, max_length=50)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('queue_depth', models.IntegerField(default=0)),
+                ('last_listing_id', models.BigIntegerField(default=0)),
+                ('scanned', models.IntegerField(default=0)),
+                ('updated', models.IntegerField(default=0)),
+                ('cache_hits', models.IntegerField(default=0)),
+                ('searched', models.IntegerField(default=0)),
+                ('found', models.IntegerField(default=0)),
+                ('errors', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='image_checked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('image_url', '')), fields=['id'], name='listing_no_image_idx'),
+        ),
+    ]
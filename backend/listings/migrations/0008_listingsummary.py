@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:33
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0007_thumbnailsource'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=1)),
+                ('computed_version', models.BigIntegerField(default=0)),
+                ('data', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('computed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Listing summary',
+            },
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations
+
+from listings.search import install_search_index, remove_search_index
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0009_listing_query_indexes'),
+    ]
+
+    operations = [
+        # PostgreSQL: tsvector column, trigger and GIN index; SQLite: FTS5 table and triggers
+        migrations.RunPython(install_search_index, remove_search_index),
+    ]
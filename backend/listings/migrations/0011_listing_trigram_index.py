@@ -0,0 +1,16 @@
+from django.db import migrations
+
+from listings.fuzzy import install_trigram_index, remove_trigram_index
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0010_listing_search'),
+    ]
+
+    operations = [
+        # PostgreSQL: pg_trgm and GIN trigram indexes on brand + model and the
+        # normalized chassis number; other databases use an in-process index
+        migrations.RunPython(install_trigram_index, remove_trigram_index),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:02
+
+from django.db import migrations, models
+
+from listings.search import install_search_index
+
+
+def reinstall_sqlite_search_index(apps, schema_editor):
+    # SQLite alters a column by rebuilding the table, which drops the search triggers
+    if schema_editor.connection.vendor == 'sqlite':
+        install_search_index(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0011_listing_trigram_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, reinstall_sqlite_search_index),
+        # Same length as ImageCache.image_url, so a cached URL always fits
+        migrations.AlterField(
+            model_name='listing',
+            name='image_url',
+            field=models.URLField(blank=True, max_length=500),
+        ),
+        migrations.RunPython(reinstall_sqlite_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:03
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def interrupt_extra_running_runs(apps, schema_editor):
+    """Keep the newest running run, so the constraint can be added"""
+    ImageEnrichmentRun = apps.get_model('listings', 'ImageEnrichmentRun')
+    running = ImageEnrichmentRun.objects.filter(status='running').order_by('-started_at', '-pk')
+    newest = running.first()
+    if newest is not None:
+        running.exclude(pk=newest.pk).update(status='interrupted', finished_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0012_listing_image_url_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(interrupt_extra_running_runs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='imageenrichmentrun',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'running')), fields=('status',), name='one_running_image_enrichment'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0013_image_enrichment_single_run'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pdfupload',
+            index=models.Index(fields=['auction_date'], name='pdfupload_auction_date_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 import os
 
@@ -26,6 +27,16 @@ class AuctionGroup(models.Model):
 
 class PDFUpload(models.Model):
     """Represents uploaded PDF files with metadata"""
+    
+    PROCESSING_STAGES = [
+        ('pending', 'Pending'),
+        ('extracting', 'Extracting text'),
+        ('ocr', 'Running OCR'),
+        ('parsing', 'Parsing listings'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
     file = models.FileField(upload_to=pdf_upload_path)
     filename = models.CharField(max_length=255)
     city = models.CharField(max_length=100)  # e.g., "Kef", "Sidi Bouzid"
@@ -34,11 +45,29 @@ class PDFUpload(models.Model):
     processed = models.BooleanField(default=False)
     total_listings = models.IntegerField(default=0)
     
+    # Progress of the streaming parse pipeline
+    processing_stage = models.CharField(max_length=20, choices=PROCESSING_STAGES, default='pending')
+    pages_total = models.IntegerField(default=0)
+    pages_processed = models.IntegerField(default=0)
+    
     class Meta:
         ordering = ['-uploaded_at']
+        indexes = [
+            # Listing filters on pdf_upload__city / __auction_date, the cities list
+            models.Index(fields=['city', 'auction_date'], name='pdfupload_city_date_idx'),
+            # pdf_upload__auction_date ranges without a city
+            models.Index(fields=['auction_date'], name='pdfupload_auction_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.city} - {self.auction_date} ({self.filename})"
+    
+    @property
+    def progress_percent(self):
+        """Share of pages extracted so far"""
+        if not self.pages_total:
+            return 100 if self.processing_stage == 'done' else 0
+        return round(100 * self.pages_processed / self.pages_total)
 
 
 class Listing(models.Model):
@@ -88,7 +117,8 @@ class Listing(models.Model):
     auction_group = models.ForeignKey(AuctionGroup, on_delete=models.SET_NULL, null=True, blank=True)
     
     # Images and links
-    image_url = models.URLField(blank=True)  # Auto-fetched image
+    image_url = models.URLField(max_length=500, blank=True)  # Auto-fetched image; as long as ImageCache.image_url
+    image_checked_at = models.DateTimeField(null=True, blank=True)  # Last image search that found nothing
     original_pdf_url = models.URLField(blank=True)  # Link to original PDF
     
     # Metadata
@@ -101,6 +131,25 @@ class Listing(models.Model):
     class Meta:
         ordering = ['lot_number']
         unique_together = ['lot_number', 'pdf_upload']  # Prevent duplicate lots per PDF
+        # Filter + ordering combinations of ListingViewSet (see test_query_plans in tests.py)
+        indexes = [
+            # Default list order, alone and within a type
+            models.Index(fields=['-created_at'], name='listing_created_idx'),
+            models.Index(fields=['listing_type', '-created_at'], name='listing_type_created_idx'),
+            # Price ranges and price ordering, alone and within a type
+            models.Index(fields=['starting_price'], name='listing_price_idx'),
+            models.Index(fields=['listing_type', 'starting_price'], name='listing_type_price_idx'),
+            # Year ranges and year ordering, alone and per brand / fuel type
+            models.Index(fields=['year'], name='listing_year_idx'),
+            models.Index(fields=['brand', 'year'], name='listing_brand_year_idx'),
+            models.Index(fields=['fuel_type', 'year'], name='listing_fuel_year_idx'),
+            # Expired / urgent listings; most listings have no deadline
+            models.Index(fields=['deadline'], name='listing_deadline_idx',
+                         condition=models.Q(deadline__isnull=False)),
+            # Image enrichment queue (listings without an image, walked by id)
+            models.Index(fields=['id'], name='listing_no_image_idx',
+                         condition=models.Q(image_url='')),
+        ]
     
     def __str__(self):
         return f"Lot {self.lot_number}: {self.title}"
@@ -156,3 +205,130 @@ class Listing(models.Model):
             return "warning"
         else:
             return "normal"
+
+
+class ImportManifest(models.Model):
+    """A JSON file imported by ``import_data``, keyed by its content hash"""
+    
+    source = models.CharField(max_length=255, unique=True)  # File name inside the data directory
+    content_hash = models.CharField(max_length=64)  # SHA-256 of the file bytes
+    size = models.BigIntegerField(default=0)
+    mtime_ns = models.BigIntegerField(default=0)
+    pdf_upload = models.ForeignKey(
+        PDFUpload, on_delete=models.SET_NULL, null=True, blank=True, related_name='import_manifests'
+    )
+    listings_count = models.IntegerField(default=0)
+    imported_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['source']
+    
+    def __str__(self):
+        return f"{self.source} ({self.content_hash[:12]})"
+    
+    def matches_stat(self, size: int, mtime_ns: int) -> bool:
+        """Whether the file looks unchanged without reading it"""
+        return self.size == size and self.mtime_ns == mtime_ns
+
+
+class ImageCache(models.Model):
+    """Result of an image search, shared by all listings with the same query"""
+    
+    query = models.CharField(max_length=255, unique=True)  # Normalized "brand model year"
+    image_url = models.URLField(max_length=500, blank=True)  # Empty: nothing found (negative entry)
+    provider = models.CharField(max_length=50, blank=True)
+    fetched_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['query']
+    
+    def __str__(self):
+        return f"{self.query} → {self.image_url or '(none)'}"
+
+
+class ImageEnrichmentRun(models.Model):
+    """One pass of the background image search over listings without an image"""
+    
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_INTERRUPTED = 'interrupted'
+    STATUS_CHOICES = [
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_INTERRUPTED, 'Interrupted'),
+    ]
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_RUNNING)
+    provider = models.CharField(max_length=50, blank=True)
+    started_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)  # Heartbeat, bumped after every batch
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    # Progress and counters
+    queue_depth = models.IntegerField(default=0)  # Listings waiting when the run started
+    last_listing_id = models.BigIntegerField(default=0)
+    scanned = models.IntegerField(default=0)
+    updated = models.IntegerField(default=0)  # Listings given an image
+    cache_hits = models.IntegerField(default=0)
+    searched = models.IntegerField(default=0)
+    found = models.IntegerField(default=0)
+    errors = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    
+    class Meta:
+        ordering = ['-started_at']
+        constraints = [
+            # One run at a time: starting a run is an INSERT that loses the race
+            models.UniqueConstraint(
+                fields=['status'], condition=models.Q(status='running'), name='one_running_image_enrichment'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"Image enrichment {self.pk} ({self.status})"
+    
+    @property
+    def hit_rate(self) -> float:
+        """Share of distinct queries answered from the cache"""
+        lookups = self.cache_hits + self.searched
+        return round(self.cache_hits / lookups, 3) if lookups else 0.0
+
+
+class ThumbnailSource(models.Model):
+    """An image URL fetched for thumbnails, and the hash of its content"""
+    
+    url_hash = models.CharField(max_length=64, unique=True)  # SHA-256 of the URL
+    url = models.TextField()
+    content_hash = models.CharField(max_length=64, blank=True)  # SHA-256 of the image, names the files
+    width = models.IntegerField(default=0)
+    height = models.IntegerField(default=0)
+    fetched_at = models.DateTimeField(default=timezone.now)
+    error = models.CharField(max_length=255, blank=True)  # Last fetch/decode failure
+    
+    class Meta:
+        ordering = ['-fetched_at']
+    
+    def __str__(self):
+        return f"{self.url} → {self.content_hash[:12] or self.error or '(pending)'}"
+
+
+class ListingSummary(models.Model):
+    """Materialized listing statistics (a single row).
+    
+    ``version`` is bumped whenever listings change; ``data`` is valid while
+    ``computed_version`` matches it.
+    """
+    
+    version = models.BigIntegerField(default=1)
+    computed_version = models.BigIntegerField(default=0)
+    data = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    computed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name_plural = 'Listing summary'
+    
+    def __str__(self):
+        return f"Listing summary v{self.computed_version}/{self.version}"
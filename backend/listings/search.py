@@ -0,0 +1,268 @@
+"""Full-text search over listings, behind the ``?search=`` parameter.
+
+The searchable text (title and lot number, brand and model, short
+description) is indexed by the database itself, maintained by triggers so
+every write path is covered, ``bulk_create``/``bulk_update`` included:
+
+  - PostgreSQL: a ``search_vector`` tsvector column on the listings table
+    (weights A/B/C for the three parts) with a GIN index
+  - SQLite: a contentless FTS5 table ``listings_listing_fts`` (unicode61
+    tokenizer, diacritics removed), ranked with bm25
+
+Text is normalized the same way when indexed (in SQL) and when queried
+(``normalize_search_text``): lowercase, Arabic alef/ya/hamza/ta marbuta
+folding, tashkeel and tatweel removed, French accents stripped,
+Arabic-Indic digits as ASCII. Each query word matches as a prefix, all
+words must match, and results are ordered by relevance unless the request
+asks for another ``ordering``.
+
+Other databases (or a database where the migration could not install the
+index) fall back to DRF's ``icontains`` search.
+"""
+import re
+import unicodedata
+from typing import List, Optional
+import logging
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TABLE = 'listings_listing'
+FTS_TABLE = 'listings_listing_fts'
+# Words of a query used for matching, the rest are ignored
+SEARCH_MAX_TERMS = 10
+
+# Characters folded (or, mapped to '', removed) before indexing and searching.
+# Changing this needs a migration that calls install_search_index() again.
+SEARCH_FOLDING = [
+    # Arabic letters
+    ('أ', 'ا'), ('إ', 'ا'), ('آ', 'ا'), ('ٱ', 'ا'),
+    ('ى', 'ي'), ('ئ', 'ي'), ('ؤ', 'و'), ('ة', 'ه'),
+    # Tashkeel, dagger alef, hamza marks and tatweel
+    *[(chr(code), '') for code in range(0x064B, 0x0653)],
+    ('ٰ', ''), ('ٔ', ''), ('ٕ', ''), ('ـ', ''),
+    # Arabic-Indic digits
+    *[(chr(0x0660 + digit), str(digit)) for digit in range(10)],
+    # French accents and ligatures
+    *[(char, 'a') for char in 'àâäáãå'], ('ç', 'c'), *[(char, 'e') for char in 'éèêë'],
+    *[(char, 'i') for char in 'îïíì'], ('ñ', 'n'), *[(char, 'o') for char in 'ôöóòõ'],
+    *[(char, 'u') for char in 'ùûüú'], ('ÿ', 'y'), ('ý', 'y'), ('œ', 'oe'), ('æ', 'ae'),
+]
+_FOLDING_TABLE = str.maketrans({source: target for source, target in SEARCH_FOLDING})
+
+# Indexed parts: (SQLite FTS column, listing columns, PostgreSQL weight, bm25 weight)
+SEARCH_PARTS = [
+    ('title', ['title', 'lot_number'], 'A', 10.0),
+    ('names', ['brand', 'model'], 'B', 5.0),
+    ('description', ['short_description'], 'C', 1.0),
+]
+
+
+def normalize_search_text(text: str) -> str:
+    """Text folded like the search index folds it"""
+    text = (text or '').lower().translate(_FOLDING_TABLE)
+    # Remaining combining marks (accents not in the table)
+    text = ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+    return unicodedata.normalize('NFC', text)
+
+
+def search_terms(query: str) -> List[str]:
+    """Normalized words of a search query"""
+    return [term for term in re.split(r'[\W_]+', normalize_search_text(query)) if term][:SEARCH_MAX_TERMS]
+
+
+# Installation (called from migrations)
+
+def _quote(text: str) -> str:
+    return "'" + text.replace("'", "''") + "'"
+
+
+def _pg_normalize(expression: str) -> str:
+    single = [(source, target) for source, target in SEARCH_FOLDING if len(target) <= 1]
+    # translate() maps each source character to the target at the same position
+    # and deletes the ones past the end, so removals go last
+    single.sort(key=lambda pair: pair[1] == '')
+    sources = ''.join(source for source, _ in single)
+    targets = ''.join(target for _, target in single)
+    sql = f"translate(lower({expression}), {_quote(sources)}, {_quote(targets)})"
+    for source, target in SEARCH_FOLDING:
+        if len(target) > 1:
+            sql = f"replace({sql}, {_quote(source)}, {_quote(target)})"
+    return sql
+
+
+def _sqlite_normalize(expression: str) -> str:
+    # The unicode61 tokenizer folds case and Latin accents; the rest is replaced here
+    sql = expression
+    for source, target in SEARCH_FOLDING:
+        sql = f"replace({sql}, {_quote(source)}, {_quote(target)})"
+    return sql
+
+
+def _concat(prefix: str, columns: List[str]) -> str:
+    return " || ' ' || ".join(f"coalesce({prefix}{column}, '')" for column in columns)
+
+
+def _postgresql_install() -> List[str]:
+    source_columns = [column for _, columns, _, _ in SEARCH_PARTS for column in columns]
+    vector = ' || '.join(
+        f"setweight(to_tsvector('simple', {_pg_normalize(_concat('NEW.', columns))}), '{weight}')"
+        for _, columns, weight, _ in SEARCH_PARTS
+    )
+    return [
+        f"ALTER TABLE {SEARCH_TABLE} ADD COLUMN IF NOT EXISTS search_vector tsvector",
+        f"""CREATE OR REPLACE FUNCTION {SEARCH_TABLE}_search_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {vector};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql""",
+        f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_search ON {SEARCH_TABLE}",
+        f"""CREATE TRIGGER {SEARCH_TABLE}_search
+BEFORE INSERT OR UPDATE OF {', '.join(source_columns)} ON {SEARCH_TABLE}
+FOR EACH ROW EXECUTE FUNCTION {SEARCH_TABLE}_search_update()""",
+        # Existing rows: assigning a column fires the trigger
+        f"UPDATE {SEARCH_TABLE} SET title = title",
+        f"CREATE INDEX IF NOT EXISTS listing_search_idx ON {SEARCH_TABLE} USING GIN (search_vector)",
+    ]
+
+
+def _postgresql_uninstall() -> List[str]:
+    return [
+        f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_search ON {SEARCH_TABLE}",
+        f"DROP FUNCTION IF EXISTS {SEARCH_TABLE}_search_update()",
+        "DROP INDEX IF EXISTS listing_search_idx",
+        f"ALTER TABLE {SEARCH_TABLE} DROP COLUMN IF EXISTS search_vector",
+    ]
+
+
+def _sqlite_install() -> List[str]:
+    fts_columns = ', '.join(name for name, _, _, _ in SEARCH_PARTS)
+
+    def values(prefix: str) -> str:
+        return ', '.join(_sqlite_normalize(_concat(prefix, columns)) for _, columns, _, _ in SEARCH_PARTS)
+
+    insert = f"INSERT INTO {FTS_TABLE}(rowid, {fts_columns}) VALUES (new.id, {values('new.')});"
+    # Contentless tables delete a row given the values it was indexed with
+    delete = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {fts_columns}) VALUES ('delete', old.id, {values('old.')});"
+    source_columns = ', '.join(column for _, columns, _, _ in SEARCH_PARTS for column in columns)
+    return _sqlite_uninstall() + [
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({fts_columns}, content='', "
+        f"tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER {SEARCH_TABLE}_search_insert AFTER INSERT ON {SEARCH_TABLE} BEGIN {insert} END",
+        f"CREATE TRIGGER {SEARCH_TABLE}_search_delete AFTER DELETE ON {SEARCH_TABLE} BEGIN {delete} END",
+        f"CREATE TRIGGER {SEARCH_TABLE}_search_update AFTER UPDATE OF {source_columns} ON {SEARCH_TABLE} "
+        f"BEGIN {delete} {insert} END",
+        f"INSERT INTO {FTS_TABLE}(rowid, {fts_columns}) SELECT id, {values('')} FROM {SEARCH_TABLE}",
+    ]
+
+
+def _sqlite_uninstall() -> List[str]:
+    return [
+        f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_search_insert",
+        f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_search_delete",
+        f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_search_update",
+        f"DROP TABLE IF EXISTS {FTS_TABLE}",
+    ]
+
+
+def install_search_index(apps, schema_editor):
+    """Create (or rebuild) the search index of the current database"""
+    statements = {'postgresql': _postgresql_install, 'sqlite': _sqlite_install}.get(schema_editor.connection.vendor)
+    for statement in statements() if statements else []:
+        schema_editor.execute(statement, params=None)
+
+
+def remove_search_index(apps, schema_editor):
+    statements = {'postgresql': _postgresql_uninstall, 'sqlite': _sqlite_uninstall}.get(schema_editor.connection.vendor)
+    for statement in statements() if statements else []:
+        schema_editor.execute(statement, params=None)
+
+
+# Querying
+
+_installed = {}
+
+
+def search_backend() -> Optional[str]:
+    """'postgresql' or 'sqlite' when the database has the search index, else None"""
+    vendor = connection.vendor
+    if vendor not in _installed:
+        installed = False
+        if vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                columns = connection.introspection.get_table_description(cursor, SEARCH_TABLE)
+            installed = any(column.name == 'search_vector' for column in columns)
+        elif vendor == 'sqlite':
+            # Rebuilding the table (SQLite ALTER in later migrations) drops its triggers
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT count(*) FROM sqlite_master WHERE (type = 'table' AND name = %s) "
+                    "OR (type = 'trigger' AND tbl_name = %s AND name LIKE %s)",
+                    [FTS_TABLE, SEARCH_TABLE, f'{SEARCH_TABLE}_search_%'],
+                )
+                installed = cursor.fetchone()[0] == 4
+            if not installed and FTS_TABLE in connection.introspection.table_names():
+                logger.warning("Listing search triggers are missing, using icontains search; "
+                               "run install_search_index() from a migration to rebuild the index")
+        _installed[vendor] = installed
+    return vendor if _installed[vendor] else None
+
+
+def search_listings(queryset, query: str, backend: str, rank: bool = True):
+    """Listings matching every word of ``query`` (as prefixes); with ``rank``,
+    annotated with ``search_rank`` (higher is more relevant)"""
+    terms = search_terms(query)
+    if not terms:
+        return queryset
+    if backend == 'postgresql':
+        tsquery = ' & '.join(f"{_quote(term)}:*" for term in terms)
+        condition = f"{SEARCH_TABLE}.search_vector @@ to_tsquery('simple', %s)"
+        queryset = queryset.filter(RawSQL(condition, [tsquery], output_field=BooleanField()))
+        if rank:
+            score = f"ts_rank_cd({SEARCH_TABLE}.search_vector, to_tsquery('simple', %s))"
+            queryset = queryset.annotate(search_rank=RawSQL(score, [tsquery], output_field=FloatField()))
+        return queryset
+
+    match = ' '.join('"' + term.replace('"', '""') + '"*' for term in terms)
+    if not rank:
+        return queryset.filter(pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]))
+    # bm25() only works in the query that runs the MATCH, so join the FTS table
+    # (a correlated subquery per row would repeat the full-text query for each)
+    weights = ', '.join(str(weight) for _, _, _, weight in SEARCH_PARTS)
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f"{FTS_TABLE}.rowid = {SEARCH_TABLE}.id", f"{FTS_TABLE} MATCH %s"],
+        params=[match],
+        select={'search_rank': f"-bm25({FTS_TABLE}, {weights})"},  # lower bm25 is better
+    )
+
+
+def search_queryset(request, queryset, view, rank: bool = True):
+    """Apply the request's ``?search=`` with the best available backend"""
+    backend = search_backend()
+    if backend is None:
+        return filters.SearchFilter().filter_queryset(request, queryset, view)
+    query = request.query_params.get(filters.SearchFilter.search_param, '')
+    return search_listings(queryset, query, backend, rank=rank)
+
+
+class ListingSearchFilter(filters.SearchFilter):
+    """``?search=`` through the full-text index (``icontains`` without one)"""
+
+    def filter_queryset(self, request, queryset, view):
+        return search_queryset(request, queryset, view)
+
+
+class ListingOrderingFilter(filters.OrderingFilter):
+    """Orders search results by relevance unless ``ordering`` is given"""
+
+    def get_ordering(self, request, queryset, view):
+        ranked = 'search_rank' in queryset.query.annotations or 'search_rank' in queryset.query.extra
+        if not request.query_params.get(self.ordering_param) and ranked:
+            return ['-search_rank'] + list(self.get_default_ordering(view) or [])
+        return super().get_ordering(request, queryset, view)
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Listing, PDFUpload, AuctionGroup
+from .thumbnails import thumbnail_urls
 
 
 class AuctionGroupSerializer(serializers.ModelSerializer):
@@ -9,13 +10,19 @@ class AuctionGroupSerializer(serializers.ModelSerializer):
 
 
 class PDFUploadSerializer(serializers.ModelSerializer):
+    progress_percent = serializers.ReadOnlyField()
+    
     class Meta:
         model = PDFUpload
         fields = [
             'id', 'filename', 'city', 'auction_date', 
-            'uploaded_at', 'processed', 'total_listings'
+            'uploaded_at', 'processed', 'total_listings',
+            'processing_stage', 'pages_total', 'pages_processed', 'progress_percent'
+        ]
+        read_only_fields = [
+            'uploaded_at', 'processed', 'total_listings',
+            'processing_stage', 'pages_total', 'pages_processed', 'progress_percent'
         ]
-        read_only_fields = ['uploaded_at', 'processed', 'total_listings']
 
 
 class ListingCreateSerializer(serializers.ModelSerializer):
@@ -81,15 +88,20 @@ class ListingListSerializer(serializers.ModelSerializer):
     is_expired = serializers.ReadOnlyField()
     days_until_deadline = serializers.ReadOnlyField()
     deadline_status = serializers.ReadOnlyField()
+    thumbnails = serializers.SerializerMethodField()
     
     class Meta:
         model = Listing
         fields = [
             'id', 'lot_number', 'title', 'display_title', 'listing_type',
             'short_description', 'brand', 'model', 'year', 'fuel_type',
-            'starting_price', 'formatted_price', 'image_url', 'city', 'auction_date',
+            'starting_price', 'formatted_price', 'image_url', 'thumbnails', 'city', 'auction_date',
             'deadline', 'is_expired', 'days_until_deadline', 'deadline_status'
         ]
+    
+    def get_thumbnails(self, obj):
+        """Resized local copies of image_url ([{size, width, url}]), for srcset"""
+        return thumbnail_urls(obj, self.context.get('request'))
 
 
 class PDFUploadCreateSerializer(serializers.ModelSerializer):
@@ -0,0 +1,127 @@
+"""Listing statistics, materialized in one ``ListingSummary`` row.
+
+``get_listing_stats`` returns the stored statistics while they are current
+(a primary-key read, whatever the size of the listings table) and recomputes
+them from a single grouped aggregate after listings changed.
+
+Changes are tracked with a version counter, bumped after the changing
+transaction commits (so concurrent readers never store numbers from before
+the commit as current):
+  - ``post_save``/``post_delete`` of listings and uploads
+  - explicit ``invalidate_stats()`` calls from the bulk write paths
+    (``bulk_create``/``bulk_update`` send no signals)
+"""
+import json
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Listing, ListingSummary, PDFUpload
+
+SUMMARY_PK = 1
+
+
+def compute_listing_stats() -> Dict:
+    """Statistics from one GROUP BY (type, city, auction date) query"""
+    rows = (
+        Listing.objects.order_by()
+        .values('listing_type', 'pdf_upload__city', 'pdf_upload__auction_date')
+        .annotate(
+            count=Count('id'),
+            min_price=Min('starting_price'),
+            max_price=Max('starting_price'),
+            sum_price=Sum('starting_price'),
+        )
+    )
+    by_type = defaultdict(int)
+    by_city = defaultdict(int)
+    by_date = defaultdict(int)
+    total = 0
+    price_sum = Decimal('0')
+    min_price = max_price = None
+    for row in rows:
+        count = row['count']
+        total += count
+        by_type[row['listing_type']] += count
+        by_city[row['pdf_upload__city']] += count
+        by_date[row['pdf_upload__auction_date']] += count
+        price_sum += row['sum_price'] or 0
+        if min_price is None or row['min_price'] < min_price:
+            min_price = row['min_price']
+        if max_price is None or row['max_price'] > max_price:
+            max_price = row['max_price']
+
+    return {
+        # Keys of the original endpoint
+        'total_listings': total,
+        'vehicle_count': by_type.get('vehicle', 0),
+        'goods_count': by_type.get('goods', 0),
+        'cities': sorted(by_city),
+        'by_type': dict(sorted(by_type.items())),
+        'by_city': [{'city': city, 'count': count} for city, count in sorted(by_city.items())],
+        'by_auction_date': [
+            {'auction_date': auction_date, 'count': count}
+            for auction_date, count in sorted(by_date.items())
+        ],
+        'price': {
+            'min': min_price,
+            'max': max_price,
+            'avg': (price_sum / total).quantize(Decimal('0.01')) if total else None,
+        },
+    }
+
+
+def get_listing_stats() -> Dict:
+    """Current statistics, recomputed only if listings changed since the last call"""
+    summary, _ = ListingSummary.objects.get_or_create(pk=SUMMARY_PK)
+    if summary.computed_version != summary.version:
+        data = compute_listing_stats()
+        computed_at = timezone.now()
+        # Conditional: a change committed meanwhile keeps the row out of date
+        ListingSummary.objects.filter(pk=SUMMARY_PK, version=summary.version).update(
+            data=data, computed_version=summary.version, computed_at=computed_at
+        )
+        # As stored, so every response has the same types
+        summary.data = json.loads(json.dumps(data, cls=DjangoJSONEncoder))
+        summary.computed_at = computed_at
+    return dict(summary.data, computed_at=summary.computed_at)
+
+
+def stats_version() -> int:
+    """Number that changes whenever listings change, for keying derived caches"""
+    version = ListingSummary.objects.filter(pk=SUMMARY_PK).values_list('version', flat=True).first()
+    if version is None:
+        version = ListingSummary.objects.get_or_create(pk=SUMMARY_PK)[0].version
+    return version
+
+
+def _bump_version():
+    if not ListingSummary.objects.filter(pk=SUMMARY_PK).update(version=F('version') + 1):
+        ListingSummary.objects.get_or_create(pk=SUMMARY_PK)
+
+
+def invalidate_stats():
+    """Mark the statistics out of date once the current transaction commits"""
+    # Once per transaction, however many rows it changes
+    if any(hook[1] is _bump_version for hook in connection.run_on_commit):
+        return
+    transaction.on_commit(_bump_version)
+
+
+@receiver(post_save, sender=Listing, dispatch_uid='listing_stats_save')
+@receiver(post_delete, sender=Listing, dispatch_uid='listing_stats_delete')
+@receiver(post_save, sender=PDFUpload, dispatch_uid='upload_stats_save')
+@receiver(post_delete, sender=PDFUpload, dispatch_uid='upload_stats_delete')
+def _listings_changed(sender, **kwargs):
+    update_fields = kwargs.get('update_fields')
+    # Progress updates of an upload don't touch the statistics
+    if sender is PDFUpload and update_fields and not {'city', 'auction_date'} & set(update_fields):
+        return
+    invalidate_stats()
@@ -0,0 +1,223 @@
+"""Incremental reader for large listing files.
+
+A consolidated export can be hundreds of MB; instead of ``json.loads`` on the
+whole body, ``ListingStream`` reads the file in chunks and yields the items
+of its ``listings`` array one at a time, so memory use depends on the size of
+one item rather than of the file. Accepted layouts:
+
+  - ``{"city": ..., "auction_date": ..., "listings": [{...}, ...]}``; the
+    other top-level keys are collected in ``meta`` as they are read
+  - a bare array of items ``[{...}, ...]``
+  - NDJSON / JSON Lines: one item per line, optionally preceded by a line
+    holding only metadata (``city``, ``auction_date``, ``source_txt``)
+
+A single value larger than ``IMPORT_MAX_VALUE_SIZE`` is rejected rather than
+buffered, so malformed or truncated input can't pull the whole file into
+memory; parse errors give the byte offset where decoding failed.
+"""
+import codecs
+import hashlib
+import io
+import json
+import os
+from typing import Dict, Iterator, Optional
+
+# Bytes read from the file per chunk
+STREAM_CHUNK_SIZE = int(os.environ.get('IMPORT_STREAM_CHUNK_SIZE', '65536') or 65536)
+# Largest single JSON value (one listing, one metadata entry) held in memory
+MAX_VALUE_SIZE = int(os.environ.get('IMPORT_MAX_VALUE_SIZE', str(8 * 1024 * 1024)) or 8 * 1024 * 1024)
+
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/x-jsonlines')
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl')
+META_KEYS = ('city', 'auction_date', 'source_txt')
+
+_WHITESPACE = ' \t\n\r'
+
+
+def is_ndjson(name: str = '', content_type: str = '') -> Optional[bool]:
+    """True/False when the file name or content type tells the format, else None"""
+    if (content_type or '').split(';')[0].strip().lower() in NDJSON_CONTENT_TYPES:
+        return True
+    if name and os.path.splitext(name)[1].lower() in NDJSON_EXTENSIONS:
+        return True
+    return None
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ListingStream:
+    """Listing items read incrementally from a binary (or text) file object.
+
+    Iterate over the stream to get the items; ``meta`` holds the top-level
+    keys read so far (the ones placed before ``listings`` are known once the
+    first item is yielded). ``ndjson=None`` detects the format from the first
+    line.
+    """
+
+    def __init__(self, source, ndjson: Optional[bool] = None, chunk_size: Optional[int] = None,
+                 max_value_size: Optional[int] = None):
+        self.ndjson = ndjson
+        self.chunk_size = max(1024, chunk_size or STREAM_CHUNK_SIZE)
+        self.max_value_size = max_value_size or MAX_VALUE_SIZE
+        self.meta: Dict = {}
+        self.items_read = 0
+        self.bytes_read = 0
+        self._reset(source)
+
+    def _reset(self, source):
+        self._source = source
+        self._decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._chars_read = 0
+        self._binary = False
+        self._eof = source is None
+
+    def __iter__(self) -> Iterator[Dict]:
+        if self._peek() == '"':
+            # A JSON document sent as a JSON string (double-encoded body);
+            # the string is the whole document, so it isn't size-capped
+            self._reset(io.StringIO(self._value(max_size=0)))
+        if self.ndjson is None:
+            self.ndjson = self._sniff()
+        items = self._ndjson_items() if self.ndjson else self._json_items()
+        yield from items
+        if self._peek():
+            raise ValueError(f"Unexpected data after the listings at offset {self._offset(self._pos)}")
+
+    def _fill(self) -> bool:
+        """Read one more chunk; False at end of input"""
+        if self._eof:
+            return False
+        data = self._source.read(self.chunk_size)
+        if not data:
+            self._eof = True
+            return False
+        if isinstance(data, str):
+            text = data
+        else:
+            self._binary = True
+            self.bytes_read += len(data)
+            text = self._decoder.decode(data)
+        self._chars_read += len(text)
+        # Drop what was already consumed so the buffer stays bounded
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        return True
+
+    def _offset(self, index: int) -> int:
+        """Input offset of a buffer position: bytes for binary sources, characters for text"""
+        if not self._binary:
+            return self._chars_read - len(self._buffer) + index
+        pending = len(self._decoder.getstate()[0])
+        return self.bytes_read - pending - len(self._buffer[index:].encode('utf-8', 'surrogatepass'))
+
+    def _peek(self) -> str:
+        """Next non-whitespace character, '' at end of input"""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ''
+
+    def _expect(self, chars: str) -> str:
+        char = self._peek()
+        if not char:
+            raise ValueError('Unexpected end of JSON input')
+        if char not in chars:
+            raise ValueError(f"Expected one of {chars!r}, got {char!r} at offset {self._offset(self._pos)}")
+        self._pos += 1
+        return char
+
+    def _value(self, max_size: Optional[int] = None):
+        """Decode the next JSON value, reading more input until it is complete
+        or longer than ``max_size`` (``max_value_size`` by default, 0: no limit)"""
+        if max_size is None:
+            max_size = self.max_value_size
+        self._peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as e:
+                if max_size and len(self._buffer) - self._pos > max_size:
+                    raise ValueError(
+                        f"JSON value at offset {self._offset(self._pos)} is larger than {max_size} bytes "
+                        f"(malformed or truncated input?)"
+                    ) from None
+                if self._fill():
+                    continue
+                raise ValueError(f"Invalid JSON at offset {self._offset(e.pos)}: {e.msg}") from None
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def _sniff(self) -> bool:
+        """NDJSON if the first line alone is a complete item"""
+        if self._peek() != '{':
+            return False
+        newline = self._buffer.find('\n', self._pos)
+        while newline < 0 and len(self._buffer) - self._pos < self.chunk_size and self._fill():
+            newline = self._buffer.find('\n', self._pos)
+        if newline < 0:
+            return False
+        try:
+            first = json.loads(self._buffer[self._pos:newline])
+        except ValueError:
+            return False
+        while not self._buffer[newline:].strip() and self._fill():
+            pass
+        return 'listings' not in first or bool(self._buffer[newline:].strip())
+
+    def _json_items(self) -> Iterator[Dict]:
+        if self._expect('{[') == '[':
+            yield from self._array_items()
+            return
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self._value()
+            if not isinstance(key, str):
+                raise ValueError(f"Expected an object key, got {key!r}")
+            self._expect(':')
+            if key == 'listings' and self._peek() == '[':
+                self._pos += 1
+                yield from self._array_items()
+            else:
+                self.meta[key] = self._value()
+            if self._expect(',}') == '}':
+                return
+
+    def _array_items(self) -> Iterator[Dict]:
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            item = self._value()
+            self.items_read += 1
+            yield item
+            if self._expect(',]') == ']':
+                return
+
+    def _ndjson_items(self) -> Iterator[Dict]:
+        first = True
+        while self._peek():
+            item = self._value()
+            if first and isinstance(item, dict) and 'title' not in item and any(key in item for key in META_KEYS):
+                self.meta.update(item)
+            else:
+                self.items_read += 1
+                yield item
+            first = False
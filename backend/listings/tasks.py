@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from .enrichment import run_enrichment
+
+
+@shared_task(name='listings.enrich_images', ignore_result=True)
+def enrich_images_task():
+    """Celery entry point for a background image enrichment run"""
+    run_enrichment()
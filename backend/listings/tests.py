@@ -1,3 +1,454 @@
-from django.test import TestCase
+import io
+import json
+import re
+import socket
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from . import enrichment, fuzzy, search
+from .images import ImageResolver, StubProvider
+from .models import ImageEnrichmentRun, Listing, PDFUpload
+from .stats import stats_version
+from .streaming import ListingStream
+from .thumbnails import ThumbnailError, fetch_image
+from .views import ListingViewSet
+
+INDEXED_TABLES = (Listing._meta.db_table, PDFUpload._meta.db_table)
+
+
+class QueryPlanTests(TestCase):
+    """The hot listing queries must be answered from an index, never a full table scan.
+
+    Each query mirrors what ListingViewSet (or the deadline / image enrichment
+    helpers) sends: its filters, its default ordering and a page LIMIT. An
+    index must narrow the rows (SQLite SEARCH, PostgreSQL Index Cond) or be
+    walked in the query's ORDER BY, so the LIMIT stops it early; walking an
+    unrelated index is a full scan too. On PostgreSQL sequential scans are
+    disabled for the check, so the planner only falls back to one when no
+    index can serve the query.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        uploads = [
+            PDFUpload.objects.create(
+                filename=f'{city}.pdf', city=city, auction_date=f'2025-0{month}-01', file=f'{city}.pdf'
+            )
+            for month, city in enumerate(['Tunis', 'Sfax', 'Sousse'], start=1)
+        ]
+        now = timezone.now()
+        Listing.objects.bulk_create([
+            Listing(
+                pdf_upload=uploads[i % 3], lot_number=str(i), title=f'Lot {i}',
+                listing_type='vehicle' if i % 2 else 'goods',
+                brand='Toyota' if i % 4 == 1 else '', year=2000 + i % 20 if i % 2 else None,
+                fuel_type='diesel' if i % 2 else '',
+                starting_price=Decimal(1000 + 37 * i), guarantee_amount=Decimal(100),
+                deadline=now + timedelta(days=i % 10 - 5) if i % 5 == 0 else None,
+                image_url='' if i % 3 else 'https://example.com/car.jpg',
+            )
+            for i in range(200)
+        ])
+
+    def hot_queries(self):
+        listings = Listing.objects.select_related('pdf_upload', 'auction_group')
+        now = timezone.now()
+        queries = {
+            'default order': listings.order_by('-created_at'),
+            'type': listings.filter(listing_type='vehicle').order_by('-created_at'),
+            'price range': listings.filter(starting_price__gte=2000, starting_price__lte=5000),
+            'price order': listings.order_by('starting_price'),
+            'type by price': listings.filter(listing_type='vehicle').order_by('starting_price'),
+            'brand and years': listings.filter(brand='Toyota', year__gte=2010),
+            'year range': listings.filter(year__gte=2005, year__lte=2015).order_by('year'),
+            'fuel and years': listings.filter(fuel_type='diesel', year__gte=2010),
+            'city': listings.filter(pdf_upload__city='Sfax').order_by('-created_at'),
+            'auction date': listings.filter(pdf_upload__auction_date__gte='2025-02-01'),
+            'expired': listings.filter(deadline__lt=now),
+            'urgent': listings.filter(deadline__gt=now, deadline__lte=now + timedelta(days=1)),
+            'image queue': Listing.objects.filter(image_url='', pk__gt=10).order_by('pk'),
+        }
+        # Without ?ordering= the viewset orders by its default, not Meta.ordering
+        return {
+            name: queryset if queryset.query.order_by else queryset.order_by(*ListingViewSet.ordering)
+            for name, queryset in queries.items()
+        }
+
+    def index_columns(self) -> dict:
+        """Index name → its columns, for the indexed tables"""
+        columns = {}
+        with connection.cursor() as cursor:
+            for table in INDEXED_TABLES:
+                for name, constraint in connection.introspection.get_constraints(cursor, table).items():
+                    if constraint['index'] or constraint['unique']:
+                        columns[name] = constraint['columns']
+        return columns
+
+    def order_columns(self, queryset) -> list:
+        return [
+            Listing._meta.pk.column if name.lstrip('-') == 'pk' else Listing._meta.get_field(name.lstrip('-')).column
+            for name in queryset.query.order_by
+        ]
+
+    def walks_order(self, index: str, queryset) -> bool:
+        """Whether walking ``index`` yields rows in the query's order, so the LIMIT ends the walk"""
+        order = self.order_columns(queryset)
+        return bool(order) and self.index_columns().get(index, [])[:len(order)] == order
+
+    def full_scans(self, queryset):
+        queryset = queryset[:20]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            return self.postgresql_full_scans(json.loads(queryset.explain(format='json'))[0]['Plan'], queryset)
+        plan = queryset.explain()
+        scans = []
+        for match in re.finditer(rf'\b(SCAN|SEARCH) ({"|".join(INDEXED_TABLES)})\b(.*)', plan):
+            step, table, detail = match.groups()
+            if step == 'SEARCH':
+                continue  # narrowed by an index or the rowid
+            index = re.search(r'USING (?:COVERING )?INDEX (\w+)', detail)
+            if not (index and self.walks_order(index.group(1), queryset)):
+                scans.append(table)
+        return scans, plan
+
+    def postgresql_full_scans(self, node: dict, queryset):
+        scans = []
+        if node.get('Relation Name') in INDEXED_TABLES:
+            if node['Node Type'] == 'Seq Scan' or (
+                node['Node Type'] in ('Index Scan', 'Index Only Scan') and 'Index Cond' not in node
+                and not self.walks_order(node['Index Name'], queryset)
+            ):
+                scans.append(node['Relation Name'])
+        for child in node.get('Plans', []):
+            scans += self.postgresql_full_scans(child, queryset)[0]
+        return scans, json.dumps(node, indent=1)
+
+    def test_hot_queries_use_indexes(self):
+        for name, queryset in self.hot_queries().items():
+            with self.subTest(query=name):
+                scans, plan = self.full_scans(queryset)
+                self.assertEqual(scans, [], f'{name} falls back to a full scan:\n{plan}')
+
+
+class Trickle(io.RawIOBase):
+    """A byte stream that hands out at most ``step`` bytes per read, so chunk
+    boundaries fall everywhere"""
+
+    def __init__(self, data: bytes, step: int):
+        self.data = data
+        self.step = step
+        self.offset = 0
+
+    def read(self, size=-1):
+        chunk = self.data[self.offset:self.offset + self.step]
+        self.offset += len(chunk)
+        return chunk
+
+
+class ListingStreamTests(SimpleTestCase):
+
+    ITEMS = [
+        {'title': 'Mercedes "Classe C"', 'description': 'back\\slash, tab\t, é', 'lot_number': '01'},
+        {'title': 'سيارة مرسيدس', 'description': 'emoji \U0001F697 and \u00e9', 'lot_number': '02'},
+        {'title': 'Peugeot 208', 'starting_price': 12500.5, 'lot_number': '03'},
+    ]
+
+    def read(self, data: bytes, step: int, **options):
+        stream = ListingStream(Trickle(data, step), **options)
+        return list(stream), stream
+
+    def test_chunk_boundaries_inside_strings_and_escapes(self):
+        # ensure_ascii=True writes \uXXXX escapes (and surrogate pairs), False raw UTF-8
+        for ensure_ascii in (True, False):
+            body = {'city': 'Kef', 'listings': self.ITEMS, 'auction_date': '2025-08-07'}
+            data = json.dumps(body, ensure_ascii=ensure_ascii).encode('utf-8')
+            for step in (1, 2, 3, 5, 7):
+                with self.subTest(ensure_ascii=ensure_ascii, step=step):
+                    items, stream = self.read(data, step)
+                    self.assertEqual(items, self.ITEMS)
+                    self.assertEqual(stream.meta, {'city': 'Kef', 'auction_date': '2025-08-07'})
+
+    def test_bare_array_and_double_encoded_body(self):
+        data = json.dumps(self.ITEMS).encode('utf-8')
+        self.assertEqual(self.read(data, 3)[0], self.ITEMS)
+        self.assertEqual(self.read(json.dumps(data.decode()).encode('utf-8'), 3)[0], self.ITEMS)
+
+    def test_ndjson(self):
+        lines = [{'city': 'Kef', 'auction_date': '2025-08-07'}] + self.ITEMS
+        data = ('\n'.join(json.dumps(line, ensure_ascii=False) for line in lines) + '\n').encode('utf-8')
+        for step in (1, 4, 4096):
+            with self.subTest(step=step):
+                items, stream = self.read(data, step)
+                self.assertTrue(stream.ndjson)
+                self.assertEqual(items, self.ITEMS)
+                self.assertEqual(stream.meta, lines[0])
+
+    def test_truncated_input(self):
+        data = json.dumps({'listings': self.ITEMS}, ensure_ascii=False).encode('utf-8')
+        for cut in (1, 10, len(data) // 2):
+            with self.subTest(cut=cut), self.assertRaisesRegex(ValueError, 'offset|end of JSON'):
+                self.read(data[:-cut], 7)
+
+    def test_error_gives_the_byte_offset(self):
+        data = '[{"title": "é"}, {"title": tru}]'.encode('utf-8')
+        with self.assertRaisesRegex(ValueError, f'offset {data.index(b"tru")}'):
+            self.read(data, 5)
+
+    def test_oversized_value_is_not_buffered_to_the_end(self):
+        # An unterminated string swallows the rest of the file
+        data = b'[{"title": "Peugeot}, ' + b'{"title": "Renault"}, ' * 2000 + b']'
+        with self.assertRaisesRegex(ValueError, 'offset 1 is larger than 4096'):
+            self.read(data, 1024, max_value_size=4096)
+
+
+class EnrichmentRunTests(TestCase):
+    """A single enrichment run at a time, kept alive by a heartbeat during slow batches"""
+
+    def setUp(self):
+        upload = PDFUpload.objects.create(filename='Kef.pdf', city='Kef', auction_date='2025-08-07', file='Kef.pdf')
+        Listing.objects.bulk_create([
+            Listing(pdf_upload=upload, lot_number=f'{i:02d}', title=f'Lot {i}', brand='Peugeot', model=str(200 + i),
+                    starting_price=Decimal(1000), guarantee_amount=Decimal(100))
+            for i in range(1, 4)
+        ])
+
+    def test_second_run_is_refused(self):
+        ImageEnrichmentRun.objects.create()
+        self.assertIsNone(enrichment.run_enrichment(StubProvider()))
+        self.assertEqual(ImageEnrichmentRun.objects.count(), 1)
+
+    def test_concurrent_start_loses_on_the_constraint(self):
+        running = ImageEnrichmentRun.objects.create()
+        # Both processes saw no active run; the second INSERT must fail
+        with mock.patch.object(enrichment, 'active_run', return_value=None):
+            self.assertIsNone(enrichment.run_enrichment(StubProvider()))
+        running.refresh_from_db()
+        self.assertEqual(running.status, ImageEnrichmentRun.STATUS_RUNNING)
+
+    def test_stale_run_is_interrupted(self):
+        stale = ImageEnrichmentRun.objects.create()
+        ImageEnrichmentRun.objects.filter(pk=stale.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        run = enrichment.run_enrichment(StubProvider())
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, ImageEnrichmentRun.STATUS_INTERRUPTED)
+        self.assertEqual((run.status, run.updated), (ImageEnrichmentRun.STATUS_COMPLETED, 3))
+
+    def test_resolver_reports_each_search(self):
+        searches = []
+        resolver = ImageResolver(StubProvider(), on_search=lambda: searches.append(1))
+        resolver.resolve([{'brand': 'Peugeot', 'model': str(model)} for model in (208, 308, 208)])
+        self.assertEqual(len(searches), 2)
+
+    def test_heartbeat_bumps_the_run(self):
+        run = ImageEnrichmentRun.objects.create()
+        long_ago = timezone.now() - timedelta(hours=1)
+        ImageEnrichmentRun.objects.filter(pk=run.pk).update(updated_at=long_ago)
+        heartbeat = enrichment._Heartbeat()
+        heartbeat.run_id = run.pk
+        heartbeat()
+        run.refresh_from_db()
+        self.assertEqual(run.updated_at, long_ago)  # throttled
+        with mock.patch.object(enrichment, 'HEARTBEAT_SECONDS', 0):
+            heartbeat()
+        run.refresh_from_db()
+        self.assertGreater(run.updated_at, long_ago)
+
+
+class ImageFetchTests(SimpleTestCase):
+    """Thumbnail sources are fetched from public image hosts only"""
+
+    HOSTS = {'images.example.com': '93.184.216.34', 'localhost': '127.0.0.1', 'intranet': '10.0.0.5',
+             'metadata': '169.254.169.254', 'mapped': '::ffff:192.168.1.1'}
+
+    def setUp(self):
+        def getaddrinfo(host, port, *args, **kwargs):
+            address = self.HOSTS.get(host, host)
+            family = socket.AF_INET6 if ':' in address else socket.AF_INET
+            return [(family, socket.SOCK_STREAM, 6, '', (address, port))]
+
+        patcher = mock.patch('listings.thumbnails.socket.getaddrinfo', side_effect=getaddrinfo)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('requests.get')
+        self.get = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def response(self, status=200, headers=None, body=b'GIF89a'):
+        resp = mock.MagicMock(status_code=status, headers=headers or {}, is_redirect=status in (301, 302, 307))
+        resp.__enter__.return_value = resp
+        resp.iter_content.return_value = [body]
+        return resp
+
+    def test_public_image(self):
+        self.get.return_value = self.response(headers={'Content-Type': 'image/gif'})
+        self.assertEqual(fetch_image('https://images.example.com/car.gif'), b'GIF89a')
+        self.assertFalse(self.get.call_args.kwargs['allow_redirects'])
+
+    def test_internal_addresses_are_refused(self):
+        for url in ('http://localhost/a.jpg', 'http://intranet/a.jpg', 'http://metadata/latest/',
+                    'http://mapped/a.jpg', 'http://127.0.0.1:8000/admin/', 'http://[::1]/a.jpg',
+                    'file:///etc/passwd'):
+            with self.subTest(url=url), self.assertRaises(ThumbnailError):
+                fetch_image(url)
+        self.get.assert_not_called()
+
+    def test_redirects_are_checked(self):
+        self.get.return_value = self.response(302, {'Location': 'http://metadata/latest/'})
+        with self.assertRaisesRegex(ThumbnailError, 'not a public address'):
+            fetch_image('https://images.example.com/car.jpg')
+        self.assertEqual(self.get.call_count, 1)
+
+    def test_content_type_must_be_an_image(self):
+        for headers in ({'Content-Type': 'text/html'}, {}):
+            self.get.return_value = self.response(headers=headers)
+            with self.subTest(headers=headers), self.assertRaisesRegex(ThumbnailError, 'Not an image'):
+                fetch_image('https://images.example.com/car.jpg')
+
+    def test_allowed_hosts(self):
+        self.get.return_value = self.response(headers={'Content-Type': 'image/gif'})
+        with mock.patch('listings.thumbnails.THUMBNAIL_ALLOWED_HOSTS', ['example.com']):
+            self.assertEqual(fetch_image('https://images.example.com/car.gif'), b'GIF89a')
+            with self.assertRaisesRegex(ThumbnailError, 'not allowed'):
+                fetch_image('https://93.184.216.34/car.gif')
+
+
+class SearchTests(TestCase):
+    """?search= through the SQLite FTS5 index, and the icontains fallback without it"""
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite full-text index')
+        search._installed.clear()
+        self.addCleanup(search._installed.clear)
+        upload = PDFUpload.objects.create(filename='Kef.pdf', city='Kef', auction_date='2025-08-07', file='Kef.pdf')
+        common = {'pdf_upload': upload, 'starting_price': Decimal(1000), 'guarantee_amount': Decimal(100)}
+        self.car = Listing.objects.create(lot_number='01', title='سيارة مرسيدس', brand='Mercedes', **common)
+        self.van = Listing.objects.create(lot_number='02', title='Véhicule utilitaire', brand='Renault',
+                                          model='Kangoo', **common)
+        self.desk = Listing.objects.create(lot_number='03', title='أثاث مكتب', short_description='Bureau en chêne',
+                                           **common)
+        self.bulk = Listing.objects.bulk_create([
+            Listing(lot_number='04', title='Peugeot Partner', brand='Peugeot', **common),
+            Listing(lot_number='05', title='Citroën Berlingo', brand='Citroën', **common),
+        ])
+
+    def found(self, query: str):
+        backend = search.search_backend()
+        self.assertEqual(backend, 'sqlite')
+        return set(search.search_listings(Listing.objects.all(), query, backend).values_list('lot_number', flat=True))
+
+    def test_arabic_folding(self):
+        # Ta marbuta and hamza-on-alef fold to ha and bare alef, both ways
+        self.assertEqual(self.found('سياره'), {'01'})
+        self.assertEqual(self.found('اثاث'), {'03'})
+        self.assertEqual(self.found('أثاث'), {'03'})
+
+    def test_french_accents(self):
+        self.assertEqual(self.found('vehicule'), {'02'})
+        self.assertEqual(self.found('VÉHICULE'), {'02'})
+        self.assertEqual(self.found('chene'), {'03'})
+        self.assertEqual(self.found('citroen'), {'05'})
+
+    def test_prefix_matching_needs_every_word(self):
+        self.assertEqual(self.found('merc'), {'01'})
+        self.assertEqual(self.found('ren kang'), {'02'})
+        self.assertEqual(self.found('renault peugeot'), set())
+
+    def test_bulk_writes_are_indexed(self):
+        self.assertEqual(self.found('partner'), {'04'})
+        self.bulk[0].title = 'Peugeot Expert'
+        Listing.objects.bulk_update([self.bulk[0]], ['title'])
+        self.assertEqual(self.found('partner'), set())
+        self.assertEqual(self.found('expert'), {'04'})
+        Listing.objects.filter(pk=self.bulk[0].pk).delete()
+        self.assertEqual(self.found('expert'), set())
+
+    def test_ranked_api_results(self):
+        response = self.client.get('/api/listings/', {'search': 'renault'})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()
+        results = results.get('results', results) if isinstance(results, dict) else results
+        self.assertEqual([listing['lot_number'] for listing in results], ['02'])
+
+    def test_icontains_fallback_without_triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER {search.SEARCH_TABLE}_search_update')
+        self.assertIsNone(search.search_backend())
+        response = self.client.get('/api/listings/', {'search': 'Kangoo'})
+        results = response.json()
+        results = results.get('results', results) if isinstance(results, dict) else results
+        self.assertEqual([listing['lot_number'] for listing in results], ['02'])
+
+
+class TrigramIndexTests(SimpleTestCase):
+
+    def test_threshold_edges(self):
+        # Unpadded 'abcdef' has four trigrams: abc bcd cde def
+        index = fuzzy.TrigramIndex(padded=False)
+        index.add('half', 'ABCDXY')  # abc bcd
+        index.add('quarter', 'ABCXYZ')  # abc
+        self.assertEqual(index.search('ABCDEF', 0.5, 10), [('half', 0.5)])
+        self.assertEqual(index.search('ABCDEF', 0.51, 10), [])
+        self.assertEqual(index.search('ABCDEF', 0.25, 10), [('half', 0.5), ('quarter', 0.25)])
+
+    def test_partial_vin_scores_one(self):
+        index = fuzzy.TrigramIndex(padded=False)
+        index.add(1, fuzzy.normalize_vin('VF1-RFB00 123456789'))
+        index.add(2, fuzzy.normalize_vin('WDB2110161A987654'))
+        self.assertEqual(index.search(fuzzy.normalize_vin('rfb00123'), 0.5, 10), [(1, 1.0)])
+
+    def test_ocr_letter_digit_confusions(self):
+        # O/I/Q never occur in a VIN: OCR'd letters are read back as digits
+        self.assertEqual(fuzzy.normalize_vin('VF1RFBOO1234'), fuzzy.normalize_vin('VF1RFB001234'))
+        self.assertEqual(fuzzy.normalize_vin('wdb21I0q6'), 'WDB211006')
+        # Digits inside words are read as letters, numbers are left alone
+        self.assertEqual(fuzzy.ocr_letters('MERCEDE5 C200 2015'), 'MERCEDES C2OO 2015')
+        index = fuzzy.TrigramIndex()
+        index.add('mercedes', 'Mercedes Classe C')
+        index.add('peugeot', 'Peugeot 208')
+        [(key, misread)] = index.search('MERCEDE5', 0.5, 10)
+        self.assertEqual(key, 'mercedes')
+        self.assertLess(misread, 1.0)
+        self.assertEqual(index.search(fuzzy.ocr_letters('MERCEDE5'), 0.5, 10), [('mercedes', 1.0)])
+
+
+class FuzzyIndexRebuildTests(TransactionTestCase):
+    """The in-process index follows listing changes (stats_version), rebuilt in the background"""
+
+    def setUp(self):
+        fuzzy._indexes.clear()
+        self.addCleanup(fuzzy._indexes.clear)
+        self.upload = PDFUpload.objects.create(
+            filename='Kef.pdf', city='Kef', auction_date='2025-08-07', file='Kef.pdf'
+        )
+        self.listing(1, 'Mercedes', 'C200')
+
+    def listing(self, lot: int, brand: str, model: str):
+        Listing.objects.create(
+            pdf_upload=self.upload, lot_number=f'{lot:02d}', title=f'{brand} {model}', brand=brand, model=model,
+            starting_price=Decimal(1000), guarantee_amount=Decimal(100),
+        )
+
+    def brands(self):
+        return [match['brand'] for match in fuzzy.find_brands('peugeot')]
+
+    def test_rebuilt_after_listings_change(self):
+        self.assertEqual(self.brands(), [])
+        built_version = fuzzy._indexes['brand'][0]
+        self.listing(2, 'Peugeot', '208')
+        self.assertGreater(stats_version(), built_version)
+        # The stale index answers while the new one is built
+        self.assertEqual(self.brands(), [])
+        deadline = time.monotonic() + 10
+        while (fuzzy._rebuilding or fuzzy._indexes['brand'][0] == built_version) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(fuzzy._rebuilding)
+        self.assertEqual(fuzzy._indexes['brand'][0], stats_version())
+        self.assertEqual(self.brands(), ['Peugeot'])
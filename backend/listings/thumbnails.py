@@ -0,0 +1,254 @@
+"""Local thumbnails of listing images.
+
+Listing cards used to load the raw ``image_url`` (often a 1200px image from a
+third-party CDN). The thumbnail endpoint fetches the source image once,
+writes resized copies in every ``THUMBNAIL_SIZES`` width and both formats
+(WebP and JPEG) under ``MEDIA_ROOT/thumbnails``, and serves them from there.
+
+Files are named after the SHA-256 of the source image, so listings sharing
+an image share its thumbnails. ``ThumbnailSource`` maps each image URL to
+that hash (and records failed fetches, retried after
+``IMAGE_NEGATIVE_TTL_HOURS``). Thumbnail URLs carry a version derived from
+the image URL, which lets responses be cached for ``THUMBNAIL_CACHE_SECONDS``:
+a new image gets a new URL.
+
+Image URLs come from imported JSON, so fetching them must not reach the
+server's own network: every hop (redirects are followed by hand) must be on
+``THUMBNAIL_ALLOWED_HOSTS`` when it is set, and resolve only to public
+addresses; the response must be an ``image/*``.
+"""
+import hashlib
+import io
+import ipaddress
+import os
+import socket
+import threading
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urljoin, urlparse
+import logging
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .images import IMAGE_NEGATIVE_TTL_HOURS
+from .models import ThumbnailSource
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_sizes(value: str) -> Dict[str, int]:
+    sizes = {}
+    for part in value.split(','):
+        name, _, width = part.partition(':')
+        if name.strip() and width.strip().isdigit():
+            sizes[name.strip()] = int(width)
+    return sizes or {'small': 320, 'medium': 640, 'large': 1024}
+
+
+# Size name → maximum width in pixels (images are never upscaled)
+THUMBNAIL_SIZES = _parse_sizes(os.environ.get('THUMBNAIL_SIZES', 'small:320,medium:640,large:1024'))
+THUMBNAIL_DEFAULT_SIZE = os.environ.get('THUMBNAIL_DEFAULT_SIZE', 'medium')
+THUMBNAIL_QUALITY = int(os.environ.get('THUMBNAIL_QUALITY', '80') or 80)
+THUMBNAIL_FETCH_TIMEOUT = float(os.environ.get('THUMBNAIL_FETCH_TIMEOUT', '10') or 10)
+# Larger source images are refused
+THUMBNAIL_MAX_SOURCE_BYTES = int(os.environ.get('THUMBNAIL_MAX_SOURCE_BYTES', str(15 * 1024 * 1024)) or 15 * 1024 * 1024)
+# max-age of versioned thumbnail responses (one year)
+THUMBNAIL_CACHE_SECONDS = int(os.environ.get('THUMBNAIL_CACHE_SECONDS', '31536000') or 31536000)
+# Image hosts thumbnails may be fetched from (a host also allows its
+# subdomains), comma separated; empty allows any host with public addresses
+THUMBNAIL_ALLOWED_HOSTS = [
+    host.strip().lower().strip('.') for host in os.environ.get('THUMBNAIL_ALLOWED_HOSTS', '').split(',') if host.strip()
+]
+THUMBNAIL_MAX_REDIRECTS = 3
+THUMBNAIL_DIR = 'thumbnails'
+
+# Format → (Pillow format, extension, content type)
+FORMATS = {
+    'webp': ('WEBP', 'webp', 'image/webp'),
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg'),
+}
+
+# Striped locks: requests for one image within a process wait for a single fetch
+_locks = [threading.Lock() for _ in range(64)]
+
+
+class ThumbnailError(Exception):
+    """The source image could not be fetched or decoded"""
+
+
+def url_hash(url: str) -> str:
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def thumbnail_version(url: str) -> str:
+    """Short version tag of an image URL, part of its thumbnail URLs"""
+    return url_hash(url)[:12]
+
+
+def thumbnail_urls(listing, request=None) -> Optional[List[Dict]]:
+    """``[{size, width, url}, ...]`` for the listing's image, None without one"""
+    if not listing.image_url:
+        return None
+    path = reverse('listing-thumbnail', args=[listing.pk])
+    version = thumbnail_version(listing.image_url)
+    thumbnails = []
+    for size, width in THUMBNAIL_SIZES.items():
+        url = f"{path}?{urlencode({'size': size, 'v': version})}"
+        thumbnails.append({
+            'size': size,
+            'width': width,
+            'url': request.build_absolute_uri(url) if request is not None else url,
+        })
+    return thumbnails
+
+
+def thumbnail_path(content_hash: str, size: str, fmt: str) -> str:
+    """Absolute path of one thumbnail file"""
+    extension = FORMATS[fmt][1]
+    name = f"{content_hash}-{THUMBNAIL_SIZES[size]}.{extension}"
+    return os.path.join(settings.MEDIA_ROOT, THUMBNAIL_DIR, content_hash[:2], name)
+
+
+def get_thumbnail(url: str, size: str, fmt: str) -> Tuple[str, str]:
+    """Path and content hash of a thumbnail of ``url``, fetching and resizing
+    the source image if it has not been yet; raises ThumbnailError"""
+    key = url_hash(url)
+    with _locks[int(key[:8], 16) % len(_locks)]:
+        source = ThumbnailSource.objects.filter(url_hash=key).first()
+        if source is not None and source.content_hash:
+            path = thumbnail_path(source.content_hash, size, fmt)
+            if os.path.exists(path):
+                return path, source.content_hash
+            # Media was wiped (e.g. a new container): fetch again
+        elif source is not None and source.error:
+            if source.fetched_at + timedelta(hours=IMAGE_NEGATIVE_TTL_HOURS) > timezone.now():
+                raise ThumbnailError(source.error)
+
+        source = source or ThumbnailSource(url_hash=key, url=url)
+        source.fetched_at = timezone.now()
+        try:
+            data = fetch_image(url)
+            source.content_hash = hashlib.sha256(data).hexdigest()
+            source.width, source.height = render_thumbnails(data, source.content_hash)
+            source.error = ''
+        except ThumbnailError as e:
+            logger.warning(f"Thumbnail of {url} failed: {e}")
+            source.content_hash, source.error = '', str(e)[:255]
+        source.save()
+        if source.error:
+            raise ThumbnailError(source.error)
+        return thumbnail_path(source.content_hash, size, fmt), source.content_hash
+
+
+def check_image_url(url: str):
+    """Raise ThumbnailError unless ``url`` is HTTP(S) on an allowed host that
+    resolves to public addresses only"""
+    parsed = urlparse(url)
+    host = (parsed.hostname or '').lower().rstrip('.')
+    if parsed.scheme not in ('http', 'https') or not host:
+        raise ThumbnailError('Unsupported image URL')
+    if THUMBNAIL_ALLOWED_HOSTS and not any(
+        host == allowed or host.endswith(f'.{allowed}') for allowed in THUMBNAIL_ALLOWED_HOSTS
+    ):
+        raise ThumbnailError(f"Image host not allowed: {host}")
+    try:
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except (OSError, ValueError) as e:
+        raise ThumbnailError(f"Cannot resolve image host {host}: {e}") from e
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        # is_global excludes private, loopback, link-local, reserved and shared ranges
+        if not ip.is_global or ip.is_multicast:
+            raise ThumbnailError(f"Image host {host} is not a public address")
+
+
+def fetch_image(url: str) -> bytes:
+    """Download the source image, refusing unsafe URLs (at every redirect),
+    non-images and oversized bodies"""
+    import requests
+    try:
+        for _ in range(THUMBNAIL_MAX_REDIRECTS + 1):
+            check_image_url(url)
+            resp = requests.get(url, stream=True, timeout=THUMBNAIL_FETCH_TIMEOUT,
+                                headers={'Accept': 'image/*'}, allow_redirects=False)
+            if not resp.is_redirect:
+                break
+            resp.close()
+            url = urljoin(url, resp.headers['Location'])
+        else:
+            raise ThumbnailError('Too many redirects')
+        with resp:
+            resp.raise_for_status()
+            content_type = resp.headers.get('Content-Type', '')
+            if not content_type.startswith('image/'):
+                raise ThumbnailError(f"Not an image ({content_type or 'no content type'})")
+            if int(resp.headers.get('Content-Length') or 0) > THUMBNAIL_MAX_SOURCE_BYTES:
+                raise ThumbnailError('Image too large')
+            body = io.BytesIO()
+            for chunk in resp.iter_content(64 * 1024):
+                body.write(chunk)
+                if body.tell() > THUMBNAIL_MAX_SOURCE_BYTES:
+                    raise ThumbnailError('Image too large')
+            return body.getvalue()
+    except requests.RequestException as e:
+        raise ThumbnailError(f"Fetch failed: {e}") from e
+
+
+def render_thumbnails(data: bytes, content_hash: str) -> Tuple[int, int]:
+    """Write every size and format of the image; returns its original size"""
+    from PIL import Image, ImageOps
+    try:
+        image = Image.open(io.BytesIO(data))
+        width, height = image.size
+        # JPEG sources decode at reduced scale, far cheaper than a full decode
+        max_width = max(THUMBNAIL_SIZES.values())
+        image.draft('RGB', (max_width, round(height * max_width / width)))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ThumbnailError(f"Unreadable image: {e}") from e
+
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    if has_alpha:
+        flat = Image.new('RGB', image.size, (255, 255, 255))
+        flat.paste(image, mask=image.getchannel('A'))
+    else:
+        flat = image
+
+    for size, max_width in sorted(THUMBNAIL_SIZES.items(), key=lambda item: -item[1]):
+        for fmt, (pil_format, _, _) in FORMATS.items():
+            path = thumbnail_path(content_hash, size, fmt)
+            if os.path.exists(path):
+                continue
+            source = image if fmt == 'webp' else flat
+            if source.width > max_width:
+                source = source.resize(
+                    (max_width, max(1, round(source.height * max_width / source.width))),
+                    Image.LANCZOS,
+                )
+            options = {'quality': THUMBNAIL_QUALITY}
+            if fmt == 'jpeg':
+                options.update(optimize=True, progressive=True)
+            else:
+                options.update(method=4)
+            _write_atomic(path, source, pil_format, options)
+    return width, height
+
+
+def _write_atomic(path: str, image, pil_format: str, options: Dict):
+    """Save through a temporary file so readers never see a partial thumbnail"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        image.save(tmp_path, pil_format, **options)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise ThumbnailError(f"Could not write thumbnail: {e}") from e
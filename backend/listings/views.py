@@ -1,24 +1,35 @@
 from rest_framework import viewsets, status, filters
+from rest_framework.renderers import JSONRenderer
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q
 from django.db import transaction
-from decimal import Decimal
 import os
-import json
+from itertools import chain
 from urllib.parse import urlparse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, render
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.contrib.auth.models import User
-from django.http import JsonResponse
-from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpResponseNotModified, HttpResponseRedirect, JsonResponse
 from django.core.management import call_command
 from django.conf import settings
 from .models import Listing, PDFUpload, AuctionGroup
+from .enrichment import enrichment_status, schedule_enrichment
+from .facets import listing_facets
+from .fuzzy import FUZZY_VIN_MIN_LENGTH, find_brands, find_vins, fuzzy_backend, normalize_vin, parse_limit
+from .images import ImageResolver
+from .importer import ListingImporter, create_placeholder_upload
+from .streaming import ListingStream, is_ndjson
+from .thumbnails import (
+    FORMATS, THUMBNAIL_CACHE_SECONDS, THUMBNAIL_DEFAULT_SIZE, THUMBNAIL_SIZES,
+    ThumbnailError, get_thumbnail, thumbnail_version,
+)
+from .search import ListingOrderingFilter, ListingSearchFilter
+from .stats import get_listing_stats
 from .serializers import (
     ListingSerializer, ListingListSerializer, ListingCreateSerializer, PDFUploadSerializer,
     PDFUploadCreateSerializer, AuctionGroupSerializer
@@ -26,10 +37,17 @@ from .serializers import (
 from .mixins import CORSViewSetMixin
 
 
+class ImageRenderer(JSONRenderer):
+    """Accepts image requests (``Accept: image/*``) for views that return files;
+    their error responses are still rendered as JSON"""
+    media_type = 'image/*'
+    format = 'image'
+
+
 class ListingViewSet(CORSViewSetMixin, viewsets.ModelViewSet):
     """ViewSet for auction listings"""
     queryset = Listing.objects.select_related('pdf_upload', 'auction_group').all()
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, ListingSearchFilter, ListingOrderingFilter]
     filterset_fields = {
         'listing_type': ['exact'],
         'brand': ['exact', 'icontains'],
@@ -40,6 +58,7 @@ class ListingViewSet(CORSViewSetMixin, viewsets.ModelViewSet):
         'pdf_upload__auction_date': ['exact', 'gte', 'lte'],
         'auction_group': ['exact'],
     }
+    # Full-text indexed (listings.search); icontains on these without the index
     search_fields = ['title', 'brand', 'model', 'lot_number', 'short_description']
     ordering_fields = ['lot_number', 'starting_price', 'created_at', 'year']
     ordering = ['-created_at']
@@ -54,18 +73,43 @@ class ListingViewSet(CORSViewSetMixin, viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def stats(self, request):
-        """Get listing statistics"""
-        total_listings = Listing.objects.count()
-        vehicle_count = Listing.objects.filter(listing_type='vehicle').count()
-        goods_count = Listing.objects.filter(listing_type='goods').count()
-        cities = Listing.objects.values_list('pdf_upload__city', flat=True).distinct()
-        
-        return Response({
-            'total_listings': total_listings,
-            'vehicle_count': vehicle_count,
-            'goods_count': goods_count,
-            'cities': list(cities),
-        })
+        """Get listing statistics (materialized, recomputed only after listings change)"""
+        return Response(get_listing_stats())
+    
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """Counts per brand, city, fuel type, type, year and price bucket for the current filters"""
+        return Response(listing_facets(self, request))
+    
+    @action(detail=False, methods=['get'])
+    def brand_lookup(self, request):
+        """Brand/model pairs most similar to ?q=, tolerant of OCR errors (trigram match)"""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+        results = find_brands(query, parse_limit(request.query_params.get('limit')))
+        return Response({'query': query, 'backend': fuzzy_backend(), 'results': results})
+    
+    @action(detail=False, methods=['get'])
+    def vin_lookup(self, request):
+        """Listings whose chassis number best matches the complete or partial VIN ?q="""
+        query = request.query_params.get('q', '').strip()
+        vin = normalize_vin(query)
+        if len(vin) < FUZZY_VIN_MIN_LENGTH:
+            return Response(
+                {'error': f'q needs at least {FUZZY_VIN_MIN_LENGTH} letters or digits'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        matches = find_vins(query, parse_limit(request.query_params.get('limit')))
+        listings = Listing.objects.select_related('pdf_upload').in_bulk([pk for pk, _ in matches])
+        results = []
+        for pk, score in matches:
+            listing = listings.get(pk)
+            if listing is None:  # Deleted since the in-process index was built
+                continue
+            data = ListingListSerializer(listing, context=self.get_serializer_context()).data
+            results.append(dict(data, serial_number=listing.serial_number, score=score))
+        return Response({'query': query, 'normalized': vin, 'backend': fuzzy_backend(), 'results': results})
     
     @action(detail=False, methods=['get'])
     def brands(self, request):
@@ -241,6 +285,51 @@ class ListingViewSet(CORSViewSetMixin, viewsets.ModelViewSet):
             'count': expired_listings.count()
         })
     
+    @action(detail=False, methods=['get', 'post'])
+    def image_enrichment(self, request):
+        """Image enrichment queue depth, cache and last run; POST starts a run"""
+        if request.method == 'POST':
+            started = schedule_enrichment()
+            return Response(dict(enrichment_status(), scheduled=started), status=status.HTTP_202_ACCEPTED)
+        return Response(enrichment_status())
+    
+    @action(detail=True, methods=['get'], renderer_classes=[JSONRenderer, ImageRenderer])
+    def thumbnail(self, request, pk=None):
+        """Resized listing image (WebP when accepted, else JPEG), served from MEDIA_ROOT"""
+        listing = get_object_or_404(Listing.objects.only('id', 'image_url'), pk=pk)
+        if not listing.image_url:
+            return Response({'error': 'Listing has no image'}, status=status.HTTP_404_NOT_FOUND)
+        size = request.query_params.get('size') or THUMBNAIL_DEFAULT_SIZE
+        if size not in THUMBNAIL_SIZES:
+            return Response(
+                {'error': f"Unknown size, expected one of: {', '.join(THUMBNAIL_SIZES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        fmt = 'webp' if 'image/webp' in request.META.get('HTTP_ACCEPT', '') else 'jpeg'
+        try:
+            path, content_hash = get_thumbnail(listing.image_url, size, fmt)
+        except ThumbnailError:
+            if urlparse(listing.image_url).scheme not in ('http', 'https'):
+                return Response({'error': 'Listing has no usable image'}, status=status.HTTP_404_NOT_FOUND)
+            # Let the browser load the original image
+            response = HttpResponseRedirect(listing.image_url)
+            response['Cache-Control'] = 'public, max-age=300'
+            return response
+        
+        etag = f'"{content_hash[:32]}-{THUMBNAIL_SIZES[size]}-{fmt}"'
+        if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            response = HttpResponseNotModified()
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=FORMATS[fmt][2])
+        response['ETag'] = etag
+        response['Vary'] = 'Accept'
+        # Versioned URLs change with the image, so they can be cached for good
+        if request.query_params.get('v') == thumbnail_version(listing.image_url):
+            response['Cache-Control'] = f'public, max-age={THUMBNAIL_CACHE_SECONDS}, immutable'
+        else:
+            response['Cache-Control'] = 'public, max-age=3600'
+        return response
+    
     @action(detail=False, methods=['get'])
     def urgent_listings(self, request):
         """Get listings with urgent deadlines (1 day or less)"""
@@ -276,119 +365,31 @@ class PDFUploadViewSet(CORSViewSetMixin, viewsets.ModelViewSet):
         return PDFUploadSerializer
     
     def _get_root_txt_path(self, pdf_upload: PDFUpload) -> str:
-        # backend/listings/views.py -> backend/ -> project root
-        current_file = os.path.abspath(__file__)
-        backend_dir = os.path.dirname(os.path.dirname(current_file))
-        root_dir = os.path.dirname(backend_dir)
-        base_name = os.path.splitext(pdf_upload.filename)[0]
-        txt_filename = f"{base_name}.txt"
-        return os.path.join(root_dir, txt_filename)
-
-    def _parse_decimal(self, value, default=Decimal('0')):
-        try:
-            if value is None:
-                return default
-            if isinstance(value, (int, float, Decimal)):
-                return Decimal(str(value))
-            cleaned = ''.join(ch for ch in str(value) if ch.isdigit() or ch in ['.', ','])
-            if cleaned.count(',') == 1 and cleaned.count('.') == 0:
-                cleaned = cleaned.replace(',', '.')
-            return Decimal(cleaned) if cleaned else default
-        except Exception:
-            return default
+        from ocr_parser.services import root_txt_path
+        return root_txt_path(pdf_upload)
 
-    def _normalize_unsplash_url(self, url: str) -> str:
-        """Convert Unsplash page URLs to a direct, embeddable image URL.
-        - If url is images.unsplash.com, return as-is
-        - If url is unsplash.com/photos/<id>/..., convert to source.unsplash.com/<id>/1200x800
-        - If url is source.unsplash.com/... resolve redirect to final images.unsplash.com URL
-        """
-        try:
-            if not url:
-                return ''
-            parsed = urlparse(url)
-            host = (parsed.netloc or '').lower()
-            path = parsed.path or ''
-            if 'images.unsplash.com' in host:
-                return url
-            if 'source.unsplash.com' in host:
-                # Avoid network calls in Render free tier; return the source URL directly
-                return url
-            if 'unsplash.com' in host and '/photos/' in path:
-                parts = [p for p in path.split('/') if p]
-                # parts like ['photos', '<id>', ...]
-                photo_id = parts[1] if len(parts) >= 2 and parts[0] == 'photos' else ''
-                if photo_id:
-                    # Use source endpoint which 302s to a proper image
-                    return f"https://source.unsplash.com/{photo_id}/1200x800"
-        except Exception:
-            pass
-        return url
+    def _enqueue(self, pdf_upload: PDFUpload, job_type: str, message: str) -> Response:
+        """Queue a background job and return its id for polling /api/jobs/{id}/"""
+        from ocr_parser.jobs import enqueue_job
+        from ocr_parser.serializers import ProcessingJobSerializer
 
-    def _search_unsplash_first(self, query: str) -> str:
-        """Search Unsplash API for the first image URL (regular) if key is set.
-        Returns empty string on error or if key missing.
-        """
-        try:
-            access_key = os.environ.get('UNSPLASH_ACCESS_KEY')
-            if not access_key:
-                return ''
-            import requests
-            resp = requests.get(
-                'https://api.unsplash.com/search/photos',
-                params={
-                    'query': query,
-                    'per_page': 1,
-                    'content_filter': 'high'
-                },
-                headers={
-                    'Accept': 'application/json',
-                    'Authorization': f'Client-ID {access_key}'
-                },
-                timeout=8
-            )
-            if resp.status_code != 200:
-                return ''
-            data = resp.json() or {}
-            results = data.get('results') or []
-            if not results:
-                return ''
-            urls = results[0].get('urls') or {}
-            # Prefer regular; fall back to small
-            return urls.get('regular') or urls.get('small') or ''
-        except Exception:
-            return ''
+        job = enqueue_job(pdf_upload, job_type)
+        job.refresh_from_db()  # the sync backend has already run it
+        return Response({
+            'message': message,
+            'status': job.status,
+            'job_id': job.id,
+            'job_url': f'/api/jobs/{job.id}/',
+            'job': ProcessingJobSerializer(job).data,
+        }, status=status.HTTP_202_ACCEPTED)
 
     @action(detail=True, methods=['post'])
     def extract_txt(self, request, pk=None):
-        """Extract text from the PDF and write a TXT to project root (for n8n)."""
-        pdf_upload = self.get_object()
-        try:
-            from ocr_parser.parser import PDFParser
-            parser = PDFParser()
-            pdf_path = pdf_upload.file.path
-            text = parser.extract_text(pdf_path)
-            if not text:
-                return Response({
-                    'status': 'failed',
-                    'message': 'No text extracted'
-                }, status=status.HTTP_400_BAD_REQUEST)
+        """Queue text extraction to a TXT in project root (for n8n)."""
+        from ocr_parser.models import ProcessingJob
 
-            txt_path = self._get_root_txt_path(pdf_upload)
-            os.makedirs(os.path.dirname(txt_path), exist_ok=True)
-            with open(txt_path, 'w', encoding='utf-8-sig') as f:
-                f.write(text)
-            size = os.path.getsize(txt_path)
-            return Response({
-                'status': 'completed',
-                'txt_path': txt_path,
-                'size_bytes': size,
-            })
-        except Exception as e:
-            return Response({
-                'status': 'error',
-                'message': str(e)
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        pdf_upload = self.get_object()
+        return self._enqueue(pdf_upload, ProcessingJob.JOB_EXTRACT_TXT, 'Text extraction queued')
 
     @action(detail=True, methods=['get'])
     def txt(self, request, pk=None):
@@ -405,157 +406,77 @@ class PDFUploadViewSet(CORSViewSetMixin, viewsets.ModelViewSet):
                 content = f.read()
         return Response({'txt_path': txt_path, 'txt': content})
 
-    @transaction.atomic
-    def _import_listings(self, pdf_upload: PDFUpload, data: dict) -> int:
-        listings = data.get('listings') or []
-        created = 0
-        existing_lots = set(pdf_upload.listings.values_list('lot_number', flat=True))
-        next_lot_seq = 1
-        for item in listings:
-            try:
-                title = item.get('title') or 'N/A'
-                short_description = item.get('short_description') or ''
-                full_description = item.get('full_description') or ''
-                listing_type = (item.get('listing_type') or 'other').lower()
-                brand = item.get('brand') or ''
-                model = item.get('model') or ''
-                year_val = item.get('year')
-                try:
-                    year = int(year_val) if year_val not in (None, '', 'N/A') else None
-                except Exception:
-                    year = None
-                fuel_type = (item.get('fuel_type') or '').lower()
-
-                starting_price = self._parse_decimal(
-                    item.get('starting_price', item.get('estimated_value')),
-                    Decimal('0')
-                )
-                guarantee_amount = self._parse_decimal(
-                    item.get('guarantee_amount'),
-                    starting_price * Decimal('0.10')
-                )
-
-                lot_number = str(item.get('lot_number') or '').strip()
-                if not lot_number:
-                    while True:
-                        candidate = str(next_lot_seq).zfill(3)
-                        next_lot_seq += 1
-                        if candidate not in existing_lots:
-                            lot_number = candidate
-                            existing_lots.add(candidate)
-                            break
+    def _open_import_stream(self, request):
+        """Listing stream over the uploaded JSON/NDJSON file or the raw request
+        body, and where to read the other parameters from"""
+        content_type = request.content_type or ''
+        if content_type.startswith(('multipart/', 'application/x-www-form-urlencoded')):
+            uploaded = request.FILES.get('json_file') or request.FILES.get('file')
+            if uploaded is None:
+                raise ValueError('No JSON file provided (json_file)')
+            return ListingStream(uploaded, ndjson=is_ndjson(uploaded.name, uploaded.content_type)), request.data
+        # Read the body as it arrives instead of parsing all of it into request.data
+        return ListingStream(request.stream, ndjson=is_ndjson(content_type=content_type)), request.query_params
 
-                # Resolve image URL
-                raw_image_url = str(item.get('image_url') or '').strip()
-                resolved_image_url = ''
-                if raw_image_url:
-                    if 'google.com/search' in raw_image_url:
-                        resolved_image_url = ''
-                    elif 'unsplash.com' in raw_image_url and 'images.unsplash.com' not in raw_image_url:
-                        resolved_image_url = self._normalize_unsplash_url(raw_image_url)
-                    else:
-                        resolved_image_url = raw_image_url
+    def _import_stream(self, pdf_upload: PDFUpload, items) -> dict:
+        """Import streamed items in batches; the upload's total_listings shows progress"""
+        # Direct and cached images only; the rest is left to the background enrichment
+        importer = ListingImporter(pdf_upload, image_resolver=ImageResolver(search=False))
 
-                if not resolved_image_url:
-                    # Compose a query for Unsplash if key is available
-                    query_parts = []
-                    if brand:
-                        query_parts.append(brand)
-                    if model:
-                        query_parts.append(model)
-                    if year:
-                        query_parts.append(str(year))
-                    # Title as last resort to keep query concise
-                    if not query_parts and title:
-                        query_parts.append(title)
-                    query = ' '.join(query_parts) or 'vehicle'
-                    resolved_image_url = self._search_unsplash_first(query)
+        def on_progress(stats):
+            PDFUpload.objects.filter(pk=pdf_upload.pk).update(total_listings=importer.row_count)
 
-                Listing.objects.create(
-                    lot_number=lot_number,
-                    title=title,
-                    listing_type=listing_type if listing_type in dict(Listing.LISTING_TYPES) else 'other',
-                    short_description=short_description,
-                    full_description=full_description,
-                    brand=brand,
-                    model=model,
-                    year=year,
-                    fuel_type=fuel_type if fuel_type in dict(Listing.FUEL_TYPES) else 'other',
-                    quantity=str(item.get('quantity') or ''),
-                    unit=str(item.get('unit') or ''),
-                    starting_price=starting_price,
-                    guarantee_amount=guarantee_amount,
-                    pdf_upload=pdf_upload,
-                    image_url=resolved_image_url,
-                    original_pdf_url=str(item.get('original_pdf_url') or ''),
-                )
-                created += 1
-            except Exception:
-                continue
-
-        pdf_upload.processed = True if created > 0 else pdf_upload.processed
-        pdf_upload.total_listings = (pdf_upload.total_listings or 0) + created
-        pdf_upload.save(update_fields=['processed', 'total_listings'])
-        return created
+        error = None
+        try:
+            importer.import_iter(items, on_progress=on_progress)
+        except ValueError as e:
+            # Batches before the malformed part are already committed
+            error = f'Invalid JSON after {importer.stats["received"]} listing(s): {e}'
+        stats = importer.finish()
+        if stats['created']:
+            transaction.on_commit(schedule_enrichment)
+        response = {'imported': stats['created'], 'stats': stats}
+        if error:
+            response['error'] = error
+        return response
 
     @action(detail=True, methods=['post'])
     def import_json(self, request, pk=None):
-        """Import listings JSON (either multipart file 'file' or raw JSON body)."""
+        """Import listings JSON or NDJSON (multipart file 'file' or raw body), streamed in batches."""
         pdf_upload = self.get_object()
         try:
-            uploaded = request.FILES.get('json_file') or request.FILES.get('file')
-            if uploaded:
-                content = uploaded.read().decode('utf-8')
-                data = json.loads(content)
-            else:
-                # Accept application/json body
-                data = request.data
-                if isinstance(data, str):
-                    data = json.loads(data)
-            created = self._import_listings(pdf_upload, data)
-            return Response({'imported': created})
+            stream, _ = self._open_import_stream(request)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        result = self._import_stream(pdf_upload, stream)
+        return Response(result, status=status.HTTP_400_BAD_REQUEST if 'error' in result else status.HTTP_200_OK)
 
     @action(detail=False, methods=['post'])
     def import_json_no_pdf(self, request):
         """Import listings JSON without an existing PDF: creates a PDFUpload then imports."""
         try:
-            # Read JSON
-            uploaded = request.FILES.get('json_file') or request.FILES.get('file')
-            if uploaded:
-                content = uploaded.read().decode('utf-8')
-                data = json.loads(content)
-            else:
-                data = request.data
-                if isinstance(data, str):
-                    data = json.loads(data)
+            stream, params = self._open_import_stream(request)
+            # Metadata placed before the listings is known once the first item is read
+            items = iter(stream)
+            first = next(items, None)
 
             # Determine metadata
-            city = data.get('city') or request.data.get('city') or 'Unknown'
-            auction_date = data.get('auction_date') or request.data.get('auction_date')
-            source_txt = data.get('source_txt') or request.data.get('source_txt') or 'import.json'
+            city = stream.meta.get('city') or params.get('city') or 'Unknown'
+            auction_date = stream.meta.get('auction_date') or params.get('auction_date')
+            source_txt = stream.meta.get('source_txt') or params.get('source_txt') or 'import.json'
 
             if not auction_date:
                 return Response({'error': 'auction_date is required (YYYY-MM-DD)'}, status=status.HTTP_400_BAD_REQUEST)
 
             # Create placeholder PDFUpload with a tiny file to satisfy FileField
-            placeholder_bytes = b'JSON import placeholder file'
-            placeholder_name = f"{str(source_txt).rsplit('.', 1)[0] or 'import'}.pdf"
-            pdf_upload = PDFUpload(
-                filename=str(source_txt),
-                city=str(city),
-                auction_date=auction_date,
-                processed=False,
-                total_listings=0,
-            )
-            pdf_upload.file.save(placeholder_name, ContentFile(placeholder_bytes), save=True)
+            pdf_upload = create_placeholder_upload(source_txt, city, auction_date)
         except Exception as e:
             return Response({'error': f'Invalid JSON or metadata: {e}'}, status=status.HTTP_400_BAD_REQUEST)
 
         # Import listings
-        created = self._import_listings(pdf_upload, data)
-        return Response({'pdf_upload_id': pdf_upload.id, 'imported': created})
+        result = self._import_stream(pdf_upload, chain([first] if first is not None else [], items))
+        result['pdf_upload_id'] = pdf_upload.id
+        return Response(result, status=status.HTTP_400_BAD_REQUEST if 'error' in result else status.HTTP_200_OK)
 
     @action(detail=False, methods=['post'])
     def import_from_data_dir(self, request):
@@ -587,25 +508,11 @@ class PDFUploadViewSet(CORSViewSetMixin, viewsets.ModelViewSet):
             return Response({'success': False, 'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     @action(detail=True, methods=['post'])
     def process(self, request, pk=None):
-        """Process uploaded PDF to extract listings"""
+        """Queue processing of the uploaded PDF to extract listings"""
+        from ocr_parser.models import ProcessingJob
+
         pdf_upload = self.get_object()
-        
-        from ocr_parser.services import OCRProcessingService
-        
-        service = OCRProcessingService()
-        result = service.process_pdf_upload(pdf_upload)
-        
-        if result['success']:
-            return Response({
-                'message': result['message'],
-                'status': 'completed',
-                'listings_count': result['listings_count']
-            })
-        else:
-            return Response({
-                'message': result['message'],
-                'status': 'failed'
-            }, status=status.HTTP_400_BAD_REQUEST)
+        return self._enqueue(pdf_upload, ProcessingJob.JOB_PROCESS, 'Processing queued')
 
 
 @method_decorator(csrf_exempt, name='dispatch')
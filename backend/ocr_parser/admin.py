@@ -1,3 +1,18 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import ProcessingJob
+
+
+@admin.register(ProcessingJob)
+class ProcessingJobAdmin(admin.ModelAdmin):
+    list_display = [
+        'id', 'pdf_upload', 'job_type', 'status', 'stage',
+        'pages_processed', 'pages_total', 'attempts', 'created_at', 'finished_at'
+    ]
+    list_filter = ['status', 'job_type', 'backend']
+    search_fields = ['pdf_upload__filename', 'error']
+    readonly_fields = [
+        'stage', 'pages_total', 'pages_processed', 'timings', 'result', 'error',
+        'attempts', 'backend', 'worker', 'created_at', 'started_at', 'finished_at'
+    ]
+    ordering = ['-created_at']
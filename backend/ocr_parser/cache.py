@@ -0,0 +1,159 @@
+"""Content-addressed cache of extracted PDF text, one entry per page.
+
+Entries are keyed by the SHA-256 of the PDF bytes, the page number and the
+settings of the extractor that produced the page: text-layer pages by the
+text backend settings, OCR'd pages by the OCR settings. An unchanged bulletin
+is never re-extracted, whichever entry point asks for it (API, admin action
+or management command), and changing the OCR settings only redoes the OCR'd
+pages. Page texts are stored raw; normalization and Arabic shaping run after
+lookup, when the pages are joined. Entries are JSON files in a shared
+directory; the directory is kept under a byte budget by evicting the least
+recently used entries, using file mtimes as the access clock. The cache keeps
+a running total of the directory size and only walks it when a write takes
+the total over budget; eviction then frees down to EVICT_TO of the budget,
+so the next walk is many writes away. Writes from other processes are picked
+up by that walk.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EXTRACTION_CACHE_ENABLED = os.environ.get('EXTRACTION_CACHE_ENABLED', 'True').lower() == 'true'
+EXTRACTION_CACHE_DIR = os.environ.get(
+    'EXTRACTION_CACHE_DIR', os.path.join(BACKEND_DIR, '.cache', 'extraction')
+)
+EXTRACTION_CACHE_MAX_BYTES = int(os.environ.get('EXTRACTION_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+# Eviction frees the cache down to this share of its budget
+EVICT_TO = 0.8
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Hash a file without loading it into memory"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """Size-bounded LRU cache of extraction results on disk"""
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.directory = directory or EXTRACTION_CACHE_DIR
+        self.max_bytes = EXTRACTION_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        # Bytes on disk as of the last walk plus this process' writes since; None until the first walk
+        self._size = None
+        self._lock = threading.Lock()
+
+    def page_key(self, content_hash: str, page: int, settings: Dict) -> str:
+        """Build the key of one page from the PDF content hash and extractor settings"""
+        settings_blob = json.dumps(settings, sort_keys=True, default=str)
+        settings_hash = hashlib.sha256(settings_blob.encode('utf-8')).hexdigest()[:16]
+        return f"{content_hash}-{settings_hash}-p{page}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict]:
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            # Mark as recently used
+            os.utime(path, None)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key: str, value: Dict):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(value, f, ensure_ascii=False)
+            written = os.path.getsize(tmp_path)
+            try:
+                replaced = os.stat(path).st_size
+            except OSError:
+                replaced = 0
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write extraction cache entry {key}: {e}")
+            return
+        with self._lock:
+            if self._size is not None:
+                self._size += written - replaced
+            over_budget = self._size is None or self._size > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def evict(self):
+        """Walk the cache and, if it is over budget, remove least recently used entries"""
+        with self._lock:
+            self._size = self._evict()
+
+    def _evict(self) -> int:
+        entries = []
+        total = 0
+        for root, _dirs, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        if total <= self.max_bytes:
+            return total
+        target = int(self.max_bytes * EVICT_TO)
+        for _mtime, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= target:
+                break
+        return total
+
+    def clear(self):
+        for root, _dirs, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.json'):
+                    try:
+                        os.remove(os.path.join(root, name))
+                    except OSError:
+                        pass
+        with self._lock:
+            self._size = 0
+
+
+_cache = None
+
+
+def get_extraction_cache() -> Optional[ExtractionCache]:
+    """Return the process-wide cache, or None when caching is disabled"""
+    global _cache
+    if not EXTRACTION_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = ExtractionCache()
+    return _cache
@@ -0,0 +1,263 @@
+"""Pluggable text extraction backends for Douane PDFs.
+
+Every backend returns one string per page. ``visual_order`` tells the parser
+whether its text goes through the BiDi display step after Arabic reshaping:
+pdfplumber emits right-to-left runs in visual (left-to-right glyph) order,
+PyMuPDF in logical order. OCR pages keep the display step they always had.
+"""
+import os
+import time
+import unicodedata
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+import logging
+
+import pdfplumber
+
+from .ocr_engine import get_ocr_engine
+
+logger = logging.getLogger(__name__)
+
+# Tweaked tolerances often help RTL scripts
+TEXT_X_TOLERANCE = 1.5
+TEXT_Y_TOLERANCE = 1.5
+
+# Backend for the text layer: pdfplumber, pymupdf or auto
+PDF_TEXT_BACKEND = os.environ.get('PDF_TEXT_BACKEND', 'pdfplumber').lower()
+# Minimum character agreement with pdfplumber for auto to accept a faster backend
+AUTO_MIN_AGREEMENT = float(os.environ.get('PDF_AUTO_MIN_AGREEMENT', '0.9') or 0.9)
+AUTO_PROBE_PAGES = 2
+
+
+class BaseExtractor:
+    """Interface implemented by every extraction backend"""
+    name = ''
+    visual_order = False
+
+    @classmethod
+    def available(cls) -> bool:
+        return True
+
+    def page_count(self, pdf_path: str) -> int:
+        raise NotImplementedError
+
+    def extract_range(self, pdf_path: str, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        """Return the text of pages [start, stop) with a single open of the PDF"""
+        raise NotImplementedError
+
+    def settings(self) -> Dict:
+        """Options that change this backend's output"""
+        return {'backend': self.name}
+
+
+class PdfPlumberExtractor(BaseExtractor):
+    """pdfplumber text layer; slow but the reference output for the parser"""
+    name = 'pdfplumber'
+    visual_order = True
+
+    def __init__(self, x_tolerance: float = TEXT_X_TOLERANCE, y_tolerance: float = TEXT_Y_TOLERANCE):
+        self.x_tolerance = x_tolerance
+        self.y_tolerance = y_tolerance
+
+    def page_count(self, pdf_path: str) -> int:
+        with pdfplumber.open(pdf_path) as pdf:
+            return len(pdf.pages)
+
+    def extract_range(self, pdf_path: str, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        with pdfplumber.open(pdf_path) as pdf:
+            pages = pdf.pages[start:stop]
+            return [
+                page.extract_text(x_tolerance=self.x_tolerance, y_tolerance=self.y_tolerance) or ""
+                for page in pages
+            ]
+
+    def settings(self) -> Dict:
+        return {'backend': self.name, 'x_tolerance': self.x_tolerance, 'y_tolerance': self.y_tolerance}
+
+
+class PyMuPDFExtractor(BaseExtractor):
+    """PyMuPDF text layer; an order of magnitude faster than pdfplumber"""
+    name = 'pymupdf'
+    visual_order = False
+
+    @staticmethod
+    def _module():
+        try:
+            import pymupdf  # type: ignore
+            return pymupdf
+        except ImportError:
+            import fitz  # type: ignore
+            return fitz
+
+    @classmethod
+    def available(cls) -> bool:
+        try:
+            cls._module()
+            return True
+        except ImportError:
+            return False
+
+    def page_count(self, pdf_path: str) -> int:
+        with self._module().open(pdf_path) as doc:
+            return doc.page_count
+
+    def extract_range(self, pdf_path: str, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        with self._module().open(pdf_path) as doc:
+            stop = doc.page_count if stop is None else min(stop, doc.page_count)
+            return [doc[i].get_text() or "" for i in range(start, stop)]
+
+
+class OCRExtractor(BaseExtractor):
+    """Tesseract through the shared OCR engine, for pages without a text layer"""
+    name = 'ocr'
+    # Tesseract emits logical order, but OCR text has always been reshaped and
+    # passed through get_display like pdfplumber text; the parser expects that
+    visual_order = True
+
+    def __init__(self, lang: str = "ara+fra", psm: int = 6, dpi: int = 300, window_pages: int = 1):
+        self.lang = lang
+        self.psm = psm
+        self.dpi = dpi
+        self.window_pages = max(1, window_pages)
+
+    def page_count(self, pdf_path: str) -> int:
+        if PyMuPDFExtractor.available():
+            return PyMuPDFExtractor().page_count(pdf_path)
+        return PdfPlumberExtractor().page_count(pdf_path)
+
+    def page_windows(self, page_numbers: List[int]) -> List[Tuple[int, int]]:
+        """Group page numbers into runs of consecutive pages of at most window_pages"""
+        windows = []
+        for number in sorted(page_numbers):
+            if windows and number == windows[-1][1] + 1 and number - windows[-1][0] < self.window_pages:
+                windows[-1] = (windows[-1][0], number)
+            else:
+                windows.append((number, number))
+        return windows
+
+    def iter_pages(self, pdf_path: str, page_numbers: List[int]) -> Iterator[Tuple[int, str]]:
+        """OCR the given 1-based pages, yielding ``(page, text)`` in page order"""
+        engine = get_ocr_engine(lang=self.lang, psm=self.psm, dpi=self.dpi)
+        yield from engine.ocr_pdf_pages(pdf_path, self.page_windows(page_numbers))
+
+    def extract_range(self, pdf_path: str, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        stop = self.page_count(pdf_path) if stop is None else stop
+        texts = dict(self.iter_pages(pdf_path, list(range(start + 1, stop + 1))))
+        return [texts.get(number, "") for number in range(start + 1, stop + 1)]
+
+    def settings(self) -> Dict:
+        return {'backend': self.name, 'lang': self.lang, 'psm': self.psm, 'dpi': self.dpi}
+
+
+EXTRACTORS = {
+    PdfPlumberExtractor.name: PdfPlumberExtractor,
+    PyMuPDFExtractor.name: PyMuPDFExtractor,
+    OCRExtractor.name: OCRExtractor,
+}
+
+
+def get_extractor(name: str, **options) -> BaseExtractor:
+    """Instantiate a backend by name"""
+    try:
+        extractor_class = EXTRACTORS[name]
+    except KeyError:
+        raise ValueError(f"Unknown extraction backend: {name}")
+    if not extractor_class.available():
+        raise ValueError(f"Extraction backend not installed: {name}")
+    return extractor_class(**options)
+
+
+_extract_pool = None
+_extract_pool_size = 0
+
+
+def _get_extract_pool(workers: int) -> ProcessPoolExecutor:
+    """Return the shared extraction pool, resizing it if needed"""
+    global _extract_pool, _extract_pool_size
+    if _extract_pool is None or _extract_pool_size != workers:
+        if _extract_pool is not None:
+            _extract_pool.shutdown(wait=False)
+        _extract_pool = ProcessPoolExecutor(max_workers=workers)
+        _extract_pool_size = workers
+    return _extract_pool
+
+
+def extract_parallel(extractor: BaseExtractor, pdf_path: str, page_count: int, workers: int) -> List[str]:
+    """Extract contiguous page ranges on the process pool, preserving page order"""
+    workers = min(workers, page_count)
+    chunk = -(-page_count // workers)
+    ranges = [(start, min(start + chunk, page_count)) for start in range(0, page_count, chunk)]
+    try:
+        pool = _get_extract_pool(workers)
+        futures = [pool.submit(extractor.extract_range, pdf_path, start, stop) for start, stop in ranges]
+        texts = []
+        for future in futures:
+            texts.extend(future.result())
+        return texts
+    except Exception as e:
+        logger.warning(f"Parallel extraction failed, falling back to serial: {e}")
+        return extractor.extract_range(pdf_path, 0, page_count)
+
+
+def _char_profile(text: str) -> Counter:
+    """Visible characters in canonical form, independent of order and shaping"""
+    return Counter(ch for ch in unicodedata.normalize('NFKC', text) if not ch.isspace())
+
+
+def text_agreement(candidate: str, reference: str) -> float:
+    """Share of characters two extractions have in common (1.0 = same glyphs)"""
+    a, b = _char_profile(candidate), _char_profile(reference)
+    total = max(sum(a.values()), sum(b.values()))
+    if not total:
+        return 1.0
+    return sum((a & b).values()) / total
+
+
+def is_logical_arabic(text: str) -> bool:
+    """Heuristic: logical-order Arabic has words starting with 'ال', visual order ending with 'لا'"""
+    words = [word for word in text.split() if any('ء' <= ch <= 'ي' for ch in word)]
+    starts = sum(1 for word in words if word.startswith('ال'))
+    ends = sum(1 for word in words if word.endswith('لا'))
+    return starts >= ends
+
+
+def choose_text_backend(pdf_path: str, timings: Optional[Dict[str, float]] = None) -> BaseExtractor:
+    """Pick the fastest backend whose Arabic output matches the reference.
+
+    PyMuPDF is probed on the first pages against pdfplumber. It is accepted
+    when it finds the same glyphs (character agreement >= AUTO_MIN_AGREEMENT)
+    and its Arabic comes out in logical order; otherwise pdfplumber is used.
+    """
+    reference = PdfPlumberExtractor()
+    if not PyMuPDFExtractor.available():
+        return reference
+    candidate = PyMuPDFExtractor()
+
+    started = time.perf_counter()
+    candidate_text = "\n".join(candidate.extract_range(pdf_path, 0, AUTO_PROBE_PAGES))
+    candidate_time = time.perf_counter() - started
+    started = time.perf_counter()
+    reference_text = "\n".join(reference.extract_range(pdf_path, 0, AUTO_PROBE_PAGES))
+    reference_time = time.perf_counter() - started
+    if timings is not None:
+        timings[f'probe_{candidate.name}'] = candidate_time
+        timings[f'probe_{reference.name}'] = reference_time
+
+    agreement = text_agreement(candidate_text, reference_text)
+    logical = is_logical_arabic(candidate_text)
+    logger.info(
+        f"Backend probe: {candidate.name} {candidate_time:.3f}s vs {reference.name} {reference_time:.3f}s, "
+        f"agreement {agreement:.2f}, logical Arabic {logical}"
+    )
+    if agreement >= AUTO_MIN_AGREEMENT and logical and candidate_time <= reference_time:
+        return candidate
+    return reference
+
+
+def resolve_text_backend(name: str = PDF_TEXT_BACKEND, pdf_path: Optional[str] = None,
+                         timings: Optional[Dict[str, float]] = None) -> BaseExtractor:
+    """Resolve a configured backend name (including ``auto``) to an extractor"""
+    if name == 'auto':
+        return choose_text_backend(pdf_path, timings)
+    return get_extractor(name)
@@ -0,0 +1,373 @@
+"""Background processing jobs for PDF uploads.
+
+Processing a scanned bulletin can take minutes of OCR, far longer than an
+HTTP request may live, so views only enqueue a ``ProcessingJob`` and return
+its id; the work runs in separate worker processes and reports its stage,
+page progress, timings and errors on the job row.
+
+Backends (``JOB_BACKEND``):
+  - ``celery``: a Celery task per job (needs ``CELERY_BROKER_URL``, e.g. redis)
+  - ``local``:  a pool of worker processes owned by the web process
+  - ``db``:     jobs wait in the database until ``manage.py process_jobs``
+                claims them (works on SQLite, no external services)
+  - ``sync``:   run in the calling process (tests, debugging)
+
+Whatever the backend, a job is claimed with a conditional UPDATE from
+``queued`` to ``running``, so it never runs twice, and a partial unique
+constraint keeps a single queued or running job per upload and type.
+
+A running job beats ``heartbeat_at`` while it works. A job whose worker
+stopped beating (crashed, killed, restarted web process), or that its backend
+lost while queued, is reaped: ``process_jobs`` requeues it and runs it
+itself, ``enqueue_job`` and ``cancel_job`` fail it so the upload can be
+processed again, and ``process_jobs --reap-only`` (run by entrypoint.sh
+before the web server starts) fails the jobs the previous web server left.
+"""
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from listings.models import PDFUpload
+from .models import ProcessingJob
+
+logger = logging.getLogger(__name__)
+
+JOB_BACKEND = os.environ.get(
+    'JOB_BACKEND', 'celery' if getattr(settings, 'CELERY_BROKER_URL', '') else 'local'
+).lower()
+# Worker processes for the local backend and process_jobs
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '1') or 1)
+# Jobs per local worker process before it is replaced (releases OCR memory)
+JOB_MAX_TASKS_PER_CHILD = int(os.environ.get('JOB_MAX_TASKS_PER_CHILD', '20') or 20)
+# Seconds between heartbeats of a running job
+JOB_HEARTBEAT_SECONDS = int(os.environ.get('JOB_HEARTBEAT_SECONDS', '60') or 60)
+# Minutes without a heartbeat before a job is considered lost and reaped
+JOB_STALE_MINUTES = int(os.environ.get('JOB_STALE_MINUTES', '15') or 15)
+# Runs of a job before the reaper fails it instead of requeueing it
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '3') or 3)
+
+_job_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_job_pool(workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """Process pool for running jobs; workers are spawned, not forked, so
+    they don't share the parent's database connections"""
+    global _job_pool
+    if workers is not None:
+        return _new_pool(workers)
+    if _job_pool is None:
+        _job_pool = _new_pool(JOB_WORKERS)
+    return _job_pool
+
+
+def _new_pool(workers: int) -> ProcessPoolExecutor:
+    from .worker import init_worker
+    return ProcessPoolExecutor(
+        max_workers=max(1, workers),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_worker,
+        max_tasks_per_child=JOB_MAX_TASKS_PER_CHILD,
+    )
+
+
+def enqueue_job(pdf_upload: PDFUpload, job_type: str = ProcessingJob.JOB_PROCESS,
+                backend: Optional[str] = None) -> ProcessingJob:
+    """Create a queued job and dispatch it once the transaction commits.
+    
+    An unfinished job of the same type for the same upload is returned instead,
+    unless it is stale (then it is failed and replaced); the unique constraint
+    settles concurrent requests.
+    """
+    active = _active_job(pdf_upload, job_type)
+    if active is not None and not _fail_if_stale(active):
+        return active
+    try:
+        with transaction.atomic():
+            job = ProcessingJob.objects.create(
+                pdf_upload=pdf_upload, job_type=job_type, backend=backend or JOB_BACKEND
+            )
+    except IntegrityError:
+        active = _active_job(pdf_upload, job_type)
+        if active is None:
+            raise
+        return active
+    transaction.on_commit(lambda: dispatch_job(job.pk, job.backend))
+    return job
+
+
+def _active_job(pdf_upload: PDFUpload, job_type: str) -> Optional[ProcessingJob]:
+    return ProcessingJob.objects.filter(
+        pdf_upload=pdf_upload, job_type=job_type, status__in=ProcessingJob.ACTIVE_STATUSES
+    ).first()
+
+
+def _stale_before() -> datetime:
+    return timezone.now() - timedelta(minutes=JOB_STALE_MINUTES)
+
+
+def _fail_if_stale(job: ProcessingJob, status: str = ProcessingJob.STATUS_FAILED) -> bool:
+    """Finish an active job without a recent heartbeat; False if it is alive
+    (or finished meanwhile)"""
+    stale = ProcessingJob.objects.filter(
+        pk=job.pk, status__in=ProcessingJob.ACTIVE_STATUSES, heartbeat_at__lt=_stale_before()
+    ).update(
+        status=status, finished_at=timezone.now(), error='Worker stopped responding',
+        **({'stage': 'failed'} if status == ProcessingJob.STATUS_FAILED else {}),
+    )
+    if stale:
+        logger.warning(f"Job {job.pk} had no heartbeat for {JOB_STALE_MINUTES} minutes, marked {status}")
+    return bool(stale)
+
+
+def dispatch_job(job_id: int, backend: str):
+    """Hand a queued job to its backend"""
+    try:
+        if backend == 'celery':
+            from .tasks import run_job_task
+            task = run_job_task.delay(job_id)
+            # Unless the task already claimed it, which sets its own worker
+            ProcessingJob.objects.filter(pk=job_id, status=ProcessingJob.STATUS_QUEUED).update(worker=task.id)
+        elif backend == 'local':
+            from .worker import run_job_in_worker
+            # The host whose web server holds the job, see recover_local_jobs()
+            ProcessingJob.objects.filter(pk=job_id, status=ProcessingJob.STATUS_QUEUED).update(
+                worker=f"{socket.gethostname()}:pool"
+            )
+            future = get_job_pool().submit(run_job_in_worker, job_id)
+            future.add_done_callback(lambda done: _check_worker_result(job_id, done))
+        elif backend == 'sync':
+            run_job(job_id)
+        elif backend != 'db':
+            raise ValueError(f"Unknown job backend: {backend}")
+    except Exception as e:
+        logger.error(f"Could not dispatch job {job_id}: {e}")
+        # Nothing will ever claim it: fail it, so it doesn't block the upload
+        _finish(job_id, ProcessingJob.STATUS_FAILED, only_if=[ProcessingJob.STATUS_QUEUED],
+                stage='failed', error=f"Dispatch failed: {e}")
+
+
+def _check_worker_result(job_id: int, future):
+    """Fail the job if its worker process died before finishing it"""
+    global _job_pool
+    error = future.exception()
+    if error is None:
+        return
+    logger.error(f"Worker for job {job_id} crashed: {error}")
+    if isinstance(error, BrokenProcessPool):
+        _job_pool = None
+    _finish(job_id, ProcessingJob.STATUS_FAILED, error=f"Worker crashed: {error}",
+            only_if=[ProcessingJob.STATUS_QUEUED, ProcessingJob.STATUS_RUNNING])
+    close_old_connections()
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_job(job_id: int) -> bool:
+    """Atomically move a queued job to running; False if someone else has it"""
+    now = timezone.now()
+    return bool(ProcessingJob.objects.filter(pk=job_id, status=ProcessingJob.STATUS_QUEUED).update(
+        status=ProcessingJob.STATUS_RUNNING,
+        started_at=now,
+        heartbeat_at=now,
+        attempts=F('attempts') + 1,
+        worker=worker_name(),
+    ))
+
+
+def queued_job_ids(limit: int, exclude: Optional[List[int]] = None) -> List[int]:
+    """Oldest queued jobs, for the db backend"""
+    queryset = ProcessingJob.objects.filter(status=ProcessingJob.STATUS_QUEUED)
+    if exclude:
+        queryset = queryset.exclude(pk__in=exclude)
+    return list(queryset.order_by('created_at', 'pk').values_list('pk', flat=True)[:limit])
+
+
+def reap_stale_jobs(stale_minutes: int = JOB_STALE_MINUTES, requeue: bool = True) -> Dict[str, int]:
+    """Recover jobs nobody is working on anymore.
+
+    Running jobs without a heartbeat for ``stale_minutes`` are queued again
+    for ``process_jobs`` (or failed after ``JOB_MAX_ATTEMPTS`` runs); queued
+    jobs their backend never picked up are handed to ``process_jobs`` too.
+    Without ``requeue`` (no ``process_jobs`` to run them) both are failed.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(minutes=stale_minutes)
+    stale = ProcessingJob.objects.filter(status=ProcessingJob.STATUS_RUNNING, heartbeat_at__lt=cutoff)
+    lost = ProcessingJob.objects.filter(status=ProcessingJob.STATUS_QUEUED, heartbeat_at__lt=cutoff).exclude(backend='db')
+    if not requeue:
+        failed = stale.update(
+            status=ProcessingJob.STATUS_FAILED, stage='failed', finished_at=now, error='Worker stopped responding'
+        )
+        lost = lost.update(
+            status=ProcessingJob.STATUS_FAILED, stage='failed', finished_at=now, error='Lost while queued'
+        )
+        requeued = 0
+    else:
+        failed = stale.filter(attempts__gte=JOB_MAX_ATTEMPTS).update(
+            status=ProcessingJob.STATUS_FAILED, stage='failed', finished_at=now,
+            error=f"Worker stopped responding ({JOB_MAX_ATTEMPTS} attempts)",
+        )
+        requeued = stale.update(
+            status=ProcessingJob.STATUS_QUEUED, stage='pending', pages_processed=0, worker='',
+            started_at=None, heartbeat_at=now, backend='db', error='Requeued: worker stopped responding',
+        )
+        lost = lost.update(backend='db', heartbeat_at=now)
+    if failed or requeued or lost:
+        logger.warning(f"Reaped stale jobs: {requeued} requeued, {failed} failed, {lost} lost in queue")
+    return {'requeued': requeued, 'failed': failed, 'lost': lost}
+
+
+def recover_local_jobs() -> int:
+    """Fail the local-backend jobs held by this host's previous web server.
+
+    Call before the web server starts (entrypoint.sh runs
+    ``process_jobs --reap-only``): their worker processes died with it, but
+    their heartbeat may still look recent. Returns the number of jobs failed.
+    """
+    failed = ProcessingJob.objects.filter(
+        backend='local', status__in=ProcessingJob.ACTIVE_STATUSES, worker__startswith=f"{socket.gethostname()}:"
+    ).update(
+        status=ProcessingJob.STATUS_FAILED, stage='failed', finished_at=timezone.now(),
+        error='Interrupted by a restart of the web server',
+    )
+    if failed:
+        logger.warning(f"Failed {failed} job(s) interrupted by a web server restart")
+    return failed
+
+
+@contextmanager
+def _heartbeat(job_id: int, owner: str):
+    """Beat ``heartbeat_at`` from a background thread while the job runs"""
+    stopped = threading.Event()
+
+    def beat():
+        try:
+            while not stopped.wait(JOB_HEARTBEAT_SECONDS):
+                try:
+                    alive = ProcessingJob.objects.filter(
+                        pk=job_id, status=ProcessingJob.STATUS_RUNNING, worker=owner
+                    ).update(heartbeat_at=timezone.now())
+                except Exception as e:
+                    logger.warning(f"Heartbeat of job {job_id} failed: {e}")
+                    continue
+                if not alive:
+                    break
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f'job-{job_id}-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join(timeout=5)
+
+
+def run_job(job_id: int) -> Optional[Dict]:
+    """Claim and run a job in this process; returns its result"""
+    if not claim_job(job_id):
+        logger.info(f"Job {job_id} is not queued anymore, skipping")
+        return None
+
+    owner = worker_name()
+    job = ProcessingJob.objects.select_related('pdf_upload').get(pk=job_id)
+    started = time.perf_counter()
+    logger.info(f"Running {job}")
+    try:
+        from .services import OCRProcessingService
+        service = OCRProcessingService(on_progress=lambda fields: _report_progress(job_id, fields, owner))
+        with _heartbeat(job_id, owner):
+            if job.job_type == ProcessingJob.JOB_EXTRACT_TXT:
+                result = service.extract_txt(job.pdf_upload)
+            else:
+                result = service.process_pdf_upload(job.pdf_upload)
+    except Exception as e:
+        logger.exception(f"Job {job_id} failed")
+        result = {'success': False, 'message': str(e)}
+
+    timings = dict(result.pop('timings', None) or {})
+    timings['total'] = time.perf_counter() - started
+    success = bool(result.get('success'))
+    # A reaped job may be running elsewhere by now: only its owner finishes it
+    finished = _finish(
+        job_id, ProcessingJob.STATUS_COMPLETED if success else ProcessingJob.STATUS_FAILED,
+        only_if=[ProcessingJob.STATUS_RUNNING], owner=owner,
+        stage='done' if success else 'failed',
+        error='' if success else result.get('message', 'Job failed'),
+        result=result, timings={name: round(secs, 3) for name, secs in timings.items()},
+    )
+    if not finished:
+        logger.warning(f"Job {job_id} was taken over while running here, result not recorded")
+    return result
+
+
+def _report_progress(job_id: int, fields: Dict, owner: str):
+    """Mirror the service's progress updates onto the job"""
+    update = {'heartbeat_at': timezone.now()}
+    if 'processing_stage' in fields:
+        update['stage'] = fields['processing_stage']
+    for name in ('pages_total', 'pages_processed'):
+        if name in fields:
+            update[name] = fields[name]
+    ProcessingJob.objects.filter(pk=job_id, worker=owner).update(**update)
+
+
+def _finish(job_id: int, status: str, only_if: Optional[List[str]] = None, owner: Optional[str] = None,
+            **fields) -> bool:
+    queryset = ProcessingJob.objects.filter(pk=job_id)
+    if only_if:
+        queryset = queryset.filter(status__in=only_if)
+    if owner is not None:
+        queryset = queryset.filter(worker=owner)
+    return bool(queryset.update(status=status, finished_at=timezone.now(), **fields))
+
+
+def cancel_job(job: ProcessingJob) -> bool:
+    """Cancel a job that has not started yet, or whose worker stopped responding"""
+    cancelled = (
+        _finish(job.pk, ProcessingJob.STATUS_CANCELLED, only_if=[ProcessingJob.STATUS_QUEUED])
+        or _fail_if_stale(job, status=ProcessingJob.STATUS_CANCELLED)
+    )
+    if cancelled and job.backend == 'celery' and job.worker:
+        try:
+            from .tasks import run_job_task
+            run_job_task.app.control.revoke(job.worker)
+        except Exception as e:
+            logger.warning(f"Could not revoke celery task for job {job.pk}: {e}")
+    job.refresh_from_db()
+    return cancelled
+
+
+def retry_job(job: ProcessingJob) -> bool:
+    """Queue a failed or cancelled job again, unless the upload has another
+    active job of that type"""
+    try:
+        with transaction.atomic():
+            requeued = ProcessingJob.objects.filter(
+                pk=job.pk, status__in=[ProcessingJob.STATUS_FAILED, ProcessingJob.STATUS_CANCELLED]
+            ).update(
+                status=ProcessingJob.STATUS_QUEUED, stage='pending', pages_processed=0, error='',
+                result={}, timings={}, started_at=None, finished_at=None, heartbeat_at=timezone.now(),
+            )
+    except IntegrityError:
+        requeued = 0
+    if requeued:
+        transaction.on_commit(lambda: dispatch_job(job.pk, job.backend))
+    job.refresh_from_db()
+    return bool(requeued)
@@ -0,0 +1,233 @@
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from glob import glob
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from listings.models import PDFUpload
+from ocr_parser.services import root_txt_path
+from ocr_parser.worker import extract_pdf_file, init_batch_worker, process_upload
+
+
+class Command(BaseCommand):
+    help = 'Extract (or process) many PDFs in parallel worker processes, resumably'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='PDF files or folders of PDFs to extract to TXT')
+        parser.add_argument('--uploads', action='store_true',
+                            help='Use unprocessed PDF uploads instead of paths (all uploads with --force)')
+        parser.add_argument('--process', action='store_true',
+                            help='With --uploads, create listings instead of writing TXT files')
+        parser.add_argument('--output-dir', help='Folder for TXT files (defaults to the project root)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Documents processed in parallel')
+        parser.add_argument('--ocr-workers', type=int, default=0,
+                            help='Tesseract processes per worker (default: CPUs / workers)')
+        parser.add_argument('--max-memory', type=int, default=0,
+                            help='Address space limit per worker in MB (0 = unlimited)')
+        parser.add_argument('--checkpoint', default='batch_process.checkpoint.jsonl',
+                            help='File recording finished documents, to resume an interrupted run')
+        parser.add_argument('--restart', action='store_true', help='Ignore and overwrite the checkpoint file')
+        parser.add_argument('--force', action='store_true', help='Re-extract even if the TXT file exists')
+        parser.add_argument('--no-cache', action='store_true', help='Bypass the extraction cache')
+
+    def handle(self, *args, **options):
+        if options['process'] and not options['uploads']:
+            raise CommandError('--process only applies to --uploads')
+        tasks = self._upload_tasks(options) if options['uploads'] else self._path_tasks(options)
+        if not tasks:
+            self.stdout.write(self.style.WARNING('No PDFs to process'))
+            return
+
+        checkpoint = options['checkpoint']
+        done = set() if options['restart'] else self._read_checkpoint(checkpoint)
+        pending = [task for task in tasks if task['key'] not in done]
+        skipped = len(tasks) - len(pending)
+        if skipped:
+            self.stdout.write(f'Skipping {skipped} document(s) already done in {checkpoint}')
+        if not pending:
+            self.stdout.write(self.style.SUCCESS('Nothing left to do'))
+            return
+        # Largest documents first, so a big bulletin doesn't finish the run alone
+        pending.sort(key=lambda task: task['size'], reverse=True)
+
+        workers = max(1, min(options['workers'], len(pending) or 1))
+        ocr_workers = options['ocr_workers'] or max(1, (os.cpu_count() or 1) // workers)
+        environ = {
+            'OCR_WORKERS': str(ocr_workers),
+            # Documents are already spread over processes
+            'PDF_EXTRACT_WORKERS': '1',
+            'PARSE_WORKERS': '1',
+        }
+        self.stdout.write(
+            f'Processing {len(pending)} document(s) with {workers} worker(s), '
+            f'{ocr_workers} OCR process(es) each'
+            + (f', {options["max_memory"]} MB max per worker' if options['max_memory'] else '')
+        )
+
+        totals = {'docs': 0, 'failed': 0, 'pages': 0, 'text_pages': 0, 'ocr_pages': 0, 'cached': 0, 'listings': 0}
+        timings = {}
+        started = time.perf_counter()
+        mode = 'w' if options['restart'] else 'a'
+        with open(checkpoint, mode, encoding='utf-8') as checkpoint_file:
+            for task, stats in self._run(pending, workers, options['max_memory'], environ):
+                self._report(task, stats)
+                totals['docs'] += 1
+                totals['failed'] += 0 if stats['ok'] else 1
+                for name in ('pages', 'text_pages', 'ocr_pages', 'listings'):
+                    totals[name] += stats.get(name, 0)
+                totals['cached'] += 1 if stats.get('cached') else 0
+                for name, secs in stats.get('timings', {}).items():
+                    timings[name] = timings.get(name, 0.0) + secs
+                if stats['ok']:
+                    checkpoint_file.write(json.dumps({
+                        'key': task['key'], 'name': task['name'],
+                        'pages': stats['pages'], 'seconds': round(stats['seconds'], 3)
+                    }, ensure_ascii=False) + '\n')
+                    checkpoint_file.flush()
+        self._summary(totals, timings, time.perf_counter() - started, skipped)
+
+    def _path_tasks(self, options):
+        if not options['paths']:
+            raise CommandError('Give PDF files or folders, or use --uploads')
+        output_dir = options['output_dir'] or os.path.dirname(str(settings.BASE_DIR))
+        files = []
+        for path in options['paths']:
+            if os.path.isdir(path):
+                files.extend(glob(os.path.join(path, '**', '*.pdf'), recursive=True))
+            elif os.path.isfile(path):
+                files.append(path)
+            else:
+                self.stderr.write(self.style.WARNING(f'Not found: {path}'))
+        tasks = []
+        for path in sorted(set(os.path.abspath(path) for path in files)):
+            stat = os.stat(path)
+            txt_path = os.path.join(output_dir, os.path.splitext(os.path.basename(path))[0] + '.txt')
+            if os.path.exists(txt_path) and not options['force']:
+                continue
+            tasks.append({
+                'key': f'{path}:{stat.st_size}:{stat.st_mtime_ns}',
+                'name': os.path.basename(path),
+                'size': stat.st_size,
+                'call': (extract_pdf_file, path, txt_path, not options['no_cache']),
+            })
+        return tasks
+
+    def _upload_tasks(self, options):
+        uploads = PDFUpload.objects.exclude(file='')
+        if not options['force']:
+            uploads = uploads.filter(processed=False)
+        tasks = []
+        for upload in uploads:
+            try:
+                path = upload.file.path
+                size = os.path.getsize(path)
+            except (OSError, ValueError) as e:
+                self.stderr.write(self.style.WARNING(f'Skipping {upload.filename}: {e}'))
+                continue
+            if options['process']:
+                call = (process_upload, upload.pk)
+            else:
+                txt_path = root_txt_path(upload)
+                if options['output_dir']:
+                    txt_path = os.path.join(options['output_dir'], os.path.basename(txt_path))
+                if os.path.exists(txt_path) and not options['force']:
+                    continue
+                call = (extract_pdf_file, path, txt_path, not options['no_cache'])
+            tasks.append({
+                'key': f"upload:{upload.pk}:{'process' if options['process'] else 'txt'}:{size}",
+                'name': upload.filename,
+                'size': size,
+                'call': call,
+            })
+        return tasks
+
+    def _read_checkpoint(self, checkpoint):
+        done = set()
+        if not os.path.exists(checkpoint):
+            return done
+        with open(checkpoint, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)['key'])
+                except (ValueError, KeyError):
+                    continue  # a line cut short by an interrupted run
+        return done
+
+    def _new_pool(self, workers, max_memory, environ):
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_batch_worker,
+            initargs=(max_memory, environ),
+        )
+
+    def _run(self, tasks, workers, max_memory, environ):
+        """Yield (task, stats) as documents finish, keeping ``workers`` in flight"""
+        queue = list(reversed(tasks))
+        pool = self._new_pool(workers, max_memory, environ)
+        running = {}
+        try:
+            while queue or running:
+                while queue and len(running) < workers:
+                    task = queue.pop()
+                    function, *arguments = task['call']
+                    running[pool.submit(function, *arguments)] = task
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                broken = False
+                for future in finished:
+                    task = running.pop(future)
+                    try:
+                        yield task, future.result()
+                    except BrokenProcessPool:
+                        broken = True
+                        yield task, {'ok': False, 'pages': 0, 'seconds': 0.0,
+                                     'error': 'Worker process died (out of memory?)'}
+                if broken:
+                    # Everything still in flight went down with the pool
+                    for future, task in running.items():
+                        yield task, {'ok': False, 'pages': 0, 'seconds': 0.0,
+                                     'error': 'Worker pool restarted after a crash'}
+                    running = {}
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = self._new_pool(workers, max_memory, environ)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _report(self, task, stats):
+        if stats['ok']:
+            detail = f"{stats['pages']} pages ({stats.get('ocr_pages', 0)} OCR)"
+            if 'listings' in stats:
+                detail += f", {stats['listings']} listings"
+            if stats.get('cached'):
+                detail += ', cached'
+            self.stdout.write(self.style.SUCCESS(f"✓ {task['name']}: {detail} in {stats['seconds']:.1f}s"))
+        else:
+            self.stdout.write(self.style.ERROR(f"✗ {task['name']}: {stats['error']}"))
+
+    def _summary(self, totals, timings, elapsed, skipped):
+        self.stdout.write('=' * 50)
+        self.stdout.write(
+            f"{totals['docs'] - totals['failed']}/{totals['docs']} document(s) done in {elapsed:.1f}s"
+            + (f", {totals['failed']} failed" if totals['failed'] else '')
+            + (f", {skipped} skipped from checkpoint" if skipped else '')
+        )
+        self.stdout.write(
+            f"Pages: {totals['pages']} ({totals['text_pages']} text layer, {totals['ocr_pages']} OCR), "
+            f"{totals['cached']} document(s) from cache"
+            + (f", {totals['listings']} listings created" if totals['listings'] else '')
+        )
+        if elapsed > 0:
+            self.stdout.write(self.style.SUCCESS(
+                f"Throughput: {totals['pages'] / elapsed:.1f} pages/s, {totals['docs'] / elapsed:.2f} docs/s"
+            ))
+        if timings:
+            self.stdout.write('Worker time: ' + ', '.join(
+                f'{name}={secs:.1f}s' for name, secs in sorted(timings.items())
+            ))
+        if totals['failed']:
+            self.stdout.write(self.style.WARNING('Run the command again to retry failed documents'))
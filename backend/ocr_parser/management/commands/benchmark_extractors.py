@@ -0,0 +1,73 @@
+import os
+import time
+from glob import glob
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ocr_parser.extractors import EXTRACTORS, get_extractor, text_agreement, choose_text_backend
+
+
+class Command(BaseCommand):
+    help = 'Time each text extraction backend on real bulletins and show the speedup over pdfplumber'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='PDF files to benchmark (defaults to the checked-in bulletins)')
+        parser.add_argument(
+            '--backends', default='pdfplumber,pymupdf',
+            help='Comma-separated backends to compare (pdfplumber, pymupdf, ocr)'
+        )
+        parser.add_argument('--repeat', type=int, default=1, help='Runs per backend; the best time is kept')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or self._default_paths()
+        if not paths:
+            raise CommandError('No PDF files found')
+
+        backends = [name.strip() for name in options['backends'].split(',') if name.strip()]
+        for name in backends:
+            if name not in EXTRACTORS:
+                raise CommandError(f'Unknown backend: {name}')
+        extractors = []
+        for name in backends:
+            try:
+                extractors.append(get_extractor(name))
+            except ValueError as e:
+                self.stderr.write(self.style.WARNING(str(e)))
+
+        totals = {extractor.name: 0.0 for extractor in extractors}
+        for path in paths:
+            self.stdout.write(os.path.basename(path))
+            reference = None
+            for extractor in extractors:
+                best = None
+                for _ in range(max(1, options['repeat'])):
+                    started = time.perf_counter()
+                    texts = extractor.extract_range(path)
+                    elapsed = time.perf_counter() - started
+                    best = elapsed if best is None else min(best, elapsed)
+                totals[extractor.name] += best
+                text = "\n".join(texts)
+                if reference is None:
+                    reference = text
+                agreement = text_agreement(text, reference)
+                self.stdout.write(
+                    f'  {extractor.name:<11} {best:8.3f}s  {len(texts):3d} pages  '
+                    f'{len(texts) / best if best else 0:8.1f} pages/s  agreement {agreement:.2f}'
+                )
+            self.stdout.write(f'  auto picks: {choose_text_backend(path).name}')
+
+        baseline = totals.get('pdfplumber')
+        self.stdout.write(self.style.SUCCESS('Totals:'))
+        for name, total in totals.items():
+            speedup = f'  x{baseline / total:.1f}' if baseline and total else ''
+            self.stdout.write(f'  {name:<11} {total:8.3f}s{speedup}')
+
+    def _default_paths(self):
+        root_dir = os.path.dirname(str(settings.BASE_DIR))
+        patterns = [
+            os.path.join(root_dir, '*.pdf'),
+            os.path.join(root_dir, 'data', '*.pdf'),
+            os.path.join(str(settings.BASE_DIR), 'data', '*.pdf'),
+        ]
+        return sorted(path for pattern in patterns for path in glob(pattern))
@@ -0,0 +1,68 @@
+import os
+import time
+from glob import glob
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ocr_parser.parser import PDFParser
+
+
+class Command(BaseCommand):
+    help = 'Time the single-pass scanner against one finditer pass per pattern on extracted bulletins'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='Extracted .txt bulletins (defaults to the checked-in ones)')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per parser; the best time is kept')
+
+    def handle(self, *args, **options):
+        texts = []
+        for path in options['paths'] or self._default_paths():
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    texts.append((path, f.read()))
+            except (OSError, UnicodeDecodeError) as e:
+                self.stderr.write(self.style.WARNING(f'Skipping {os.path.basename(path)}: {e}'))
+        if not texts:
+            raise CommandError('No text files found')
+
+        parser = PDFParser(use_cache=False)
+        totals = {'multipass': 0.0, 'scanner': 0.0}
+        mismatches = 0
+        for path, text in texts:
+            results = {}
+            for name, parse in (('multipass', parser.parse_listings_multipass), ('scanner', parser.parse_text)):
+                best = None
+                for _ in range(max(1, options['repeat'])):
+                    started = time.perf_counter()
+                    result = parse(text)
+                    elapsed = time.perf_counter() - started
+                    best = elapsed if best is None else min(best, elapsed)
+                totals[name] += best
+                result['lot_numbers'] = sorted(result['lot_numbers'])
+                results[name] = (result, best)
+
+            same = results['multipass'][0] == results['scanner'][0]
+            mismatches += 0 if same else 1
+            scanned = results['scanner'][0]
+            self.stdout.write(
+                f"{os.path.basename(path)}: {len(text)} chars, {len(scanned['vehicles'])} vehicles, "
+                f"{len(scanned['goods'])} goods  multipass {results['multipass'][1] * 1000:.2f}ms  "
+                f"scanner {results['scanner'][1] * 1000:.2f}ms  {'identical' if same else 'DIFFERENT'}"
+            )
+
+        speedup = totals['multipass'] / totals['scanner'] if totals['scanner'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Totals: multipass {totals['multipass'] * 1000:.2f}ms, scanner {totals['scanner'] * 1000:.2f}ms  x{speedup:.1f}"
+        ))
+        if mismatches:
+            raise CommandError(f'{mismatches} file(s) parsed differently')
+
+    def _default_paths(self):
+        root_dir = os.path.dirname(str(settings.BASE_DIR))
+        patterns = [
+            os.path.join(root_dir, '*N°*.txt'),
+            os.path.join(root_dir, 'data', '*.txt'),
+            os.path.join(str(settings.BASE_DIR), 'debug_*.txt'),
+        ]
+        return sorted(path for pattern in patterns for path in glob(pattern))
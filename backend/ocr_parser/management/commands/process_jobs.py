@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ocr_parser.jobs import (
+    JOB_BACKEND, JOB_WORKERS, get_job_pool, queued_job_ids, reap_stale_jobs, recover_local_jobs,
+)
+from ocr_parser.worker import run_job_in_worker
+
+
+class Command(BaseCommand):
+    help = 'Run queued PDF processing jobs (the worker for JOB_BACKEND=db)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=JOB_WORKERS, help='Jobs run in parallel')
+        parser.add_argument('--poll', type=float, default=2.0, help='Seconds between checks for new jobs')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+        parser.add_argument('--reap-interval', type=float, default=60.0,
+                            help='Seconds between requeueing jobs whose worker stopped responding')
+        parser.add_argument('--reap-only', action='store_true',
+                            help='Reap stale jobs once and exit (run before starting the web server)')
+
+    def handle(self, *args, **options):
+        if options['reap_only']:
+            self.reap_only()
+            return
+        workers = max(1, options['workers'])
+        self.stdout.write(f'Processing jobs with {workers} worker(s)...')
+        running = {}
+        pool = get_job_pool(workers)
+        reaped_at = None
+        try:
+            while True:
+                if reaped_at is None or time.monotonic() - reaped_at >= options['reap_interval']:
+                    self.report(reap_stale_jobs())
+                    reaped_at = time.monotonic()
+
+                for future in [future for future in running if future.done()]:
+                    job_id = running.pop(future)
+                    error = future.exception()
+                    if error:
+                        self.stderr.write(self.style.ERROR(f'Job {job_id} crashed: {error}'))
+                    else:
+                        self.stdout.write(self.style.SUCCESS(f'Job {job_id} finished'))
+
+                job_ids = queued_job_ids(workers - len(running), exclude=list(running.values()))
+                for job_id in job_ids:
+                    self.stdout.write(f'Starting job {job_id}')
+                    running[pool.submit(run_job_in_worker, job_id)] = job_id
+
+                if options['once'] and not running and not job_ids:
+                    break
+                if not job_ids:
+                    time.sleep(options['poll'] if not running else min(options['poll'], 0.5))
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Interrupted, waiting for running jobs...'))
+        finally:
+            pool.shutdown(wait=True)
+
+    def reap_only(self):
+        """Stale jobs are requeued for the db backend; other backends have
+        nothing to run them again, so they are failed and can be retried"""
+        if JOB_BACKEND == 'local':
+            interrupted = recover_local_jobs()
+            if interrupted:
+                self.stdout.write(self.style.WARNING(f'{interrupted} job(s) interrupted by the last restart failed'))
+        self.report(reap_stale_jobs(requeue=JOB_BACKEND == 'db'))
+
+    def report(self, reaped):
+        if any(reaped.values()):
+            self.stdout.write(self.style.WARNING(
+                f"Reaped stale jobs: {reaped['requeued']} requeued, {reaped['failed']} failed, "
+                f"{reaped['lost']} lost in queue"
+            ))
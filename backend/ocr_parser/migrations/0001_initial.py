@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('listings', '0003_pdfupload_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessingJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_type', models.CharField(choices=[('process', 'Process PDF'), ('extract_txt', 'Extract TXT')], default='process', max_length=20)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='queued', max_length=20)),
+                ('stage', models.CharField(default='pending', max_length=20)),
+                ('pages_total', models.IntegerField(default=0)),
+                ('pages_processed', models.IntegerField(default=0)),
+                ('timings', models.JSONField(blank=True, default=dict)),
+                ('result', models.JSONField(blank=True, default=dict)),
+                ('error', models.TextField(blank=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('backend', models.CharField(blank=True, max_length=20)),
+                ('worker', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('pdf_upload', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='listings.pdfupload')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='ocr_parser__status_4318ce_idx')],
+            },
+        ),
+    ]
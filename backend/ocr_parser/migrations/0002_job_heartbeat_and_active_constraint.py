@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:56
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def cancel_duplicate_active_jobs(apps, schema_editor):
+    """Keep the newest queued/running job per upload and type, so the constraint can be added"""
+    ProcessingJob = apps.get_model('ocr_parser', 'ProcessingJob')
+    kept = set()
+    active = ProcessingJob.objects.filter(status__in=['queued', 'running']).order_by('-created_at', '-pk')
+    for job in active:
+        key = (job.pdf_upload_id, job.job_type)
+        if key not in kept:
+            kept.add(key)
+            continue
+        ProcessingJob.objects.filter(pk=job.pk).update(
+            status='cancelled', finished_at=django.utils.timezone.now(), error='Duplicate of a newer active job'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ocr_parser', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(cancel_duplicate_active_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='processingjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('pdf_upload', 'job_type'), name='one_active_job_per_upload'),
+        ),
+    ]
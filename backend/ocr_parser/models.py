@@ -1,3 +1,84 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class ProcessingJob(models.Model):
+    """Background PDF processing run, tracked from enqueue to completion"""
+
+    JOB_PROCESS = 'process'
+    JOB_EXTRACT_TXT = 'extract_txt'
+    JOB_TYPES = [
+        (JOB_PROCESS, 'Process PDF'),
+        (JOB_EXTRACT_TXT, 'Extract TXT'),
+    ]
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
+    STATUSES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_CANCELLED, 'Cancelled'),
+    ]
+    FINISHED_STATUSES = [STATUS_COMPLETED, STATUS_FAILED, STATUS_CANCELLED]
+    ACTIVE_STATUSES = [STATUS_QUEUED, STATUS_RUNNING]
+
+    pdf_upload = models.ForeignKey('listings.PDFUpload', on_delete=models.CASCADE, related_name='jobs')
+    job_type = models.CharField(max_length=20, choices=JOB_TYPES, default=JOB_PROCESS)
+    status = models.CharField(max_length=20, choices=STATUSES, default=STATUS_QUEUED)
+
+    # Same stages as PDFUpload.processing_stage
+    stage = models.CharField(max_length=20, default='pending')
+    pages_total = models.IntegerField(default=0)
+    pages_processed = models.IntegerField(default=0)
+
+    timings = models.JSONField(default=dict, blank=True)  # seconds per backend/step
+    result = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.IntegerField(default=0)
+    backend = models.CharField(max_length=20, blank=True)  # celery, local, db or sync
+    worker = models.CharField(max_length=255, blank=True)  # host:pid or celery task id
+
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Last sign of life: enqueue, claim, then a periodic beat while running
+    heartbeat_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+        constraints = [
+            # At most one queued or running job of each type per upload
+            models.UniqueConstraint(
+                fields=['pdf_upload', 'job_type'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='one_active_job_per_upload',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_job_type_display()} #{self.pk} ({self.status})"
+
+    @property
+    def progress_percent(self):
+        """Share of pages extracted so far"""
+        if self.status == self.STATUS_COMPLETED:
+            return 100
+        if not self.pages_total:
+            return 0
+        return round(100 * self.pages_processed / self.pages_total)
+
+    @property
+    def duration(self):
+        """Run time in seconds, up to now while running"""
+        if not self.started_at:
+            return None
+        end = self.finished_at or timezone.now()
+        return round((end - self.started_at).total_seconds(), 3)
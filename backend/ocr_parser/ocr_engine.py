@@ -0,0 +1,238 @@
+"""Process-pool OCR engine shared by PDFParser and the tying_Ocr pipeline.
+
+Pages are OCR'd on long-lived worker processes. Each worker rasterizes its own
+window of pages, so page images never cross process boundaries. When the
+optional ``tesserocr`` bindings are installed each worker keeps one Tesseract
+instance alive per (lang, psm, oem). They are not in requirements.txt (they
+build against the libtesseract headers), so by default every page still
+spawns one tesseract process, driven through stdin/stdout, which at least
+avoids pytesseract's temp files.
+"""
+import io
+import os
+import subprocess
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import logging
+
+import pytesseract
+from pdf2image import convert_from_path
+
+logger = logging.getLogger(__name__)
+
+# Per engine, and each job process has its own engine: JOB_WORKERS x OCR_WORKERS in total
+OCR_WORKERS = int(os.environ.get('OCR_WORKERS', '2') or 2)
+OCR_PAGE_TIMEOUT = int(os.environ.get('OCR_PAGE_TIMEOUT', '120') or 120)
+OCR_RETRIES = int(os.environ.get('OCR_RETRIES', '1') or 1)
+
+DEFAULT_LANG = "ara+fra"
+DEFAULT_PSM = 6
+# Used on retry when the primary page segmentation mode fails or finds nothing
+FALLBACK_PSM = {6: 4, 4: 6}
+
+# Per-process Tesseract instances, only used when tesserocr is installed
+_tesserocr_apis: Dict[Tuple[str, int, int], object] = {}
+_tesserocr_missing = False
+
+
+def _tesserocr_api(lang: str, psm: int, oem: int):
+    """Return this worker's persistent tesserocr API, or None"""
+    global _tesserocr_missing
+    if _tesserocr_missing:
+        return None
+    try:
+        import tesserocr  # type: ignore
+    except Exception:
+        _tesserocr_missing = True
+        return None
+    key = (lang, psm, oem)
+    if key not in _tesserocr_apis:
+        _tesserocr_apis[key] = tesserocr.PyTessBaseAPI(lang=lang, psm=psm, oem=oem)
+    return _tesserocr_apis[key]
+
+
+def _run_tesseract(image, lang: str, psm: int, oem: int, timeout: int, tesseract_cmd: str) -> str:
+    """OCR one PIL image without touching the filesystem"""
+    api = _tesserocr_api(lang, psm, oem)
+    if api is not None:
+        api.SetImage(image)
+        return api.GetUTF8Text()
+
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    completed = subprocess.run(
+        [tesseract_cmd, 'stdin', 'stdout', '-l', lang, '--oem', str(oem), '--psm', str(psm)],
+        input=buffer.getvalue(),
+        capture_output=True,
+        timeout=timeout,
+        check=True,
+    )
+    return completed.stdout.decode('utf-8', errors='replace')
+
+
+def _ocr_window(pdf_path: str, first: int, last: int, lang: str, psm: int, oem: int,
+                dpi: int, timeout: int, tesseract_cmd: str,
+                preprocess: Optional[Callable] = None) -> List[str]:
+    """Rasterize pages [first, last] and OCR them one image at a time"""
+    images = convert_from_path(pdf_path, dpi=dpi, first_page=first, last_page=last, grayscale=True)
+    texts = []
+    for offset in range(len(images)):
+        img = images[offset]
+        images[offset] = None
+        try:
+            if preprocess is not None:
+                img = preprocess(img)
+            texts.append(_run_tesseract(img, lang, psm, oem, timeout, tesseract_cmd))
+        finally:
+            img.close()
+    return texts
+
+
+def _ocr_image(png_bytes: bytes, lang: str, psm: int, oem: int, timeout: int,
+               tesseract_cmd: str, preprocess: Optional[Callable] = None) -> str:
+    """OCR an already rasterized page sent as PNG bytes"""
+    from PIL import Image
+    img = Image.open(io.BytesIO(png_bytes))
+    try:
+        if preprocess is not None:
+            img = preprocess(img)
+        return _run_tesseract(img, lang, psm, oem, timeout, tesseract_cmd)
+    finally:
+        img.close()
+
+
+class OCREngine:
+    """OCR pages on a pool of persistent worker processes.
+
+    With ``workers`` <= 1 tasks run in the calling process, which keeps the
+    same behaviour for tests and single-core hosts.
+    """
+
+    def __init__(self, workers: Optional[int] = None, lang: str = DEFAULT_LANG,
+                 psm: int = DEFAULT_PSM, oem: int = 1, dpi: int = 300,
+                 timeout: Optional[int] = None, retries: Optional[int] = None):
+        self.workers = OCR_WORKERS if workers is None else workers
+        self.lang = lang
+        self.psm = psm
+        self.oem = oem
+        self.dpi = dpi
+        self.timeout = OCR_PAGE_TIMEOUT if timeout is None else timeout
+        self.retries = OCR_RETRIES if retries is None else retries
+        self._pool = None
+
+    @property
+    def pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 1:
+            return None
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _psm_for_attempt(self, psm: int, attempt: int) -> int:
+        return FALLBACK_PSM.get(psm, psm) if attempt % 2 else psm
+
+    def _submit(self, func, *args, attempt: int = 0, psm: Optional[int] = None, **kwargs):
+        """Run a task on the pool (or inline) with the psm for this attempt"""
+        psm = self._psm_for_attempt(self.psm if psm is None else psm, attempt)
+        args = args + (self.lang, psm, self.oem)
+        if func is _ocr_window:
+            args += (self.dpi,)
+        args += (self.timeout, pytesseract.pytesseract.tesseract_cmd)
+        if self.pool is None:
+            return func(*args, **kwargs)
+        return self.pool.submit(func, *args, **kwargs)
+
+    def _result(self, handle, pages: int):
+        if self.pool is None:
+            return handle
+        return handle.result(timeout=self.timeout * pages)
+
+    def _run(self, func, args: tuple, pages: int, psm: Optional[int], preprocess, handle=None):
+        """Wait for a task, retrying failures and empty results with the fallback psm"""
+        attempt = 0
+        while True:
+            try:
+                if handle is None:
+                    handle = self._submit(func, *args, attempt=attempt, psm=psm, preprocess=preprocess)
+                result = self._result(handle, pages)
+                empty = not any(text.strip() for text in (result if isinstance(result, list) else [result]))
+                if not empty or attempt >= self.retries:
+                    return result
+            except (FutureTimeoutError, subprocess.TimeoutExpired) as e:
+                logger.warning(f"OCR timed out after {self.timeout}s per page (attempt {attempt + 1}): {e}")
+                if attempt >= self.retries:
+                    raise
+            except Exception as e:
+                logger.warning(f"OCR attempt {attempt + 1} failed: {e}")
+                if attempt >= self.retries:
+                    raise
+            attempt += 1
+            handle = None
+
+    def ocr_pdf_pages(self, pdf_path: str, windows: List[Tuple[int, int]],
+                      psm: Optional[int] = None,
+                      preprocess: Optional[Callable] = None) -> Iterator[Tuple[int, str]]:
+        """OCR page windows of a PDF, yielding ``(page, text)`` in page order.
+
+        At most two windows per worker are in flight, so memory stays bounded
+        however many pages are queued. A window that still fails after its
+        retries is logged and skipped.
+        """
+        pending = deque()
+        queue = deque(windows)
+        max_inflight = max(1, self.workers * 2) if self.pool is not None else 1
+        while queue or pending:
+            while queue and len(pending) < max_inflight:
+                first, last = queue.popleft()
+                handle = None
+                if self.pool is not None:
+                    handle = self._submit(_ocr_window, pdf_path, first, last, psm=psm, preprocess=preprocess)
+                pending.append((first, last, handle))
+            first, last, handle = pending.popleft()
+            try:
+                texts = self._run(_ocr_window, (pdf_path, first, last), last - first + 1,
+                                  psm, preprocess, handle=handle)
+            except Exception as e:
+                logger.error(f"OCR failed for pages {first}-{last}: {e}")
+                continue
+            for offset, text in enumerate(texts):
+                yield first + offset, text
+
+    def ocr_images(self, images: List, psm: Optional[int] = None,
+                   preprocess: Optional[Callable] = None) -> List[str]:
+        """OCR already rasterized PIL images in parallel, preserving order"""
+        payloads = []
+        for img in images:
+            buffer = io.BytesIO()
+            img.save(buffer, format='PNG')
+            payloads.append(buffer.getvalue())
+
+        handles = [
+            self._submit(_ocr_image, payload, psm=psm, preprocess=preprocess) if self.pool is not None else None
+            for payload in payloads
+        ]
+        texts = []
+        for payload, handle in zip(payloads, handles):
+            try:
+                texts.append(self._run(_ocr_image, (payload,), 1, psm, preprocess, handle=handle))
+            except Exception as e:
+                logger.error(f"OCR failed for image: {e}")
+                texts.append("")
+        return texts
+
+
+_engines: Dict[tuple, OCREngine] = {}
+
+
+def get_ocr_engine(**options) -> OCREngine:
+    """Return a shared engine so worker processes outlive a single document"""
+    key = tuple(sorted(options.items()))
+    if key not in _engines:
+        _engines[key] = OCREngine(**options)
+    return _engines[key]
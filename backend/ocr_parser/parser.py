@@ -1,13 +1,22 @@
 import pdfplumber
 import pytesseract
-from pdf2image import convert_from_path
 import re
 import os
+import time
 import unicodedata
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional, Tuple
 from datetime import datetime
 import logging
 
+from .cache import file_sha256, get_extraction_cache
+from .extractors import (
+    PDF_TEXT_BACKEND, TEXT_X_TOLERANCE, TEXT_Y_TOLERANCE, OCRExtractor,
+    _get_extract_pool, extract_parallel, resolve_text_backend,
+)
+from .resolver import resolve_overlaps, trimmed_span
+from .scanner import ListingScanner, ScanRule
+from .segments import segment_document, segment_text
+
 logger = logging.getLogger(__name__)
 
 # Configure Tesseract path for Windows
@@ -15,11 +24,45 @@ TESSERACT_PATH = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 if os.path.exists(TESSERACT_PATH):
     pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
 
+# Page-parallel text extraction (0 or 1 keeps extraction in-process)
+PDF_EXTRACT_WORKERS = int(os.environ.get('PDF_EXTRACT_WORKERS', '0') or 0)
+# Documents with fewer pages than this are always extracted serially
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get('PDF_PARALLEL_MIN_PAGES', '8') or 8)
+
+# Pages whose text layer has fewer visible characters than this are OCR'd
+OCR_MIN_TEXT_CHARS = int(os.environ.get('OCR_MIN_TEXT_CHARS', '20') or 20)
+# Better OCR for mixed Arabic/French
+OCR_LANG = "ara+fra"
+OCR_PSM = int(os.environ.get('OCR_PSM', '6') or 6)
+# Rasterization settings for the streaming OCR path
+OCR_DPI = int(os.environ.get('OCR_DPI', '300') or 300)
+OCR_WINDOW_PAGES = int(os.environ.get('OCR_WINDOW_PAGES', '1') or 1)
+
+# Process-parallel parsing of lot segments (0 or 1 keeps parsing in-process)
+PARSE_WORKERS = int(os.environ.get('PARSE_WORKERS', '0') or 0)
+PARSE_PARALLEL_MIN_SEGMENTS = int(os.environ.get('PARSE_PARALLEL_MIN_SEGMENTS', '64') or 64)
+
+# Unit words that end a goods entry, and the characters allowed in a goods name
+GOODS_UNIT_PATTERN = re.compile(r"كلغ|طن|قطعة")
+GOODS_NAME_CHAR = re.compile(r"[\u0621-\u064A\s]")
+
 
 class PDFParser:
     """Parser for Douane auction PDFs"""
     
-    def __init__(self):
+    def __init__(self, workers: Optional[int] = None, use_cache: bool = True,
+                 backend: Optional[str] = None):
+        # Number of processes used for page-parallel extraction
+        self.workers = PDF_EXTRACT_WORKERS if workers is None else workers
+        # Text-layer backend: pdfplumber, pymupdf or auto (see extractors)
+        self.backend = backend or PDF_TEXT_BACKEND
+        self.ocr_extractor = OCRExtractor(
+            lang=OCR_LANG, psm=OCR_PSM, dpi=OCR_DPI, window_pages=OCR_WINDOW_PAGES
+        )
+        # Shared content-addressed cache of extraction results
+        self.cache = get_extraction_cache() if use_cache else None
+        self._content_hashes: Dict[Tuple[str, int, int], str] = {}
+
         # Optional Arabic shaping for better visual order in TXT output
         self._arabic_shaper = None
         self._bidi_get_display = None
@@ -33,15 +76,17 @@ class PDFParser:
             self._arabic_shaper = None
             self._bidi_get_display = None
         
+        # Possessive quantifiers (*+, ++) stop the engine from backtracking into
+        # digit and whitespace runs it can never give back; matches are unchanged
         self.vehicle_patterns = [
             # Pattern for vehicle entries with guarantee and price
             re.compile(
-                r"د\s*(\d+)\s*د\s*(\d+).*?\s+([A-Z\u0621-\u064A0-9\-]+)\s+([A-Z0-9]+)\s+(.*?)(?=\d{2}|\n)",
+                r"د\s*+(\d++)\s*+د\s*+(\d++).*?\s+([A-Z\u0621-\u064A0-9\-]+)\s+([A-Z0-9]+)\s+(.*?)(?=\d{2}|\n)",
                 re.UNICODE
             ),
             # Alternative pattern for different format
             re.compile(
-                r"(\d+)\s*د\s*(\d+)\s*([A-Z\u0621-\u064A\s]+)\s+([A-Z0-9]+)\s+(.*?)(?=\d{2}|\n)",
+                r"(\d++)\s*+د\s*+(\d++)\s*([A-Z\u0621-\u064A\s]+)\s+([A-Z0-9]+)\s+(.*?)(?=\d{2}|\n)",
                 re.UNICODE
             )
         ]
@@ -49,12 +94,12 @@ class PDFParser:
         self.goods_patterns = [
             # Pattern for goods like seeds
             re.compile(
-                r"(\d+)\s*(?:كلغ|طن|قطعة)?\s*([\u0621-\u064A\s]+)",
+                r"(?P<quantity>\d++)\s*(?:كلغ|طن|قطعة)?\s*(?P<item>[\u0621-\u064A\s]+)",
                 re.UNICODE
             ),
             # Alternative pattern for goods
             re.compile(
-                r"([\u0621-\u064A\s]+)\s*(\d+)\s*(?:كلغ|طن|قطعة)",
+                r"(?P<item>[\u0621-\u064A\s]+)\s*(?P<quantity>\d+)\s*(?:كلغ|طن|قطعة)",
                 re.UNICODE
             )
         ]
@@ -65,6 +110,30 @@ class PDFParser:
             # French group patterns
             re.compile(r"Groupe\s+(I|II|III|IV|V)", re.UNICODE),
         ]
+        
+        # Pattern for lot numbers (usually 2-digit numbers)
+        self.lot_pattern = re.compile(r'\b(\d{2})\b')
+        
+        # All patterns run in a single pass over the text (see scanner)
+        self.scanner = ListingScanner([
+            ScanRule('vehicles', self.vehicle_patterns[0], ('char', 'د')),
+            ScanRule('vehicles', self.vehicle_patterns[1], ('digits',)),
+            ScanRule('goods', self.goods_patterns[0], ('digits',)),
+            ScanRule('goods', self.goods_patterns[1], ('unit', GOODS_UNIT_PATTERN, GOODS_NAME_CHAR)),
+            ScanRule('groups', self.group_patterns[0], ('keyword', 'المجموعة')),
+            ScanRule('groups', self.group_patterns[1], ('keyword', 'Groupe')),
+            ScanRule('lots', self.lot_pattern, ('digits',)),
+        ])
+        
+        # Rank used when matches overlap (lower wins): the marker-anchored vehicle
+        # pattern, the alternative vehicle pattern, goods with an explicit unit,
+        # and last the broad "number then Arabic words" goods pattern
+        self.match_priority = {
+            self.vehicle_patterns[0]: 0,
+            self.vehicle_patterns[1]: 1,
+            self.goods_patterns[1]: 2,
+            self.goods_patterns[0]: 3,
+        }
     
     def is_text_based(self, pdf_path: str) -> bool:
         """Check if PDF is text-based or scanned"""
@@ -78,41 +147,214 @@ class PDFParser:
             logger.error(f"Error checking PDF type: {e}")
             return False
     
+    def extract_pages(self, pdf_path: str, timings: Optional[Dict[str, float]] = None) -> List[Dict]:
+        """Extract the text layer of every page, opening the PDF only once.
+
+        Each page is classified as ``text`` or ``scanned`` (empty or nearly
+        empty text layer) while it is extracted. Long documents are split
+        into contiguous page ranges and extracted on the shared process pool
+        when ``workers`` > 1. Time spent per backend is added to ``timings``.
+        Pages come from the extraction cache when every page of the text
+        layer is there; otherwise the layer is extracted and cached per page.
+        """
+        content_hash = self.content_hash(pdf_path)
+        pages = self._cached_text_layer(content_hash)
+        if pages is None:
+            pages = self._extract_text_layer(pdf_path, timings)
+            self._store_text_layer(content_hash, pages)
+        for page in pages:
+            page['method'] = 'scanned' if self._needs_ocr(page['text']) else 'text'
+        return pages
+
+    def _extract_text_layer(self, pdf_path: str, timings: Optional[Dict[str, float]]) -> List[Dict]:
+        extractor = resolve_text_backend(self.backend, pdf_path, timings)
+        started = time.perf_counter()
+        texts = None
+        if self.workers > 1:
+            page_count = extractor.page_count(pdf_path)
+            if page_count >= PDF_PARALLEL_MIN_PAGES:
+                texts = extract_parallel(extractor, pdf_path, page_count, self.workers)
+        if texts is None:
+            texts = extractor.extract_range(pdf_path)
+        if timings is not None:
+            timings[extractor.name] = timings.get(extractor.name, 0.0) + time.perf_counter() - started
+
+        return [
+            {
+                'page': number,
+                'text': text,
+                'backend': extractor.name,
+                'visual_order': extractor.visual_order,
+                'cached': False,
+            }
+            for number, text in enumerate(texts, start=1)
+        ]
+
+    def _needs_ocr(self, text: str) -> bool:
+        """True when a page's text layer is empty or nearly empty"""
+        return len("".join(text.split())) < OCR_MIN_TEXT_CHARS
+
+    def iter_ocr_pages(self, pdf_path: str, page_numbers: List[int]) -> Iterator[Tuple[int, str, bool]]:
+        """OCR the given pages, rasterizing a small window of pages at a time.
+
+        Windows of grayscale images at OCR_DPI are rasterized and OCR'd on the
+        shared OCR engine's worker processes, with a bounded number in flight,
+        so peak memory does not grow with the page count. Pages already in
+        the extraction cache are not OCR'd again. Yields ``(page, text, cached)``
+        in page order; pages whose OCR failed are skipped.
+        """
+        content_hash = self.content_hash(pdf_path)
+        settings = self.ocr_settings()
+        cached = {}
+        if content_hash:
+            for number in page_numbers:
+                entry = self.cache.get(self.cache.page_key(content_hash, number, settings))
+                if entry is not None:
+                    cached[number] = entry['text']
+        missing = [number for number in page_numbers if number not in cached]
+        fresh = self.ocr_extractor.iter_pages(pdf_path, missing) if missing else iter(())
+
+        pending = next(fresh, None)
+        for number in sorted(page_numbers):
+            if number in cached:
+                yield number, cached[number], True
+                continue
+            while pending is not None and pending[0] < number:
+                pending = next(fresh, None)
+            if pending is not None and pending[0] == number:
+                # Don't pin failed OCR pages in the cache
+                if content_hash and pending[1].strip():
+                    self.cache.set(self.cache.page_key(content_hash, number, settings), {'text': pending[1]})
+                yield number, pending[1], False
+
+    def extract_document(self, pdf_path: str) -> Dict:
+        """Extract text with per-page routing between the text layer and OCR.
+
+        Only pages with an empty or nearly empty text layer are rasterized and
+        OCR'd. Returns the normalized text plus a ``pages`` list reporting the
+        method used for each page (``text`` or ``ocr``) and per-backend
+        ``timings`` in seconds. Pages are served from the extraction cache
+        when the same PDF bytes were already extracted with the same settings.
+        """
+        timings = {}
+        pages = self.extract_pages(pdf_path, timings)
+        scanned = [page for page in pages if page['method'] == 'scanned']
+        if scanned:
+            logger.info(f"📷 Running OCR on {len(scanned)}/{len(pages)} page(s)")
+            started = time.perf_counter()
+            by_number = {page['page']: page for page in scanned}
+            for page in scanned:
+                page['method'] = 'ocr'
+                page['backend'] = self.ocr_extractor.name
+                page['cached'] = False
+            for number, ocr_text, cached in self.iter_ocr_pages(pdf_path, list(by_number)):
+                self._apply_ocr_text(by_number[number], ocr_text, cached)
+            timings[self.ocr_extractor.name] = time.perf_counter() - started
+
+        return self.finish_document(pages, self._join_pages(pages), timings)
+
+    def _apply_ocr_text(self, page: Dict, ocr_text: str, cached: bool = False):
+        """Use OCR output for a page; an empty result keeps the text layer"""
+        if ocr_text.strip():
+            page['text'] = ocr_text
+            page['visual_order'] = self.ocr_extractor.visual_order
+            page['cached'] = cached
+
+    def content_hash(self, pdf_path: str) -> Optional[str]:
+        """SHA-256 of the PDF bytes (None without a cache), hashed once per file version"""
+        if not self.cache:
+            return None
+        stat = os.stat(pdf_path)
+        key = (os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns)
+        if key not in self._content_hashes:
+            self._content_hashes = {key: file_sha256(pdf_path)}
+        return self._content_hashes[key]
+
+    def _cached_text_layer(self, content_hash: Optional[str]) -> Optional[List[Dict]]:
+        """Every text-layer page from the cache, or None if any is missing"""
+        if not content_hash:
+            return None
+        settings = self.layer_settings()
+        # Page 0 records the page count
+        manifest = self.cache.get(self.cache.page_key(content_hash, 0, settings))
+        if manifest is None:
+            return None
+        pages = []
+        for number in range(1, manifest['page_count'] + 1):
+            entry = self.cache.get(self.cache.page_key(content_hash, number, settings))
+            if entry is None:
+                # Partly evicted: one pass over the text layer is cheaper than page by page
+                return None
+            pages.append(dict(entry, page=number, cached=True))
+        logger.info(f"⚡ Extraction cache hit for the text layer of {content_hash[:12]}")
+        return pages
+
+    def _store_text_layer(self, content_hash: Optional[str], pages: List[Dict]):
+        if not content_hash:
+            return
+        settings = self.layer_settings()
+        for page in pages:
+            entry = {'text': page['text'], 'backend': page['backend'], 'visual_order': page['visual_order']}
+            self.cache.set(self.cache.page_key(content_hash, page['page'], settings), entry)
+        # Written last, so a partly written layer is never read back
+        self.cache.set(self.cache.page_key(content_hash, 0, settings), {'page_count': len(pages)})
+
+    def finish_document(self, pages: List[Dict], text: str, timings: Dict[str, float]) -> Dict:
+        """Build the extraction result"""
+        document = {
+            'text': text,
+            'pages': [
+                {'page': page['page'], 'method': page['method'], 'backend': page['backend'], 'cached': page['cached']}
+                for page in pages
+            ],
+            # Every page served from the cache
+            'cached': bool(pages) and all(page['cached'] for page in pages),
+            'timings': timings,
+        }
+        logger.info("Extraction timings: " + ", ".join(f"{name}={secs:.3f}s" for name, secs in timings.items()))
+        return document
+
+    def _join_pages(self, pages: List[Dict]) -> str:
+        """Join page texts, normalizing runs of pages that share the same text order"""
+        runs = []
+        for page in pages:
+            if not page['text']:
+                continue
+            if runs and runs[-1][0] == page['visual_order']:
+                runs[-1][1].append(page['text'])
+            else:
+                runs.append((page['visual_order'], [page['text']]))
+        return "\n".join(
+            self._normalize_and_shape("\n".join(texts), visual_order) for visual_order, texts in runs
+        )
+
+    def layer_settings(self) -> Dict:
+        """Settings that change text-layer output, part of its cache keys"""
+        return {
+            'backend': self.backend,
+            'x_tolerance': TEXT_X_TOLERANCE,
+            'y_tolerance': TEXT_Y_TOLERANCE,
+        }
+
+    def ocr_settings(self) -> Dict:
+        """Settings that change OCR output, part of the OCR'd pages' cache keys"""
+        return self.ocr_extractor.settings()
+
     def extract_text(self, pdf_path: str) -> str:
         """Extract text from PDF using appropriate method"""
         try:
-            if self.is_text_based(pdf_path):
-                logger.info("✅ PDF is text-based")
-                with pdfplumber.open(pdf_path) as pdf:
-                    text_parts = []
-                    for page in pdf.pages:
-                        # Tweaked tolerances often help RTL scripts
-                        text = page.extract_text(x_tolerance=1.5, y_tolerance=1.5) or ""
-                        if text:
-                            text_parts.append(text)
-                    raw_text = "\n".join(text_parts)
-                    return self._normalize_and_shape(raw_text)
-            else:
-                logger.info("📷 PDF is scanned, running OCR...")
-                images = convert_from_path(pdf_path)
-                text_parts = []
-                for img in images:
-                    # Better OCR for mixed Arabic/French
-                    text = pytesseract.image_to_string(
-                        img, lang="ara+fra", config="--oem 1 --psm 6"
-                    )
-                    text_parts.append(text)
-                raw_text = "\n".join(text_parts)
-                return self._normalize_and_shape(raw_text)
+            return self.extract_document(pdf_path)['text']
         except Exception as e:
             logger.error(f"Error extracting text: {e}")
             return ""
 
-    def _normalize_and_shape(self, text: str) -> str:
+    def _normalize_and_shape(self, text: str, visual_order: bool = True) -> str:
         """Normalize Unicode and optionally shape Arabic for better visual order.
 
         Note: Shaping is primarily for display in editors; data extraction can work with
         unshaped text too. We keep both concerns in mind by at least normalizing.
+        PyMuPDF text, already in logical order, is only reshaped; pdfplumber
+        and OCR text also go through BiDi reordering, as they always have.
         """
         if not text:
             return text
@@ -122,6 +364,8 @@ class PDFParser:
         if self._arabic_shaper and self._bidi_get_display:
             try:
                 reshaped = self._arabic_shaper.reshape(normalized)
+                if not visual_order:
+                    return reshaped
                 # Apply BiDi to get the right visual order
                 return self._bidi_get_display(reshaped)
             except Exception:
@@ -130,89 +374,185 @@ class PDFParser:
     
     def extract_groups(self, text: str) -> List[Dict]:
         """Extract auction groups from text"""
+        return self._group_records(self.scanner.scan(text).get('groups', []))
+    
+    def _group_records(self, matches) -> List[Dict]:
         groups = []
-        for pattern in self.group_patterns:
-            for match in pattern.finditer(text):
-                group_name = match.group(1)
-                groups.append({
-                    'name': group_name,
-                    'start_pos': match.start(),
-                    'end_pos': match.end()
-                })
+        for match in matches:
+            group_name = match.group(1)
+            groups.append({
+                'name': group_name,
+                'start_pos': match.start(),
+                'end_pos': match.end()
+            })
         return sorted(groups, key=lambda x: x['start_pos'])
     
     def parse_vehicles(self, text: str) -> List[Dict]:
         """Parse vehicle entries from text"""
-        vehicles = []
-        
-        for pattern in self.vehicle_patterns:
-            for match in pattern.finditer(text):
-                try:
-                    if len(match.groups()) >= 4:
-                        guarantee, price, brand, serial, rest = match.groups()
-                        
-                        # Clean up the data
-                        guarantee = re.sub(r'[^\d]', '', str(guarantee))
-                        price = re.sub(r'[^\d]', '', str(price))
-                        
-                        if guarantee and price:
-                            vehicles.append({
-                                'type': 'vehicle',
-                                'brand': brand.strip() if brand else '',
-                                'serial': serial.strip() if serial else '',
-                                'guarantee_tnd': int(guarantee),
-                                'price_tnd': int(price),
-                                'description': rest.strip() if rest else '',
-                                'raw_match': match.group(0)
-                            })
-                except (ValueError, IndexError) as e:
-                    logger.warning(f"Error parsing vehicle match: {e}")
-                    continue
-        
-        return vehicles
+        return self.parse_listings(text)['vehicles']
+    
+    def _vehicle_record(self, match) -> Optional[Dict]:
+        try:
+            if len(match.groups()) >= 4:
+                guarantee, price, brand, serial, rest = match.groups()
+                
+                # Clean up the data
+                guarantee = re.sub(r'[^\d]', '', str(guarantee))
+                price = re.sub(r'[^\d]', '', str(price))
+                
+                if guarantee and price:
+                    return {
+                        'type': 'vehicle',
+                        'brand': brand.strip() if brand else '',
+                        'serial': serial.strip() if serial else '',
+                        'guarantee_tnd': int(guarantee),
+                        'price_tnd': int(price),
+                        'description': rest.strip() if rest else '',
+                        'raw_match': match.group(0)
+                    }
+        except (ValueError, IndexError) as e:
+            logger.warning(f"Error parsing vehicle match: {e}")
+        return None
     
     def parse_goods(self, text: str) -> List[Dict]:
         """Parse goods entries from text"""
-        goods = []
-        
-        for pattern in self.goods_patterns:
-            for match in pattern.finditer(text):
-                try:
-                    if len(match.groups()) >= 2:
-                        qty, name = match.groups()
-                        
-                        goods.append({
-                            'type': 'goods',
-                            'quantity': qty.strip() if qty else '',
-                            'item': name.strip() if name else '',
-                            'raw_match': match.group(0)
-                        })
-                except (ValueError, IndexError) as e:
-                    logger.warning(f"Error parsing goods match: {e}")
+        return self.parse_listings(text)['goods']
+    
+    def _goods_record(self, match) -> Optional[Dict]:
+        try:
+            qty, name = match.group('quantity'), match.group('item')
+            if not (name and name.strip()):
+                # A number followed only by whitespace is not a goods entry
+                return None
+            return {
+                'type': 'goods',
+                'quantity': qty.strip() if qty else '',
+                'item': name.strip() if name else '',
+                'raw_match': match.group(0)
+            }
+        except (ValueError, IndexError) as e:
+            logger.warning(f"Error parsing goods match: {e}")
+        return None
+    
+    def _listing_records(self, matches: Dict[str, List], resolve: bool = True) -> Tuple[List[Dict], List[Dict]]:
+        """Build vehicle and goods records, keeping one per text region when resolving"""
+        candidates = []
+        for family, build in (('vehicles', self._vehicle_record), ('goods', self._goods_record)):
+            for match in matches.get(family, []):
+                record = build(match)
+                if record is None:
                     continue
+                start, end = trimmed_span(match)
+                record['start_pos'] = start
+                record['end_pos'] = end
+                candidates.append((self.match_priority.get(match.re, len(self.match_priority)), start, end, record))
         
-        return goods
+        records = resolve_overlaps(candidates) if resolve else [candidate[3] for candidate in candidates]
+        vehicles = [record for record in records if record['type'] == 'vehicle']
+        goods = [record for record in records if record['type'] == 'goods']
+        return vehicles, goods
     
     def extract_lot_numbers(self, text: str) -> List[str]:
         """Extract lot numbers from text"""
-        # Pattern for lot numbers (usually 2-digit numbers)
-        lot_pattern = re.compile(r'\b(\d{2})\b')
-        lots = lot_pattern.findall(text)
+        return self._lot_numbers(self.scanner.scan(text).get('lots', []))
+    
+    def _lot_numbers(self, matches) -> List[str]:
+        lots = [match.group(1) for match in matches]
         return list(set(lots))  # Remove duplicates
     
-    def parse_listings(self, text: str) -> Dict:
-        """Main parsing function that extracts all listings"""
-        result = {
-            'vehicles': self.parse_vehicles(text),
-            'goods': self.parse_goods(text),
-            'groups': self.extract_groups(text),
-            'lot_numbers': self.extract_lot_numbers(text),
+    def _build_result(self, matches: Dict[str, List], text: str, resolve: bool = True) -> Dict:
+        vehicles, goods = self._listing_records(matches, resolve=resolve)
+        return {
+            'vehicles': vehicles,
+            'goods': goods,
+            'groups': self._group_records(matches.get('groups', [])),
+            'lot_numbers': self._lot_numbers(matches.get('lots', [])),
             'raw_text': text
         }
+    
+    def parse_text(self, text: str, resolve: bool = True) -> Dict:
+        """Parse a whole string in a single scan, without segmentation"""
+        return self._build_result(self.scanner.scan(text), text, resolve=resolve)
+    
+    def segment(self, text: str) -> List[Dict]:
+        """Split text into group/lot segments with character offsets"""
+        return segment_document(text)
+    
+    def parse_segment(self, text: str, segment: Dict, resolve: bool = True) -> Dict:
+        """Parse one segment of ``text``; positions stay relative to the document"""
+        return self.parse_segment_text(segment_text(text, segment), segment, resolve=resolve)
+    
+    def parse_segment_text(self, chunk: str, segment: Dict, resolve: bool = True) -> Dict:
+        """Parse the text of a segment, shifting positions by its document offset"""
+        offset = segment['start_pos']
+        result = self.parse_text(chunk, resolve=resolve)
+        for record in result['vehicles'] + result['goods'] + result['groups']:
+            record['start_pos'] += offset
+            record['end_pos'] += offset
+        for record in result['vehicles'] + result['goods']:
+            record['segment'] = segment['index']
+            record['lot'] = segment['lot']
+        del result['raw_text']
+        return result
+    
+    def parse_listings(self, text: str, resolve: bool = True, workers: Optional[int] = None) -> Dict:
+        """Main parsing function: segment the text into lots and parse each one.
         
-        logger.info(f"Parsed {len(result['vehicles'])} vehicles and {len(result['goods'])} goods")
+        With ``resolve`` (the default) overlapping vehicle and goods matches are
+        reduced to one record per region of the text; see ``resolver``. Large
+        documents are parsed on the process pool when ``workers`` (default
+        PARSE_WORKERS) is above 1.
+        """
+        segments = self.segment(text)
+        workers = PARSE_WORKERS if workers is None else workers
+        if workers > 1 and len(segments) >= PARSE_PARALLEL_MIN_SEGMENTS:
+            parsed = self._parse_segments_parallel(text, segments, resolve, workers)
+        else:
+            parsed = [self.parse_segment(text, segment, resolve=resolve) for segment in segments]
+        
+        lots = set()
+        result = {'vehicles': [], 'goods': [], 'groups': [], 'lot_numbers': [], 'segments': segments, 'raw_text': text}
+        for part in parsed:
+            result['vehicles'].extend(part['vehicles'])
+            result['goods'].extend(part['goods'])
+            result['groups'].extend(part['groups'])
+            lots.update(part['lot_numbers'])
+        result['lot_numbers'] = list(lots)
+        
+        logger.info(
+            f"Parsed {len(result['vehicles'])} vehicles and {len(result['goods'])} goods "
+            f"from {len(segments)} segments"
+        )
         return result
     
+    def _parse_segments_parallel(self, text: str, segments: List[Dict], resolve: bool, workers: int) -> List[Dict]:
+        """Parse contiguous batches of segments on the shared process pool"""
+        chunk = -(-len(segments) // workers)
+        batches = [segments[i:i + chunk] for i in range(0, len(segments), chunk)]
+        try:
+            pool = _get_extract_pool(workers)
+            futures = [
+                pool.submit(_parse_segment_batch, text[batch[0]['start_pos']:batch[-1]['end_pos']], batch, resolve)
+                for batch in batches
+            ]
+            parsed = []
+            for future in futures:
+                parsed.extend(future.result())
+            return parsed
+        except Exception as e:
+            logger.warning(f"Parallel parsing failed, falling back to serial: {e}")
+            return [self.parse_segment(text, segment, resolve=resolve) for segment in segments]
+    
+    def parse_listings_multipass(self, text: str, resolve: bool = True) -> Dict:
+        """Reference for ``parse_text``: one finditer pass per pattern"""
+        matches = {
+            'vehicles': [match for pattern in self.vehicle_patterns for match in pattern.finditer(text)],
+            'goods': [match for pattern in self.goods_patterns for match in pattern.finditer(text)],
+            'groups': [match for pattern in self.group_patterns for match in pattern.finditer(text)],
+            'lots': list(self.lot_pattern.finditer(text)),
+        }
+        return self._build_result(matches, text, resolve=resolve)
+    
     def parse_pdf(self, pdf_path: str) -> Dict:
         """Parse a PDF file and return structured data"""
         try:
@@ -234,6 +574,23 @@ class PDFParser:
             return {}
 
 
+_segment_parser = None
+
+
+def _parse_segment_batch(text: str, segments: List[Dict], resolve: bool = True) -> List[Dict]:
+    """Pool task: parse segments of ``text``, which starts at the first segment"""
+    global _segment_parser
+    if _segment_parser is None:
+        _segment_parser = PDFParser(use_cache=False)
+    base = segments[0]['start_pos']
+    return [
+        _segment_parser.parse_segment_text(
+            text[segment['start_pos'] - base:segment['end_pos'] - base], segment, resolve=resolve
+        )
+        for segment in segments
+    ]
+
+
 def extract_city_from_filename(filename: str) -> str:
     """Extract city name from PDF filename"""
     # Common patterns in filenames
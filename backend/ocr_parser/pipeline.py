@@ -0,0 +1,186 @@
+"""Streaming pipeline from PDF pages to batches of listing records.
+
+    pages -> normalized text -> lot segments -> listing records -> batches
+
+Every stage is a generator pulling from the previous one, so the first lots
+of a long bulletin are parsed (and can be written to the database) while
+later pages are still being OCR'd. Backpressure comes for free: nothing is
+pulled from the OCR engine while a batch is being written, and the engine
+itself keeps at most two page windows per worker in flight.
+
+The text seen by the parser is identical to ``PDFParser.extract_document``:
+runs of visual-order pages are normalized together, exactly like
+``_join_pages``, and pages come from (and go to) the extraction cache.
+"""
+import os
+import sys
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import logging
+
+from .parser import PDFParser
+from .segments import Segmenter
+
+logger = logging.getLogger(__name__)
+
+# Records per batch handed to the writer
+PIPELINE_BATCH_SIZE = int(os.environ.get('PIPELINE_BATCH_SIZE', '50') or 50)
+
+# Stages reported through on_progress (and stored on PDFUpload)
+STAGE_EXTRACTING = 'extracting'
+STAGE_OCR = 'ocr'
+STAGE_PARSING = 'parsing'
+
+
+class ListingPipeline:
+    """Stream listing records out of a PDF, one batch at a time.
+
+    ``on_progress(stage, pages_processed, pages_total)`` is called as pages
+    come out of extraction/OCR. After ``iter_batches`` is exhausted,
+    ``document`` holds the extraction result (as ``extract_document``) and
+    ``groups``/``lot_numbers``/``segments`` the document-level parse output.
+    """
+
+    def __init__(self, parser: Optional[PDFParser] = None, batch_size: Optional[int] = None,
+                 resolve: bool = True, on_progress: Optional[Callable[[str, int, int], None]] = None):
+        self.parser = parser or PDFParser()
+        self.batch_size = max(1, batch_size or PIPELINE_BATCH_SIZE)
+        self.resolve = resolve
+        self.on_progress = on_progress
+        self.timings: Dict[str, float] = {}
+        self.pages: List[Dict] = []
+        self.document: Optional[Dict] = None
+        self.groups: List[Dict] = []
+        self.lot_numbers: List[str] = []
+        self.segments: List[Dict] = []
+        self.records_count = 0
+        self._text = ''
+
+    def _progress(self, stage: str, processed: int, total: int):
+        if self.on_progress is not None:
+            try:
+                self.on_progress(stage, processed, total)
+            except Exception as e:
+                logger.warning(f"Progress callback failed: {e}")
+
+    def iter_pages(self, pdf_path: str) -> Iterator[Dict]:
+        """Yield final page dicts in page order, OCR'ing scanned pages lazily"""
+        self._progress(STAGE_EXTRACTING, 0, 0)
+        pages = self.parser.extract_pages(pdf_path, self.timings)
+        total = len(pages)
+        scanned = [page['page'] for page in pages if page['method'] == 'scanned']
+        ocr_pages = self.parser.iter_ocr_pages(pdf_path, scanned) if scanned else iter(())
+        if scanned:
+            logger.info(f"📷 Running OCR on {len(scanned)}/{total} page(s)")
+
+        pending: Tuple[int, str, bool] = (0, '', False)
+        for processed, page in enumerate(pages, start=1):
+            if page['method'] == 'scanned':
+                self._progress(STAGE_OCR, processed - 1, total)
+                started = time.perf_counter()
+                # OCR results come in page order; windows that failed are skipped
+                while pending[0] < page['page']:
+                    pending = next(ocr_pages, (sys.maxsize, '', False))
+                name = self.parser.ocr_extractor.name
+                self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - started
+                page['method'] = 'ocr'
+                page['backend'] = name
+                page['cached'] = False
+                if pending[0] == page['page']:
+                    self.parser._apply_ocr_text(page, pending[1], pending[2])
+            self.pages.append(page)
+            self._progress(STAGE_PARSING, processed, total)
+            yield page
+
+    def iter_text(self, pages: Iterator[Dict]) -> Iterator[str]:
+        """Normalize pages as soon as their run of same-order pages is known"""
+        run: List[str] = []
+        for page in pages:
+            if not page['text']:
+                continue
+            if page['visual_order']:
+                # BiDi reordering depends on the whole run, so wait for its end
+                run.append(page['text'])
+                continue
+            if run:
+                yield self.parser._normalize_and_shape("\n".join(run), True)
+                run = []
+            yield self.parser._normalize_and_shape(page['text'], False)
+        if run:
+            yield self.parser._normalize_and_shape("\n".join(run), True)
+
+    def iter_segments(self, chunks: Iterator[str]) -> Iterator[Tuple[Dict, str]]:
+        """Yield ``(segment, text)`` for each completed lot segment"""
+        segmenter = Segmenter()
+        buffer = ''
+        buffer_start = 0
+        first = True
+        for chunk in chunks:
+            buffer += chunk if first else "\n" + chunk
+            first = False
+            for segment in segmenter.feed(chunk):
+                self.segments.append(segment)
+                yield segment, buffer[segment['start_pos'] - buffer_start:segment['end_pos'] - buffer_start]
+            # Keep only the text of the segment that is still open
+            if segmenter.current is not None:
+                drop = segmenter.current['start_pos'] - buffer_start
+                buffer = buffer[drop:]
+                buffer_start += drop
+            yield None, ''
+        for segment in segmenter.close():
+            self.segments.append(segment)
+            yield segment, buffer[segment['start_pos'] - buffer_start:segment['end_pos'] - buffer_start]
+
+    def iter_records(self, segments: Iterator[Tuple[Dict, str]]) -> Iterator[Optional[Dict]]:
+        """Parse each segment into vehicle and goods records, in document order.
+
+        ``None`` marks the end of a text chunk so batches can be flushed
+        before waiting on the next OCR page.
+        """
+        lots = set()
+        for segment, text in segments:
+            if segment is None:
+                yield None
+                continue
+            parsed = self.parser.parse_segment_text(text, segment, resolve=self.resolve)
+            self.groups.extend(parsed['groups'])
+            lots.update(parsed['lot_numbers'])
+            self.lot_numbers = list(lots)
+            records = sorted(parsed['vehicles'] + parsed['goods'], key=lambda record: record['start_pos'])
+            for record in records:
+                self.records_count += 1
+                yield record
+
+    def iter_batches(self, pdf_path: str) -> Iterator[List[Dict]]:
+        """Run the whole pipeline, yielding lists of at most ``batch_size`` records"""
+        chunks = self._collect(self.iter_text(self.iter_pages(pdf_path)))
+        batch: List[Dict] = []
+        for record in self.iter_records(self.iter_segments(chunks)):
+            if record is not None:
+                batch.append(record)
+            if batch and (record is None or len(batch) >= self.batch_size):
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+        self.document = self.parser.finish_document(self.pages, self._text, self.timings)
+        logger.info(
+            f"Pipeline parsed {self.records_count} records from {len(self.segments)} segments "
+            f"of {os.path.basename(pdf_path)}"
+        )
+
+    def extract(self, pdf_path: str) -> Dict:
+        """Run extraction and OCR only (with progress) and return the document"""
+        for _chunk in self._collect(self.iter_text(self.iter_pages(pdf_path))):
+            pass
+        self.document = self.parser.finish_document(self.pages, self._text, self.timings)
+        return self.document
+
+    def _collect(self, chunks: Iterator[str]) -> Iterator[str]:
+        """Pass chunks through while assembling the document text"""
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        self._text = "\n".join(parts)
@@ -0,0 +1,46 @@
+"""Overlap resolution for parser matches.
+
+Alternative patterns often capture the same lot: both vehicle patterns can
+match one line, and the broad goods pattern matches almost any Arabic phrase
+after a number. Each candidate covers a region ``[start, end)`` of the text.
+Candidates are ranked by pattern priority, then by span (longer first), and
+accepted greedily; a candidate that overlaps an accepted region is dropped,
+so each region of the text yields at most one record.
+"""
+from bisect import bisect_left
+from typing import Any, List, Tuple
+
+# (priority, start, end, record); lower priority values win
+Candidate = Tuple[int, int, int, Any]
+
+
+def trimmed_span(match) -> Tuple[int, int]:
+    """Region of a match without its leading and trailing whitespace"""
+    raw = match.group(0)
+    start = match.start() + (len(raw) - len(raw.lstrip()))
+    end = match.end() - (len(raw) - len(raw.rstrip()))
+    return start, max(start, end)
+
+
+def resolve_overlaps(candidates: List[Candidate]) -> List[Any]:
+    """Keep the best candidate per region, returned in document order"""
+    ranked = sorted(
+        range(len(candidates)),
+        key=lambda i: (candidates[i][0], candidates[i][1] - candidates[i][2], candidates[i][1], i)
+    )
+    starts: List[int] = []
+    ends: List[int] = []
+    kept: List[Tuple[int, Any]] = []
+    for index in ranked:
+        _priority, start, end, record = candidates[index]
+        # Accepted regions are disjoint and kept sorted by start
+        slot = bisect_left(starts, start)
+        if slot > 0 and ends[slot - 1] > start:
+            continue
+        if slot < len(starts) and starts[slot] < max(end, start + 1):
+            continue
+        starts.insert(slot, start)
+        ends.insert(slot, max(end, start + 1))
+        kept.append((start, record))
+    kept.sort(key=lambda item: item[0])
+    return [record for _start, record in kept]
@@ -0,0 +1,119 @@
+"""Single-pass scanner for listing patterns.
+
+``PDFParser`` used to run every vehicle, goods, group and lot pattern over the
+whole text with ``finditer``, one full pass per pattern, letting the regex
+engine attempt a match at every character. The scanner walks the document
+once, line by line, and only attempts a pattern at the positions where it can
+start (its *anchors*): a literal character, the start of a digit run, a
+keyword, or the class run that precedes a unit word. Matches are still taken
+from the full text, so patterns that continue across line breaks behave as
+before, and each rule keeps ``finditer``'s non-overlapping semantics. The
+result is the same matches in the same order as the per-pattern passes.
+"""
+import re
+from typing import Dict, List, Optional
+
+
+class ScanRule:
+    """A pattern plus the anchor kind that tells the scanner where to try it.
+
+    ``anchor`` is one of:
+      - ``('char', c)``: the match starts with the literal character ``c``
+      - ``('digits',)``: the match starts with ``\\d+``
+      - ``('keyword', word)``: the match starts with the literal ``word``
+      - ``('unit', unit_re, class_re)``: ``class+ \\d+ \\s* unit``; the match
+        starts at the class run in front of the digits preceding a unit word
+    """
+
+    def __init__(self, family: str, pattern, anchor: tuple):
+        self.family = family
+        self.pattern = pattern
+        self.anchor = anchor
+
+
+class ListingScanner:
+    """Run a set of rules over a document in one line-by-line pass"""
+
+    DIGITS = re.compile(r'\d+')
+
+    def __init__(self, rules: List[ScanRule]):
+        self.rules = rules
+
+    def scan(self, text: str) -> Dict[str, List]:
+        """Return matches per family, ordered by rule then position"""
+        per_rule: List[List] = [[] for _ in self.rules]
+        next_pos = [0] * len(self.rules)
+
+        def attempt(index: int, pos: int):
+            if pos < next_pos[index]:
+                return
+            match = self.rules[index].pattern.match(text, pos)
+            if match:
+                per_rule[index].append(match)
+                end = match.end()
+                next_pos[index] = end if end > match.start() else end + 1
+
+        char_rules = [(i, r.anchor[1]) for i, r in enumerate(self.rules) if r.anchor[0] == 'char']
+        digit_rules = [i for i, r in enumerate(self.rules) if r.anchor[0] == 'digits']
+        keyword_rules = [(i, r.anchor[1]) for i, r in enumerate(self.rules) if r.anchor[0] == 'keyword']
+        unit_rules = [(i, r.anchor[1], r.anchor[2]) for i, r in enumerate(self.rules) if r.anchor[0] == 'unit']
+
+        length = len(text)
+        line_start = 0
+        while line_start <= length:
+            newline = text.find('\n', line_start)
+            line_end = length if newline == -1 else newline
+            line = text[line_start:line_end]
+
+            for index, char in char_rules:
+                found = line.find(char)
+                while found != -1:
+                    attempt(index, line_start + found)
+                    found = line.find(char, found + 1)
+
+            if digit_rules:
+                for run in self.DIGITS.finditer(line):
+                    run_start, run_end = line_start + run.start(), line_start + run.end()
+                    for index in digit_rules:
+                        # A previous match may have ended inside this digit run
+                        resume = next_pos[index]
+                        attempt(index, resume if run_start < resume < run_end else run_start)
+
+            for index, unit_re, class_re in unit_rules:
+                for unit in unit_re.finditer(line):
+                    start = self._class_run_start(text, line_start + unit.start(), class_re, next_pos[index])
+                    if start is not None:
+                        attempt(index, start)
+
+            for index, keyword in keyword_rules:
+                found = line.find(keyword)
+                while found != -1:
+                    attempt(index, line_start + found)
+                    found = line.find(keyword, found + 1)
+
+            if newline == -1:
+                break
+            line_start = newline + 1
+
+        families: Dict[str, List] = {}
+        for rule, matches in zip(self.rules, per_rule):
+            families.setdefault(rule.family, []).extend(matches)
+        return families
+
+    @staticmethod
+    def _class_run_start(text: str, unit_pos: int, class_re, floor: int) -> Optional[int]:
+        """Walk back from a unit word over ``\\s*``, ``\\d+`` and the class run before them"""
+        pos = unit_pos
+        while pos > floor and text[pos - 1].isspace():
+            pos -= 1
+        digits_start = pos
+        while digits_start > floor and text[digits_start - 1].isdecimal():
+            digits_start -= 1
+        if digits_start == pos:
+            return None
+        start = digits_start
+        while start > floor and class_re.match(text, start - 1):
+            start -= 1
+        if start == digits_start:
+            return None
+        return start
@@ -0,0 +1,185 @@
+"""Lot segmentation of extracted bulletin text.
+
+The text is split into an indexed, contiguous list of segments: the lines of
+the document grouped by auction group, then by lot. Segment boundaries are
+always at line starts and every segment keeps its character offsets into the
+document, so fields can be extracted per segment (possibly in parallel) and a
+single lot can be re-parsed without rescanning the whole text.
+
+Markers, as in ``tying_Ocr.find_segment_boundaries``:
+  - a group starts on a line where ``المجموعة`` is next to the group number
+    or ordinal (or on ``Groupe I..V``)
+  - a lot starts on a line with ``N° 12`` / ``LOT 12``, or on a table row
+    that starts or ends with the next lot number in sequence
+
+Lines are matched after NFKC folding, so shaped (presentation form) and
+visually ordered Arabic from pdfplumber is recognized too.
+"""
+import os
+import re
+import unicodedata
+from typing import Dict, List, Optional
+
+# Lot rows may skip this many numbers (a row the extractor mangled)
+LOT_SEQUENCE_GAP = int(os.environ.get('LOT_SEQUENCE_GAP', '2') or 2)
+
+# 'مجموعة' next to a group number or ordinal, in logical order or reversed as
+# pdfplumber emits visual order ('01-المجموعة', 'ةعومجملا-01', 'المجموعة الأولى')
+GROUP_MARKER = re.compile(
+    r'\d{1,2}[\s\-:ال]{0,6}مجموعة'
+    r'|مجموعة[\s\-:]{0,3}\d{1,2}'
+    r'|مجموعة\s+(?:الأولى|الثانية|الثالثة|الرابعة|الخامسة)'
+    r'|ةعومجم\S{0,3}[\s\-:]{0,3}\d{1,2}'
+    r'|\bGroupe\s+(?:I|II|III|IV|V)\b'
+)
+# Ordinal right after the marker (right before it when reversed)
+GROUP_NAME = re.compile(
+    r'مجموعة\s+(الأولى|الثانية|الثالثة|الرابعة|الخامسة)'
+    r'|(ىلولأا|ةيناثلا|ةثلاثلا|ةعبارلا|ةسماخلا)\s+ةعومجم'
+    r'|\bGroupe\s+(I|II|III|IV|V)\b'
+)
+LOT_MARKER = re.compile(r'\b(?:N[°ºo]\.?|LOT)\s*[-:]?\s*(\d{1,4})\b', re.IGNORECASE)
+LOT_ROW_NUMBER = re.compile(r'^(\d{2,3})(?=\s)|(?<=\s)(\d{2,3})$')
+
+
+def fold_line(line: str) -> str:
+    """Canonical form of a line for marker matching"""
+    return unicodedata.normalize('NFKC', line).strip()
+
+
+def iter_lines(text: str):
+    """Yield ``(start, end)`` offsets of each line, without its newline"""
+    start = 0
+    length = len(text)
+    while start <= length:
+        newline = text.find('\n', start)
+        if newline == -1:
+            yield start, length
+            return
+        yield start, newline
+        start = newline + 1
+
+
+def _group_name(folded: str) -> Optional[str]:
+    match = GROUP_NAME.search(folded)
+    if not match:
+        return None
+    return next(name for name in match.groups() if name)
+
+
+def _lot_from_row(folded: str, expected: int, gap: int) -> Optional[int]:
+    """Lot number of a table row, when it continues the lot sequence"""
+    for match in LOT_ROW_NUMBER.finditer(folded):
+        number = int(match.group(1) or match.group(2))
+        if expected <= number <= expected + gap:
+            return number
+    return None
+
+
+class Segmenter:
+    """Incremental segmentation: feed text chunks, get completed segments back.
+
+    Chunks are joined with a newline, as pages are when a document is
+    extracted, and offsets are relative to the joined text. A segment is
+    complete once the next one starts; ``close`` returns the last one.
+    """
+
+    def __init__(self):
+        self.length = 0
+        self.segment_count = 0
+        self.group = 0
+        self.group_name = None
+        self.next_lot = 1
+        self.current = None
+
+    def _open(self, start: int, lot: Optional[str]) -> Optional[Dict]:
+        finished = self.current
+        self.current = {
+            'index': self.segment_count,
+            'group': self.group,
+            'group_name': self.group_name,
+            'lot': lot,
+            'start_pos': start,
+            'end_pos': start,
+            'lines': [],
+        }
+        self.segment_count += 1
+        return finished
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """Add a chunk of whole lines and return the segments it completed"""
+        completed = []
+        base = self.length + 1 if self.length or self.segment_count else 0
+        for start, end in iter_lines(chunk):
+            start, end = base + start, base + end
+            finished = self._classify(fold_line(chunk[start - base:end - base]), start)
+            if finished is not None:
+                completed.append(finished)
+            self.current['lines'].append((start, end))
+            # Segments are contiguous: each one runs up to the next line start
+            self.current['end_pos'] = end + 1
+        self.length = base + len(chunk)
+        return completed
+
+    def _classify(self, folded: str, start: int) -> Optional[Dict]:
+        """Open a new segment if this line is a marker; return the one it ends"""
+        if folded and GROUP_MARKER.search(folded):
+            self.group += 1
+            self.group_name = _group_name(folded)
+            return self._open(start, None)
+
+        lot = None
+        marker = LOT_MARKER.search(folded) if folded else None
+        if marker:
+            lot = int(marker.group(1))
+        elif folded:
+            # In the preamble only the exact first lot number counts
+            gap = LOT_SEQUENCE_GAP if self.group or self.next_lot > 1 else 0
+            lot = _lot_from_row(folded, self.next_lot, gap)
+        if lot is not None:
+            self.next_lot = lot + 1
+            return self._open(start, f"{lot:02d}")
+        if self.current is None:
+            return self._open(start, None)
+        return None
+
+    def close(self) -> List[Dict]:
+        """Return the last, still open segment"""
+        if self.current is None:
+            return []
+        finished, self.current = self.current, None
+        finished['end_pos'] = min(finished['end_pos'], self.length)
+        return [finished]
+
+
+def segment_document(text: str) -> List[Dict]:
+    """Split text into contiguous segments (group -> lot -> lines).
+
+    Each segment is a dict with ``index``, ``group`` (0 before the first
+    group marker), ``group_name``, ``lot`` (zero-padded number, or None for
+    group headers and preamble), ``start_pos``/``end_pos`` and ``lines`` as
+    ``(start, end)`` offsets.
+    """
+    segmenter = Segmenter()
+    return segmenter.feed(text) + segmenter.close()
+
+
+def segment_text(text: str, segment: Dict) -> str:
+    return text[segment['start_pos']:segment['end_pos']]
+
+
+def lots_by_group(segments: List[Dict]) -> Dict[int, List[Dict]]:
+    """Lot segments keyed by group index"""
+    groups: Dict[int, List[Dict]] = {}
+    for segment in segments:
+        if segment['lot'] is not None:
+            groups.setdefault(segment['group'], []).append(segment)
+    return groups
+
+
+def find_lot(segments: List[Dict], lot: str) -> Optional[Dict]:
+    """Segment of a lot number, e.g. to re-parse a single lot"""
+    for segment in segments:
+        if segment['lot'] == lot:
+            return segment
+    return None
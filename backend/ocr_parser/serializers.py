@@ -0,0 +1,18 @@
+from rest_framework import serializers
+from .models import ProcessingJob
+
+
+class ProcessingJobSerializer(serializers.ModelSerializer):
+    filename = serializers.CharField(source='pdf_upload.filename', read_only=True)
+    progress_percent = serializers.ReadOnlyField()
+    duration = serializers.ReadOnlyField()
+    
+    class Meta:
+        model = ProcessingJob
+        fields = [
+            'id', 'pdf_upload', 'filename', 'job_type', 'status',
+            'stage', 'pages_total', 'pages_processed', 'progress_percent',
+            'timings', 'result', 'error', 'attempts', 'backend',
+            'created_at', 'started_at', 'finished_at', 'duration'
+        ]
+        read_only_fields = fields
@@ -1,146 +1,194 @@
-from typing import Dict, List, Optional
+import os
+import time
+from decimal import Decimal, InvalidOperation
+from typing import Callable, Dict, List, Optional
 from django.db import transaction
 from django.utils import timezone
 from listings.models import Listing, PDFUpload, AuctionGroup
+from listings.stats import invalidate_stats
 from .parser import PDFParser, extract_city_from_filename, extract_date_from_filename
+from .pipeline import ListingPipeline
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Rows per bulk INSERT when writing parsed listings
+LISTING_BULK_BATCH_SIZE = int(os.environ.get('LISTING_BULK_BATCH_SIZE', '500') or 500)
+# Minimum seconds between progress writes to the PDFUpload row
+PROGRESS_UPDATE_INTERVAL = float(os.environ.get('PROGRESS_UPDATE_INTERVAL', '1') or 1)
+
+# Listing amounts are DecimalField(max_digits=12, decimal_places=2)
+MAX_AMOUNT = Decimal(10) ** 10
+CHAR_FIELD_LENGTHS = {
+    field.name: field.max_length
+    for field in Listing._meta.concrete_fields
+    if field.get_internal_type() == 'CharField' and field.max_length
+}
+
+
+def root_txt_path(pdf_upload: PDFUpload) -> str:
+    """Path of the TXT export of a PDF, in the project root"""
+    # backend/ocr_parser/services.py -> backend/ -> project root
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    root_dir = os.path.dirname(backend_dir)
+    base_name = os.path.splitext(pdf_upload.filename)[0]
+    return os.path.join(root_dir, f"{base_name}.txt")
+
 
 class OCRProcessingService:
     """Service for processing PDF uploads and extracting listings"""
     
-    def __init__(self):
+    def __init__(self, on_progress: Optional[Callable[[Dict], None]] = None):
         self.parser = PDFParser()
+        # Receives every progress update, e.g. to mirror it on a ProcessingJob
+        self.on_progress = on_progress
     
     def process_pdf_upload(self, pdf_upload: PDFUpload) -> Dict:
-        """Process a PDF upload and create listings"""
+        """Process a PDF upload and create listings.
+        
+        Listings are streamed out of the parse pipeline and bulk-inserted one
+        batch per transaction, so the first lots are visible while later pages
+        are still being OCR'd. Progress is kept on the PDFUpload row.
+        """
         try:
-            # Parse the PDF
             pdf_path = pdf_upload.file.path
-            parsed_data = self.parser.parse_pdf(pdf_path)
+            pipeline = ListingPipeline(
+                self.parser,
+                batch_size=LISTING_BULK_BATCH_SIZE,
+                on_progress=ProgressThrottle(lambda stage, processed, total: self._update_progress(
+                    pdf_upload, processing_stage=stage, pages_processed=processed, pages_total=total
+                )),
+            )
             
-            if not parsed_data:
+            writer = ListingWriter(self, pdf_upload)
+            counts = {'vehicle': 0, 'goods': 0}
+            write_seconds = 0.0
+            for batch in pipeline.iter_batches(pdf_path):
+                started = time.perf_counter()
+                writer.write(batch)
+                write_seconds += time.perf_counter() - started
+                for record in batch:
+                    counts[record['type']] = counts.get(record['type'], 0) + 1
+                self._update_progress(pdf_upload, total_listings=writer.total_listings)
+            started = time.perf_counter()
+            writer.finish()
+            write_seconds += time.perf_counter() - started
+            listings_created = writer.stats['inserted']
+            
+            if not pipeline.document or not pipeline.document.get('text'):
+                self._update_progress(pdf_upload, processing_stage='failed')
                 return {
                     'success': False,
                     'message': 'No data extracted from PDF',
                     'listings_count': 0
                 }
             
-            # Create listings in database
-            listings_created = self._create_listings_from_parsed_data(pdf_upload, parsed_data)
-            
             # Update PDF upload status
-            pdf_upload.processed = True
-            pdf_upload.total_listings = listings_created
-            pdf_upload.save()
+            self._update_progress(
+                pdf_upload, processed=True, total_listings=writer.total_listings, processing_stage='done',
+                pages_processed=pdf_upload.pages_total
+            )
             
             return {
                 'success': True,
                 'message': f'Successfully processed {listings_created} listings',
                 'listings_count': listings_created,
-                'vehicles': len(parsed_data.get('vehicles', [])),
-                'goods': len(parsed_data.get('goods', []))
+                'vehicles': counts['vehicle'],
+                'goods': counts['goods'],
+                'skipped': writer.stats['skipped'],
+                'conflicted': writer.stats['conflicted'],
+                'pages': len(pipeline.document['pages']),
+                'text_pages': sum(1 for page in pipeline.document['pages'] if page['method'] == 'text'),
+                'ocr_pages': sum(1 for page in pipeline.document['pages'] if page['method'] == 'ocr'),
+                'cached': pipeline.document['cached'],
+                'timings': dict(pipeline.timings, writing=write_seconds)
             }
             
         except Exception as e:
             logger.error(f"Error processing PDF upload {pdf_upload.id}: {e}")
+            self._update_progress(pdf_upload, processing_stage='failed')
             return {
                 'success': False,
                 'message': f'Error processing PDF: {str(e)}',
                 'listings_count': 0
             }
     
-    @transaction.atomic
-    def _create_listings_from_parsed_data(self, pdf_upload: PDFUpload, parsed_data: Dict) -> int:
-        """Create listing objects from parsed data"""
-        listings_created = 0
+    def _update_progress(self, pdf_upload: PDFUpload, **fields):
+        """Write progress fields without touching the rest of the row"""
+        for name, value in fields.items():
+            setattr(pdf_upload, name, value)
+        PDFUpload.objects.filter(pk=pdf_upload.pk).update(**fields)
+        self._notify(fields)
+    
+    def _notify(self, fields: Dict):
+        if self.on_progress is not None:
+            self.on_progress(fields)
+    
+    def extract_txt(self, pdf_upload: PDFUpload) -> Dict:
+        """Extract the PDF text and write it as a TXT in the project root (for n8n)"""
+        pipeline = ListingPipeline(
+            self.parser,
+            on_progress=ProgressThrottle(lambda stage, processed, total: self._notify(
+                {'processing_stage': stage, 'pages_processed': processed, 'pages_total': total}
+            )),
+        )
+        document = pipeline.extract(pdf_upload.file.path)
+        text = document.get('text', '')
+        if not text:
+            return {'success': False, 'message': 'No text extracted'}
         
-        # Process vehicles
-        for vehicle_data in parsed_data.get('vehicles', []):
-            try:
-                listing = self._create_vehicle_listing(pdf_upload, vehicle_data)
-                if listing:
-                    listings_created += 1
-            except Exception as e:
-                logger.error(f"Error creating vehicle listing: {e}")
-                continue
+        txt_path = root_txt_path(pdf_upload)
+        os.makedirs(os.path.dirname(txt_path), exist_ok=True)
+        with open(txt_path, 'w', encoding='utf-8-sig') as f:
+            f.write(text)
+        return {
+            'success': True,
+            'message': f'TXT saved at {txt_path}',
+            'txt_path': txt_path,
+            'size_bytes': os.path.getsize(txt_path),
+            'timings': dict(pipeline.timings),
+        }
+    
+    def _build_vehicle_listing(self, pdf_upload: PDFUpload, vehicle_data: Dict, lot_number: str) -> Listing:
+        """Unsaved vehicle listing for parsed data"""
+        # Create title from brand and description
+        title = self._create_vehicle_title(vehicle_data)
         
-        # Process goods
-        for goods_data in parsed_data.get('goods', []):
-            try:
-                listing = self._create_goods_listing(pdf_upload, goods_data)
-                if listing:
-                    listings_created += 1
-            except Exception as e:
-                logger.error(f"Error creating goods listing: {e}")
-                continue
+        # Create short description
+        short_desc = self._create_vehicle_short_description(vehicle_data, pdf_upload)
         
-        return listings_created
-    
-    def _create_vehicle_listing(self, pdf_upload: PDFUpload, vehicle_data: Dict) -> Optional[Listing]:
-        """Create a vehicle listing from parsed data"""
-        try:
-            # Extract lot number from description or generate one
-            lot_number = self._extract_lot_number(vehicle_data.get('description', ''))
-            if not lot_number:
-                lot_number = self._generate_lot_number(pdf_upload)
-            
-            # Create title from brand and description
-            title = self._create_vehicle_title(vehicle_data)
-            
-            # Create short description
-            short_desc = self._create_vehicle_short_description(vehicle_data, pdf_upload)
-            
-            listing = Listing.objects.create(
-                lot_number=lot_number,
-                title=title,
-                listing_type='vehicle',
-                short_description=short_desc,
-                full_description=vehicle_data.get('description', ''),
-                brand=vehicle_data.get('brand', ''),
-                serial_number=vehicle_data.get('serial', ''),
-                starting_price=vehicle_data.get('price_tnd', 0),
-                guarantee_amount=vehicle_data.get('guarantee_tnd', 0),
-                pdf_upload=pdf_upload
-            )
-            
-            return listing
-            
-        except Exception as e:
-            logger.error(f"Error creating vehicle listing: {e}")
-            return None
+        return Listing(
+            lot_number=lot_number,
+            title=title,
+            listing_type='vehicle',
+            short_description=short_desc,
+            full_description=vehicle_data.get('description', ''),
+            brand=vehicle_data.get('brand', ''),
+            serial_number=vehicle_data.get('serial', ''),
+            starting_price=vehicle_data.get('price_tnd', 0),
+            guarantee_amount=vehicle_data.get('guarantee_tnd', 0),
+            pdf_upload=pdf_upload
+        )
     
-    def _create_goods_listing(self, pdf_upload: PDFUpload, goods_data: Dict) -> Optional[Listing]:
-        """Create a goods listing from parsed data"""
-        try:
-            # Extract lot number or generate one
-            lot_number = self._generate_lot_number(pdf_upload)
-            
-            # Create title from item name
-            title = goods_data.get('item', 'Unknown Item')
-            
-            # Create short description
-            short_desc = self._create_goods_short_description(goods_data, pdf_upload)
-            
-            listing = Listing.objects.create(
-                lot_number=lot_number,
-                title=title,
-                listing_type='goods',
-                short_description=short_desc,
-                full_description=goods_data.get('raw_match', ''),
-                quantity=goods_data.get('quantity', ''),
-                starting_price=0,  # Default for goods
-                guarantee_amount=0,  # Default for goods
-                pdf_upload=pdf_upload
-            )
-            
-            return listing
-            
-        except Exception as e:
-            logger.error(f"Error creating goods listing: {e}")
-            return None
+    def _build_goods_listing(self, pdf_upload: PDFUpload, goods_data: Dict, lot_number: str) -> Listing:
+        """Unsaved goods listing for parsed data"""
+        # Create title from item name
+        title = goods_data.get('item', 'Unknown Item')
+        
+        # Create short description
+        short_desc = self._create_goods_short_description(goods_data, pdf_upload)
+        
+        return Listing(
+            lot_number=lot_number,
+            title=title,
+            listing_type='goods',
+            short_description=short_desc,
+            full_description=goods_data.get('raw_match', ''),
+            quantity=goods_data.get('quantity', ''),
+            starting_price=0,  # Default for goods
+            guarantee_amount=0,  # Default for goods
+            pdf_upload=pdf_upload
+        )
     
     def _extract_lot_number(self, text: str) -> Optional[str]:
         """Extract lot number from text"""
@@ -150,22 +198,6 @@ class OCRProcessingService:
         matches = lot_pattern.findall(text)
         return matches[0] if matches else None
     
-    def _generate_lot_number(self, pdf_upload: PDFUpload) -> str:
-        """Generate a unique lot number for the PDF upload"""
-        # Get the next available lot number for this PDF
-        existing_lots = Listing.objects.filter(pdf_upload=pdf_upload).values_list('lot_number', flat=True)
-        
-        if not existing_lots:
-            return "01"
-        
-        # Find the next available number
-        used_numbers = set(int(lot) for lot in existing_lots if lot.isdigit())
-        next_number = 1
-        while next_number in used_numbers:
-            next_number += 1
-        
-        return f"{next_number:02d}"
-    
     def _create_vehicle_title(self, vehicle_data: Dict) -> str:
         """Create a title for vehicle listing"""
         brand = vehicle_data.get('brand', '')
@@ -235,38 +267,142 @@ class OCRProcessingService:
         return None
 
 
-class ImageSearchService:
-    """Service for fetching images for listings"""
+class ProgressThrottle:
+    """Forward progress callbacks on stage changes, on the last page, or every ``interval`` seconds"""
     
-    def __init__(self):
-        # TODO: Add API keys for image search services
-        self.api_key = None  # Will be set from environment variables
+    def __init__(self, callback, interval: float = PROGRESS_UPDATE_INTERVAL):
+        self.callback = callback
+        self.interval = interval
+        self.last_stage = None
+        self.last_time = 0.0
     
-    def search_image(self, query: str) -> Optional[str]:
-        """Search for an image based on query"""
-        # TODO: Implement image search using Bing API or SerpAPI
-        # For now, return a placeholder
-        return None
+    def __call__(self, stage: str, processed: int, total: int):
+        now = time.monotonic()
+        if stage != self.last_stage or processed == total or now - self.last_time >= self.interval:
+            self.last_stage = stage
+            self.last_time = now
+            self.callback(stage, processed, total)
+
+
+class ListingWriter:
+    """Batched writer of parsed listing records for one PDF upload.
+    
+    The PDF's existing lot numbers are loaded once and lots are allocated in
+    memory. A record with its own lot (from its segment) is stored under it.
+    Records without one, or whose lot was already taken by an earlier record
+    of the same segment, are held back until ``finish``: by then every lot of
+    the bulletin is known, so their number (a lot number in the vehicle
+    description if free, else the next number after the highest lot) can
+    never push a real lot off its number. Valid rows are inserted with
+    ``bulk_create`` in chunks of ``batch_size``, one transaction per
+    ``write``/``finish`` call. ``stats`` counts rows inserted, skipped
+    (invalid) and conflicted (lot already stored for this PDF).
+    """
+    
+    def __init__(self, service: OCRProcessingService, pdf_upload: PDFUpload, batch_size: Optional[int] = None):
+        self.service = service
+        self.pdf_upload = pdf_upload
+        self.batch_size = max(1, batch_size or LISTING_BULK_BATCH_SIZE)
+        self.stats = {'inserted': 0, 'skipped': 0, 'conflicted': 0}
+        self.total_listings = 0
+        self._existing_lots = None
+        self._allocated_lots = set()
+        self._deferred = []
+        self._next_lot = None
+    
+    def _load_existing_lots(self):
+        if self._existing_lots is None:
+            self._existing_lots = set(
+                Listing.objects.filter(pdf_upload=self.pdf_upload).values_list('lot_number', flat=True)
+            )
+            self.total_listings = len(self._existing_lots)
+    
+    def _is_free(self, lot: str) -> bool:
+        return lot not in self._existing_lots and lot not in self._allocated_lots
     
-    def update_listing_image(self, listing: Listing) -> bool:
-        """Update listing with fetched image"""
+    def _fallback_lot(self, record: Dict) -> str:
+        """Lot for a held-back record, once every segment lot is allocated"""
+        if record.get('type') == 'vehicle':
+            lot = self.service._extract_lot_number(record.get('description', ''))
+            if lot and self._is_free(lot):
+                return lot
+        if self._next_lot is None:
+            numbers = [int(lot) for lot in self._existing_lots | self._allocated_lots if lot.isdigit()]
+            self._next_lot = max(numbers, default=0) + 1
+        while not self._is_free(f"{self._next_lot:02d}"):
+            self._next_lot += 1
+        return f"{self._next_lot:02d}"
+    
+    def _validate(self, listing: Listing) -> bool:
+        """Check required fields and fit text into the column sizes"""
+        if not listing.title or not listing.title.strip():
+            return False
+        for amount in (listing.starting_price, listing.guarantee_amount):
+            try:
+                value = Decimal(amount)
+            except (InvalidOperation, TypeError, ValueError):
+                return False
+            if not value.is_finite() or value < 0 or value >= MAX_AMOUNT:
+                return False
+        for name, max_length in CHAR_FIELD_LENGTHS.items():
+            value = getattr(listing, name)
+            if isinstance(value, str) and len(value) > max_length:
+                setattr(listing, name, value[:max_length])
+        return True
+    
+    def _build(self, record: Dict, lot: Optional[str] = None) -> Optional[Listing]:
+        """Listing for a record; None when it is held back, conflicting or invalid"""
+        if lot is None:
+            lot = record.get('lot')
+            if lot and lot in self._existing_lots:
+                self.stats['conflicted'] += 1
+                return None
+            if not lot or lot in self._allocated_lots:
+                self._deferred.append(record)
+                return None
         try:
-            # Create search query
-            if listing.listing_type == 'vehicle':
-                query = f"{listing.brand} {listing.model} {listing.year or ''} car"
+            if record.get('type') == 'vehicle':
+                listing = self.service._build_vehicle_listing(self.pdf_upload, record, lot)
             else:
-                query = listing.title
-            
-            # Search for image
-            image_url = self.search_image(query)
-            
-            if image_url:
-                listing.image_url = image_url
-                listing.save()
-                return True
-            
-            return False
-            
+                listing = self.service._build_goods_listing(self.pdf_upload, record, lot)
         except Exception as e:
-            logger.error(f"Error updating listing image: {e}")
-            return False
+            logger.warning(f"Skipping {record.get('type', 'listing')} record: {e}")
+            listing = None
+        if listing is None or not self._validate(listing):
+            self.stats['skipped'] += 1
+            return None
+        self._allocated_lots.add(lot)
+        return listing
+    
+    def write(self, records: List[Dict]) -> Dict[str, int]:
+        """Insert a batch of records in one transaction and return the running stats"""
+        self._load_existing_lots()
+        return self._insert([listing for listing in map(self._build, records) if listing is not None])
+    
+    def finish(self) -> Dict[str, int]:
+        """Insert the held-back records, numbered after every lot of the bulletin"""
+        self._load_existing_lots()
+        records, self._deferred = self._deferred, []
+        listings = []
+        for record in records:
+            listing = self._build(record, self._fallback_lot(record))
+            if listing is not None:
+                listings.append(listing)
+        return self._insert(listings)
+    
+    def _insert(self, listings: List[Listing]) -> Dict[str, int]:
+        if not listings:
+            return self.stats
+        
+        with transaction.atomic():
+            for start in range(0, len(listings), self.batch_size):
+                Listing.objects.bulk_create(listings[start:start + self.batch_size], ignore_conflicts=True)
+            invalidate_stats()
+            # Rows written concurrently for the same lots are dropped by the unique constraint
+            total = Listing.objects.filter(pdf_upload=self.pdf_upload).count()
+        
+        inserted = total - self.total_listings
+        self.total_listings = total
+        self.stats['inserted'] += inserted
+        self.stats['conflicted'] += len(listings) - inserted
+        return self.stats
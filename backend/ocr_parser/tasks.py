@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from .jobs import run_job
+
+
+@shared_task(name='ocr_parser.run_job', acks_late=True)
+def run_job_task(job_id: int):
+    """Celery entry point for a ProcessingJob"""
+    run_job(job_id)
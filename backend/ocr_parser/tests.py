@@ -1,3 +1,311 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db import IntegrityError, transaction
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from listings.models import Listing, PDFUpload
+
+from .cache import ExtractionCache
+from .extractors import PyMuPDFExtractor
+from .jobs import (
+    JOB_MAX_ATTEMPTS, cancel_job, dispatch_job, enqueue_job, reap_stale_jobs, recover_local_jobs, retry_job,
+    run_job, worker_name,
+)
+from .models import ProcessingJob
+from .parser import PDFParser
+from .pipeline import ListingPipeline
+from .services import ListingWriter, OCRProcessingService
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+KEF_TXT = os.path.join(PROJECT_DIR, '2025-08-07_AV_OP_Kef_N°03-2025.txt')
+
+TEXT_PAGE = 'Bulletin de vente aux encheres publiques, lot 01'
+
+
+class FakeOCR:
+    """Stands in for the OCR engine: records the pages asked for"""
+
+    def __init__(self, text: str = 'OCR text of page {page}'):
+        self.text = text
+        self.calls = []
+
+    def __call__(self, pdf_path, page_numbers):
+        self.calls.append(list(page_numbers))
+        for number in page_numbers:
+            yield number, self.text.format(page=number)
+
+
+def make_pdf(directory: str, pages) -> str:
+    """A PDF with one page per item of ``pages``: text, or None for a page without a text layer"""
+    import pymupdf
+    path = f'{directory}/bulletin.pdf'
+    doc = pymupdf.open()
+    for text in pages:
+        page = doc.new_page()
+        if text:
+            page.insert_text((72, 72), text)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+class ParserTestCase(SimpleTestCase):
+
+    def setUp(self):
+        if not PyMuPDFExtractor.available():
+            self.skipTest('PyMuPDF is not installed')
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.pdf_path = make_pdf(self.directory, [TEXT_PAGE, None])
+
+    def parser(self, ocr: FakeOCR, cache: bool = True) -> PDFParser:
+        parser = PDFParser(use_cache=False, backend='pymupdf')
+        if cache:
+            parser.cache = ExtractionCache(directory=f'{self.directory}/cache')
+        parser.ocr_extractor.iter_pages = ocr
+        return parser
+
+
+class ExtractionCacheTests(ParserTestCase):
+    """Pages are cached one by one, under the settings of the extractor that produced them"""
+
+    def test_unchanged_pdf_is_served_from_the_cache(self):
+        ocr = FakeOCR()
+        first = self.parser(ocr).extract_document(self.pdf_path)
+        second = self.parser(ocr).extract_document(self.pdf_path)
+        self.assertEqual(ocr.calls, [[2]])
+        self.assertFalse(first['cached'])
+        self.assertTrue(second['cached'])
+        self.assertEqual(second['text'], first['text'])
+        self.assertEqual([page['method'] for page in second['pages']], ['text', 'ocr'])
+
+    def test_ocr_settings_only_invalidate_ocr_pages(self):
+        self.parser(FakeOCR()).extract_document(self.pdf_path)
+        ocr = FakeOCR('OCR at 200 dpi')
+        parser = self.parser(ocr)
+        parser.ocr_extractor.dpi = 200
+        document = parser.extract_document(self.pdf_path)
+        self.assertEqual(ocr.calls, [[2]])
+        self.assertEqual([page['cached'] for page in document['pages']], [True, False])
+        self.assertIn('OCR at 200 dpi', document['text'])
+
+    def test_failed_ocr_pages_are_not_cached(self):
+        self.parser(FakeOCR('   ')).extract_document(self.pdf_path)
+        ocr = FakeOCR()
+        self.parser(ocr).extract_document(self.pdf_path)
+        self.assertEqual(ocr.calls, [[2]])
+
+    def test_pipeline_matches_extract_document(self):
+        document = self.parser(FakeOCR()).extract_document(self.pdf_path)
+        pipeline = ListingPipeline(self.parser(FakeOCR()))
+        self.assertEqual(pipeline.extract(self.pdf_path)['text'], document['text'])
+        self.assertTrue(pipeline.document['cached'])
+
+
+class CacheEvictionTests(SimpleTestCase):
+    """The cache directory is only walked when the running total goes over budget"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.cache = ExtractionCache(directory=self.directory, max_bytes=10_000)
+
+    def test_writes_under_budget_do_not_walk_the_cache(self):
+        with mock.patch.object(self.cache, '_evict', wraps=self.cache._evict) as walk:
+            for number in range(20):
+                self.cache.set(f'{number:02d}-page', {'text': 'x' * 100})
+        self.assertEqual(walk.call_count, 1)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        for number in range(100):
+            self.cache.set(f'{number:02d}-page', {'text': 'x' * 1000})
+            # Distinct mtimes, oldest first
+            os.utime(self.cache._path(f'{number:02d}-page'), (number, number))
+        self.assertIsNotNone(self.cache.get('99-page'))
+        self.assertIsNone(self.cache.get('00-page'))
+        self.cache.evict()
+        self.assertLessEqual(self.cache._size, 10_000)
+
+
+class ScannedPageOrderTests(ParserTestCase):
+    """OCR'd pages keep the baseline output: NFKC, Arabic reshaping, then BiDi display order"""
+
+    OCR_TEXT = 'سيارة مرسيدس 01 ضمان 500 د'
+
+    def baseline(self, *texts: str) -> str:
+        import unicodedata
+        import arabic_reshaper
+        from bidi.algorithm import get_display
+        return get_display(arabic_reshaper.reshape(unicodedata.normalize('NFKC', '\n'.join(texts))))
+
+    def setUp(self):
+        super().setUp()
+        self.pdf_path = make_pdf(self.directory, [None, None])
+
+    def test_extract_document(self):
+        document = self.parser(FakeOCR(self.OCR_TEXT), cache=False).extract_document(self.pdf_path)
+        self.assertEqual([page['method'] for page in document['pages']], ['ocr', 'ocr'])
+        self.assertEqual(document['text'], self.baseline(self.OCR_TEXT, self.OCR_TEXT))
+
+    def test_pipeline(self):
+        pipeline = ListingPipeline(self.parser(FakeOCR(self.OCR_TEXT), cache=False))
+        self.assertEqual(pipeline.extract(self.pdf_path)['text'], self.baseline(self.OCR_TEXT, self.OCR_TEXT))
+
+
+class LotAllocationTests(TestCase):
+    """Parsed lots are stored under their own numbers; records without one are numbered after them"""
+
+    def setUp(self):
+        if not os.path.exists(KEF_TXT):
+            self.skipTest('Kef bulletin TXT is not checked out')
+        with open(KEF_TXT, encoding='utf-8-sig') as f:
+            text = f.read()
+        parsed = PDFParser(use_cache=False).parse_listings(text)
+        # Document order, as ListingPipeline hands them to the writer
+        self.records = sorted(parsed['vehicles'] + parsed['goods'], key=lambda record: record['start_pos'])
+        self.upload = PDFUpload.objects.create(
+            filename='2025-08-07_AV_OP_Kef_N°03-2025.pdf', city='Kef', auction_date='2025-08-07', file='kef.pdf'
+        )
+
+    def write(self, batch_size: int = 5) -> ListingWriter:
+        writer = ListingWriter(OCRProcessingService(), self.upload)
+        for start in range(0, len(self.records), batch_size):
+            writer.write(self.records[start:start + batch_size])
+        writer.finish()
+        return writer
+
+    def test_stored_lots_match_parsed_lots(self):
+        self.write()
+        first_of_lot = {}
+        for record in self.records:
+            if record['lot']:
+                first_of_lot.setdefault(record['lot'], record)
+        self.assertEqual(sorted(first_of_lot), [f'{lot:02d}' for lot in range(1, 12)])
+        stored = dict(
+            Listing.objects.filter(pdf_upload=self.upload, lot_number__in=first_of_lot)
+            .values_list('lot_number', 'starting_price')
+        )
+        self.assertEqual(stored, {lot: Decimal(record['price_tnd']) for lot, record in first_of_lot.items()})
+
+    def test_records_without_a_lot_come_after_the_last_lot(self):
+        writer = self.write()
+        lots = list(Listing.objects.filter(pdf_upload=self.upload).values_list('lot_number', flat=True))
+        self.assertEqual(len(lots), writer.stats['inserted'])
+        self.assertEqual(len(set(lots)), len(lots))
+        held_back = [lot for lot in lots if lot not in {record['lot'] for record in self.records}]
+        self.assertTrue(held_back)
+        self.assertGreater(min(int(lot) for lot in held_back), 11)
+
+
+class JobQueueTests(TestCase):
+    """One active job per upload and type; jobs whose worker went away are reaped"""
+
+    def setUp(self):
+        self.upload = PDFUpload.objects.create(
+            filename='bulletin.pdf', city='Kef', auction_date='2025-08-07', file='bulletin.pdf'
+        )
+
+    def job(self, **fields) -> ProcessingJob:
+        fields.setdefault('backend', 'db')
+        return ProcessingJob.objects.create(pdf_upload=self.upload, **fields)
+
+    def test_second_active_job_is_rejected(self):
+        self.job()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.job(status=ProcessingJob.STATUS_RUNNING)
+        # Finished jobs don't count, nor do other job types
+        self.job(status=ProcessingJob.STATUS_FAILED)
+        self.job(job_type=ProcessingJob.JOB_EXTRACT_TXT)
+
+    def test_enqueue_returns_the_active_job(self):
+        first = enqueue_job(self.upload, backend='db')
+        self.assertEqual(enqueue_job(self.upload, backend='db').pk, first.pk)
+        self.assertEqual(ProcessingJob.objects.filter(pdf_upload=self.upload).count(), 1)
+
+    def test_retry_is_refused_while_another_job_is_active(self):
+        failed = self.job(status=ProcessingJob.STATUS_FAILED)
+        self.job()
+        self.assertFalse(retry_job(failed))
+        self.assertEqual(failed.status, ProcessingJob.STATUS_FAILED)
+
+    def test_stale_running_job_is_requeued_for_process_jobs(self):
+        long_ago = timezone.now() - timedelta(hours=1)
+        job = self.job(status=ProcessingJob.STATUS_RUNNING, backend='local', worker='web:1', attempts=1,
+                       heartbeat_at=long_ago)
+        self.assertEqual(reap_stale_jobs(), {'requeued': 1, 'failed': 0, 'lost': 0})
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.backend, job.worker), (ProcessingJob.STATUS_QUEUED, 'db', ''))
+
+    def test_job_out_of_attempts_is_failed(self):
+        long_ago = timezone.now() - timedelta(hours=1)
+        job = self.job(status=ProcessingJob.STATUS_RUNNING, attempts=JOB_MAX_ATTEMPTS, heartbeat_at=long_ago)
+        self.assertEqual(reap_stale_jobs()['failed'], 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProcessingJob.STATUS_FAILED)
+
+    def test_live_and_lost_jobs(self):
+        live = self.job(status=ProcessingJob.STATUS_RUNNING)
+        lost = self.job(job_type=ProcessingJob.JOB_EXTRACT_TXT, backend='local',
+                        heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(reap_stale_jobs(), {'requeued': 0, 'failed': 0, 'lost': 1})
+        live.refresh_from_db()
+        lost.refresh_from_db()
+        self.assertEqual(live.status, ProcessingJob.STATUS_RUNNING)
+        self.assertEqual((lost.status, lost.backend), (ProcessingJob.STATUS_QUEUED, 'db'))
+
+    def test_reaped_worker_does_not_overwrite_the_new_run(self):
+        job = self.job()
+
+        def taken_over(upload):
+            # The reaper requeued the job and another worker claimed it meanwhile
+            ProcessingJob.objects.filter(pk=job.pk).update(worker='other:2')
+            return {'success': True, 'message': 'done'}
+
+        with mock.patch.object(OCRProcessingService, 'process_pdf_upload', side_effect=taken_over):
+            run_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), (ProcessingJob.STATUS_RUNNING, 'other:2'))
+
+    def test_enqueue_replaces_a_stale_job(self):
+        stale = self.job(status=ProcessingJob.STATUS_RUNNING, heartbeat_at=timezone.now() - timedelta(hours=1))
+        job = enqueue_job(self.upload, backend='db')
+        self.assertNotEqual(job.pk, stale.pk)
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, ProcessingJob.STATUS_FAILED)
+
+    def test_cancel_stale_running_job(self):
+        live = self.job(status=ProcessingJob.STATUS_RUNNING)
+        self.assertFalse(cancel_job(live))
+        ProcessingJob.objects.filter(pk=live.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertTrue(cancel_job(live))
+        self.assertEqual(live.status, ProcessingJob.STATUS_CANCELLED)
+
+    def test_failed_dispatch_fails_the_job(self):
+        job = self.job()
+        dispatch_job(job.pk, 'carrier-pigeon')
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProcessingJob.STATUS_FAILED)
+        self.assertEqual(enqueue_job(self.upload, backend='db').status, ProcessingJob.STATUS_QUEUED)
+
+    def test_restart_fails_this_hosts_local_jobs(self):
+        mine = self.job(status=ProcessingJob.STATUS_RUNNING, backend='local', worker=worker_name())
+        elsewhere = self.job(job_type=ProcessingJob.JOB_EXTRACT_TXT, backend='local', worker='other-host:pool')
+        self.assertEqual(recover_local_jobs(), 1)
+        mine.refresh_from_db()
+        elsewhere.refresh_from_db()
+        self.assertEqual((mine.status, elsewhere.status), (ProcessingJob.STATUS_FAILED, ProcessingJob.STATUS_QUEUED))
+
+    def test_reap_without_requeue_fails_stale_jobs(self):
+        long_ago = timezone.now() - timedelta(hours=1)
+        running = self.job(status=ProcessingJob.STATUS_RUNNING, heartbeat_at=long_ago)
+        lost = self.job(job_type=ProcessingJob.JOB_EXTRACT_TXT, backend='local', heartbeat_at=long_ago)
+        self.assertEqual(reap_stale_jobs(requeue=False), {'requeued': 0, 'failed': 1, 'lost': 1})
+        for job in (running, lost):
+            job.refresh_from_db()
+            self.assertEqual(job.status, ProcessingJob.STATUS_FAILED)
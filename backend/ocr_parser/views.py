@@ -1,3 +1,54 @@
-from django.shortcuts import render
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import viewsets, status, filters
+from rest_framework.decorators import action
+from rest_framework.response import Response
 
-# Create your views here.
+from listings.mixins import CORSViewSetMixin
+from .jobs import cancel_job, retry_job
+from .models import ProcessingJob
+from .serializers import ProcessingJobSerializer
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class ProcessingJobViewSet(CORSViewSetMixin, viewsets.ReadOnlyModelViewSet):
+    """Background processing jobs: poll stage, page progress, timings and errors"""
+    queryset = ProcessingJob.objects.select_related('pdf_upload').all()
+    serializer_class = ProcessingJobSerializer
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['status', 'job_type', 'pdf_upload']
+    ordering_fields = ['created_at', 'started_at', 'finished_at']
+    ordering = ['-created_at']
+    http_method_names = ['get', 'post', 'head', 'options']
+
+    def create(self, request, *args, **kwargs):
+        """Jobs are enqueued through /api/pdf-uploads/{id}/process/ and extract_txt/"""
+        return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """Cancel a job that has not started yet, or whose worker stopped responding"""
+        job = self.get_object()
+        if not cancel_job(job):
+            return Response({
+                'error': f'Only queued jobs, or running jobs whose worker stopped responding, '
+                         f'can be cancelled (job is {job.status})',
+                'job': self.get_serializer(job).data
+            }, status=status.HTTP_409_CONFLICT)
+        return Response(self.get_serializer(job).data)
+
+    @action(detail=True, methods=['post'])
+    def retry(self, request, pk=None):
+        """Queue a failed or cancelled job again"""
+        job = self.get_object()
+        if not retry_job(job):
+            if job.status in (ProcessingJob.STATUS_FAILED, ProcessingJob.STATUS_CANCELLED):
+                error = 'This upload already has a queued or running job of this type'
+            else:
+                error = f'Only failed or cancelled jobs can be retried (job is {job.status})'
+            return Response({
+                'error': error,
+                'job': self.get_serializer(job).data
+            }, status=status.HTTP_409_CONFLICT)
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
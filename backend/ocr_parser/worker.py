@@ -0,0 +1,98 @@
+"""Entry points for spawned job worker processes.
+
+Kept free of model imports: a spawned process imports this module before
+Django is set up, then ``init_worker`` sets it up.
+"""
+import os
+
+
+def init_worker():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'douane_project.settings')
+    import django
+    django.setup()
+
+
+def run_job_in_worker(job_id: int):
+    from django.db import connections
+    from .jobs import run_job
+    try:
+        run_job(job_id)
+    finally:
+        connections.close_all()
+
+
+def init_batch_worker(max_memory_mb: int, environ: dict):
+    """Set up a batch worker: settings overrides, memory cap, then Django"""
+    os.environ.update(environ)
+    if max_memory_mb:
+        try:
+            import resource
+            limit = max_memory_mb * 1024 * 1024
+            # Inherited by tesseract/poppler subprocesses too
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError) as e:
+            import logging
+            logging.getLogger(__name__).warning(f"Could not limit worker memory: {e}")
+    init_worker()
+
+
+def _page_counts(pages) -> dict:
+    return {
+        'pages': len(pages),
+        'text_pages': sum(1 for page in pages if page['method'] == 'text'),
+        'ocr_pages': sum(1 for page in pages if page['method'] == 'ocr'),
+    }
+
+
+def extract_pdf_file(pdf_path: str, txt_path: str, use_cache: bool = True) -> dict:
+    """Extract one PDF to a TXT file; returns page counts and timings"""
+    import time
+    started = time.perf_counter()
+    stats = {'ok': False, 'pages': 0, 'text_pages': 0, 'ocr_pages': 0, 'cached': False, 'timings': {}, 'error': ''}
+    try:
+        from .parser import PDFParser
+        from .pipeline import ListingPipeline
+        pipeline = ListingPipeline(PDFParser(use_cache=use_cache))
+        document = pipeline.extract(pdf_path)
+        stats.update(_page_counts(document['pages']))
+        stats['cached'] = document['cached']
+        stats['timings'] = dict(pipeline.timings)
+        if document['text']:
+            os.makedirs(os.path.dirname(txt_path) or '.', exist_ok=True)
+            with open(txt_path, 'w', encoding='utf-8-sig') as f:
+                f.write(document['text'])
+            stats['ok'] = True
+        else:
+            stats['error'] = 'No text extracted'
+    except MemoryError:
+        stats['error'] = 'Out of memory (see --max-memory)'
+    except Exception as e:
+        stats['error'] = str(e)
+    stats['seconds'] = time.perf_counter() - started
+    return stats
+
+
+def process_upload(upload_id: int) -> dict:
+    """Run the full listing pipeline for one PDFUpload"""
+    import time
+    from django.db import connections
+    started = time.perf_counter()
+    stats = {'ok': False, 'pages': 0, 'text_pages': 0, 'ocr_pages': 0, 'cached': False, 'timings': {}, 'error': ''}
+    try:
+        from listings.models import PDFUpload
+        from .services import OCRProcessingService
+        result = OCRProcessingService().process_pdf_upload(PDFUpload.objects.get(pk=upload_id))
+        stats['ok'] = bool(result.get('success'))
+        stats['error'] = '' if stats['ok'] else result.get('message', '')
+        stats['timings'] = result.get('timings', {})
+        stats['listings'] = result.get('listings_count', 0)
+        for name in ('pages', 'text_pages', 'ocr_pages', 'cached'):
+            stats[name] = result.get(name, stats[name])
+    except MemoryError:
+        stats['error'] = 'Out of memory (see --max-memory)'
+    except Exception as e:
+        stats['error'] = str(e)
+    finally:
+        connections.close_all()
+    stats['seconds'] = time.perf_counter() - started
+    return stats
@@ -87,6 +87,11 @@ const ListingCard = ({ listing, viewMode = 'grid' }) => {
     }
   };
 
+  // Resized copies served by the API; the original image_url is the fallback
+  const thumbnails = listing.thumbnails || [];
+  const imageSrc = thumbnails.length ? thumbnails[Math.min(1, thumbnails.length - 1)].url : listing.image_url;
+  const imageSrcSet = thumbnails.map((thumb) => `${thumb.url} ${thumb.width}w`).join(', ') || undefined;
+
   const handleImageError = (e) => {
     e.target.style.display = 'none';
     e.target.nextSibling.style.display = 'flex';
@@ -99,9 +104,13 @@ const ListingCard = ({ listing, viewMode = 'grid' }) => {
           {listing.image_url ? (
             <>
               <img
-                src={listing.image_url}
+                src={imageSrc}
+                srcSet={imageSrcSet}
+                sizes="240px"
                 alt={listing.title}
                 className="card-image"
+                loading="lazy"
+                decoding="async"
                 onError={handleImageError}
               />
               <div className="image-placeholder" style={{ display: 'none' }}>
@@ -207,9 +216,13 @@ const ListingCard = ({ listing, viewMode = 'grid' }) => {
         {listing.image_url ? (
           <>
             <img
-              src={listing.image_url}
+              src={imageSrc}
+              srcSet={imageSrcSet}
+              sizes="(max-width: 768px) 100vw, 400px"
               alt={listing.title}
               className="card-image"
+              loading="lazy"
+              decoding="async"
               onError={handleImageError}
             />
             <div className="image-placeholder" style={{ display: 'none' }}>
@@ -7,7 +7,7 @@ import {
   UserCheck, UserX, Calendar, DollarSign, TrendingUp,
   Zap, Target, Database, Server, Activity, Bell
 } from 'lucide-react';
-import { listingsAPI, pdfUploadsAPI, api } from '../services/api';
+import { listingsAPI, pdfUploadsAPI, jobsAPI, api } from '../services/api';
 import './AdminPage.css';
 
 const AdminPage = () => {
@@ -62,10 +62,11 @@ const AdminPage = () => {
       setLoading(true);
       
       // Fetch all data in parallel
-      const [statsResp, uploadsResp, listingsResp] = await Promise.all([
+      const [statsResp, uploadsResp, listingsResp, jobsResp] = await Promise.all([
         listingsAPI.getStats(),
         pdfUploadsAPI.getPDFUploads(),
-        listingsAPI.getAdminListings() // Get all listings for admin view without pagination
+        listingsAPI.getAdminListings(), // Get all listings for admin view without pagination
+        jobsAPI.getJobs().catch(() => ({ data: [] }))
       ]);
 
       console.log('Stats response:', statsResp);
@@ -106,19 +107,12 @@ const AdminPage = () => {
       }
       setListings(listingsData);
 
-      // Set mock data for jobs and users since they might not exist yet
-      setJobs([
-        {
-          id: 1,
-          type: 'pdf_processing',
-          status: 'completed',
-          filename: 'Sample PDF',
-          created_at: new Date().toISOString(),
-          completed_at: new Date().toISOString(),
-          logs: ['Processing completed successfully!']
-        }
-      ]);
-      
+      // Handle background processing jobs
+      const jobsData = jobsResp.data || {};
+      setJobs(Array.isArray(jobsData) ? jobsData : (jobsData.results || []));
+
+      // Set mock data for users since they might not exist yet
+
       setUsers([
         {
           id: 1,
@@ -211,12 +205,28 @@ const AdminPage = () => {
       setProcessingLogs([]);
       setExtractedItems([]);
 
-      // Call backend endpoint to generate TXT in project root
+      // Queue TXT generation in project root, then follow the background job
       const res = await pdfUploadsAPI.extractTxt(uploadId);
-        setProcessingLogs(prev => [...prev, {
+      let lastStage = null;
+      const job = await jobsAPI.waitForJob(res.data.job_id, {
+        onProgress: (update) => {
+          if (update.stage === lastStage) return;
+          lastStage = update.stage;
+          setProcessingLogs(prev => [...prev, {
+            id: prev.length,
+            message: `Job #${update.id}: ${update.stage} (${update.pages_processed}/${update.pages_total} pages)`,
+            timestamp: new Date().toISOString(),
+            type: 'info'
+          }]);
+        }
+      });
+      if (job.status !== 'completed') {
+        throw new Error(job.error || `Job ${job.status}`);
+      }
+      setProcessingLogs(prev => [...prev, {
         id: prev.length,
-        message: `TXT saved at ${res.data.txt_path} (${res.data.size_bytes} bytes)`,
-          timestamp: new Date().toISOString(),
+        message: `TXT saved at ${job.result.txt_path} (${job.result.size_bytes} bytes)`,
+        timestamp: new Date().toISOString(),
         type: 'success'
       }]);
     } catch (err) {
@@ -456,7 +466,7 @@ const AdminPage = () => {
       processed_uploads: Array.isArray(pdfUploads) ? pdfUploads.filter(upload => upload.processed).length : 0,
       total_uploads: uploadsCount || (Array.isArray(pdfUploads) ? pdfUploads.length : 0),
       recent_activity: Array.isArray(listings) ? listings.length : 0,
-      pending_jobs: Array.isArray(jobs) ? jobs.filter(job => job.status === 'running' || job.status === 'pending').length : 0,
+      pending_jobs: Array.isArray(jobs) ? jobs.filter(job => job.status === 'running' || job.status === 'queued').length : 0,
       failed_jobs: Array.isArray(jobs) ? jobs.filter(job => job.status === 'failed').length : 0,
       active_users: Array.isArray(users) ? users.filter(user => user.status === 'active').length : 0
     };
@@ -723,7 +733,7 @@ const AdminPage = () => {
                           <div className="job-info">
                             <div className="job-name">{job.filename}</div>
                             <div className="job-meta">
-                              {job.type} • {new Date(job.created_at).toLocaleDateString()}
+                              {job.job_type} • {new Date(job.created_at).toLocaleDateString()}
                             </div>
                           </div>
                           <div className={`status-badge ${job.status}`}>
@@ -1004,7 +1014,7 @@ const AdminPage = () => {
                       <Upload size={16} /> Choose JSON File
                       <input
                         type="file"
-                        accept="application/json"
+                        accept="application/json,.json,.ndjson,.jsonl"
                         style={{ display: 'none' }}
                         onChange={(e) => {
                           const file = e.target.files && e.target.files[0];
@@ -1041,7 +1051,7 @@ const AdminPage = () => {
                       <Upload size={16} /> Choose JSON File
                       <input
                         type="file"
-                        accept="application/json"
+                        accept="application/json,.json,.ndjson,.jsonl"
                         style={{ display: 'none' }}
                         onChange={(e) => {
                           const file = e.target.files && e.target.files[0];
@@ -1123,7 +1133,7 @@ const AdminPage = () => {
                           Import JSON
                           <input
                             type="file"
-                            accept="application/json"
+                            accept="application/json,.json,.ndjson,.jsonl"
                             style={{ display: 'none' }}
                             onChange={(e) => {
                               const file = e.target.files && e.target.files[0];
@@ -1523,7 +1533,7 @@ const AdminPage = () => {
                 <div className="section-header">
                   <h3>Jobs & Logs ({Array.isArray(jobs) ? jobs.length : 0})</h3>
                   <div className="section-actions">
-                    <button className="btn btn-outline">
+                    <button className="btn btn-outline" onClick={fetchDashboardData}>
                       <RefreshCw size={16} />
                       Refresh
                     </button>
@@ -1546,7 +1556,7 @@ const AdminPage = () => {
                   {Array.isArray(jobs) && jobs.length > 0 ? jobs.map((job) => (
                     <div key={job.id} className="table-row">
                       <div className="table-cell">#{job.id}</div>
-                      <div className="table-cell">{job.type}</div>
+                      <div className="table-cell">{job.job_type}</div>
                       <div className="table-cell">{job.filename}</div>
                       <div className="table-cell">
                         <div className={`status-badge ${job.status}`}>
@@ -1562,7 +1572,7 @@ const AdminPage = () => {
                             <Eye size={16} />
                           </button>
                           {job.status === 'failed' && (
-                            <button className="action-btn">
+                            <button className="action-btn" onClick={() => jobsAPI.retryJob(job.id).then(fetchDashboardData)}>
                               <RefreshCw size={16} />
                             </button>
                           )}
@@ -77,14 +77,12 @@ const HomePage = () => {
 
   const fetchFilters = async () => {
     try {
-      const [brandsResp, citiesResp] = await Promise.all([
-        listingsAPI.getBrands(),
-        listingsAPI.getCities(),
-      ]);
+      const facetsResp = await listingsAPI.getFacets();
+      const facets = (facetsResp.data && facetsResp.data.facets) || {};
       
       // Normalize brands and cities to remove duplicates and normalize case
-      const rawBrands = (brandsResp.data && brandsResp.data.brands) || brandsResp.data || [];
-      const rawCities = (citiesResp.data && citiesResp.data.cities) || citiesResp.data || [];
+      const rawBrands = (facets.brand || []).map(facet => facet.value);
+      const rawCities = (facets.city || []).map(facet => facet.value);
       
       // Normalize brands: remove duplicates, normalize case, sort alphabetically
       const normalizedBrands = [...new Set(rawBrands.map(brand => 
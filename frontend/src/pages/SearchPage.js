@@ -94,6 +94,7 @@ const SearchPage = () => {
         else params[key] = val;
       });
 
+      fetchFacets(params);
       const response = await listingsAPI.getListings(params);
       const items = response.data.results ?? response.data ?? [];
       setListings(items);
@@ -107,19 +108,25 @@ const SearchPage = () => {
 
   const fetchFilters = async () => {
     try {
-      const [brandsResp, citiesResp, statsResp] = await Promise.all([
-        listingsAPI.getBrands(),
-        listingsAPI.getCities(),
-        listingsAPI.getStats(),
-      ]);
-      setBrands(brandsResp.data || []);
-      setCities(citiesResp.data || []);
+      const statsResp = await listingsAPI.getStats();
       setStats(statsResp.data || {});
     } catch (err) {
       console.warn("Filter fetch failed:", err);
     }
   };
 
+  // Brand and city options for the current filters, one request per filter change
+  const fetchFacets = async (params) => {
+    try {
+      const response = await listingsAPI.getFacets(params);
+      const facets = (response.data && response.data.facets) || {};
+      setBrands((facets.brand || []).map((facet) => facet.value));
+      setCities((facets.city || []).map((facet) => facet.value));
+    } catch (err) {
+      console.warn("Facet fetch failed:", err);
+    }
+  };
+
   const fetchSavedSearches = async () => {
     // Mock saved searches for demo - in real app, fetch from backend
     const mockSearches = [
@@ -93,6 +93,11 @@ export const listingsAPI = {
     return api.get('/api/listings/stats/');
   },
 
+  // Facet counts (brand, city, fuel_type, listing_type, year, price) for a filter set
+  getFacets: (params = {}) => {
+    return api.get('/api/listings/facets/', { params });
+  },
+
   // Get available brands
   getBrands: () => {
     return api.get('/api/listings/brands/');
@@ -233,6 +238,18 @@ export const jobsAPI = {
   cancelJob: (id) => {
     return api.post(`/api/jobs/${id}/cancel/`);
   },
+
+  // Poll a job until it is completed, failed or cancelled
+  waitForJob: async (id, { onProgress, interval = 2000 } = {}) => {
+    for (;;) {
+      const { data: job } = await api.get(`/api/jobs/${id}/`);
+      if (onProgress) onProgress(job);
+      if (['completed', 'failed', 'cancelled'].includes(job.status)) {
+        return job;
+      }
+      await new Promise((resolve) => setTimeout(resolve, interval));
+    }
+  },
 };
 
 export const usersAPI = {
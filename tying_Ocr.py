@@ -8,8 +8,6 @@ import re, json, sys, os, tempfile
 from pathlib import Path
 from typing import List, Dict, Tuple
 import pdfplumber
-import pytesseract
-from pdf2image import convert_from_path
 from PIL import Image
 import numpy as np
 import cv2
@@ -17,6 +15,10 @@ import camelot
 import regex
 from unidecode import unidecode
 
+# Shared OCR engine (persistent worker processes) lives in the Django backend
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from ocr_parser.ocr_engine import get_ocr_engine
+
 # -----------------------
 # Configuration
 # -----------------------
@@ -35,7 +37,7 @@ ARABIC_GROUP_WORD = "المجموعة"  # common segment boundary token in Douan
 # Preprocessing helpers (OpenCV)
 # -----------------------
 def pil_to_cv(img: Image.Image) -> np.ndarray:
-    return cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
+    return cv2.cvtColor(np.array(img.convert("RGB")), cv2.COLOR_RGB2BGR)
 
 def cv_to_pil(img: np.ndarray) -> Image.Image:
     return Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
@@ -94,16 +96,16 @@ def extract_text_pdfplumber(pdf_path: Path) -> List[Dict]:
             pages.append({"page": p.page_number, "text": text or "", "is_scanned": False})
     return pages
 
+def ocr_engine_for(dpi=PDF_DPI, lang=TESSERACT_LANG, psm=TESSERACT_PSM):
+    return get_ocr_engine(lang=lang, psm=int(psm), dpi=dpi)
+
 def image_ocr_for_pages(pdf_path: Path, dpi=PDF_DPI, lang=TESSERACT_LANG, psm=TESSERACT_PSM) -> List[Dict]:
-    pages = []
-    pil_images = convert_from_path(str(pdf_path), dpi=dpi, fmt="jpeg")
-    for i, pil in enumerate(pil_images):
-        # preprocess
-        pil_proc = preprocess_pil_image(pil)
-        custom_oem_psm = f"--psm {psm}"
-        txt = pytesseract.image_to_string(pil_proc, lang=lang, config=custom_oem_psm)
-        pages.append({"page": i+1, "text": txt or "", "is_scanned": True})
-    return pages
+    # pages are rasterized and preprocessed inside the engine's worker processes
+    with pdfplumber.open(str(pdf_path)) as pdf:
+        num_pages = len(pdf.pages)
+    windows = [(n, n) for n in range(1, num_pages + 1)]
+    texts = dict(ocr_engine_for(dpi, lang, psm).ocr_pdf_pages(str(pdf_path), windows, preprocess=preprocess_pil_image))
+    return [{"page": n, "text": texts.get(n) or "", "is_scanned": True} for n in range(1, num_pages + 1)]
 
 # -----------------------
 # Table extraction using Camelot (works on text-like PDFs or lattice tables)
@@ -213,13 +215,12 @@ def process_pdf_to_records(pdf_path: str) -> Dict:
         pages_text = image_ocr_for_pages(p)
         used_method = "image_ocr"
     else:
-        # still perform OCR on pages that are blank (mixed pdfs)
-        for i, pg in enumerate(pages_text):
-            if not pg['text'].strip():
-                # do OCR for that page only
-                pil = convert_from_path(str(p), dpi=PDF_DPI, first_page=pg['page'], last_page=pg['page'])[0]
-                pg_ocr = pytesseract.image_to_string(preprocess_pil_image(pil), lang=TESSERACT_LANG, config=f"--psm {TESSERACT_PSM}")
-                pg['text'] = pg_ocr or ""
+        # still perform OCR on pages that are blank (mixed pdfs), in parallel on the engine
+        blank = [(pg['page'], pg['page']) for pg in pages_text if not pg['text'].strip()]
+        ocr_texts = dict(ocr_engine_for().ocr_pdf_pages(str(p), blank, preprocess=preprocess_pil_image))
+        for pg in pages_text:
+            if pg['page'] in ocr_texts:
+                pg['text'] = ocr_texts[pg['page']] or ""
         used_method = "pdfplumber+ocr-fallback"
     full_text = merge_pages_text(pages_text)
     # 2) table extraction attempt